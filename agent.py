@@ -1,50 +1,93 @@
-from langchain_openai import ChatOpenAI
-from langchain.agents import AgentExecutor, create_openai_tools_agent
-from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.tools import StructuredTool
-from tools import CartTool, PaymentTool, ProductTool
+import os
+import asyncio
+import contextlib
+import queue
+import threading
+from contextvars import ContextVar
+from tools import CartTool, DeliveryTool, PaymentTool, ProductTool
+from session_memory import SessionMemory
+from intent_router import IntentRouter
+from response_cache import PromptCache, ToolResultCache
+import time
+import metrics
+
+SUMMARY_PROMPT = (
+    "Condense the following pizza-ordering conversation into a short summary that keeps "
+    "every order detail (items, customizations, quantities, name, address, phone, payment "
+    "choice) and drops small talk.\n\nPrevious summary: {summary}\n\nNew turns:\n{turns}"
+)
+
+# Tools that only read the catalog: their outputs are cached per catalog
+# version, and a turn that used nothing else may be reused for other callers.
+MENU_TOOLS = frozenset({"search_menu", "load_menu", "Search_customization"})
+
+# Chunks a WSGI stream buffers ahead of a slow client.
+STREAM_BUFFER = 64
+
+# Session of the conversation currently being served. Tools read it at call
+# time, so one agent instance can serve every caller concurrently.
+_current_session = ContextVar("current_session", default=None)
+
+
+def current_session_id() -> str:
+    """Returns the session the agent is currently acting for."""
+    session_id = _current_session.get()
+    if session_id is None:
+        raise RuntimeError("No active session: tools must run inside PizzaAgent.process_message")
+    return session_id
+
 
 class PizzaAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3)
+    def __init__(self, llm=None):
+        # LangChain and the OpenAI client take seconds to import; they are loaded
+        # here rather than at module import so the web apps can start serving first.
+        from langchain.agents import AgentExecutor, create_openai_tools_agent
+        from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
+        from langchain.tools import StructuredTool
+
+        if llm is None:
+            from langchain_openai import ChatOpenAI
+            llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3)
+        self.llm = llm
         self.tools = [
             StructuredTool.from_function(
-                func=lambda item, qty: CartTool.add_item("session_id_placeholder", item, qty),
+                func=lambda item, qty: CartTool.add_item(current_session_id(), item, qty),
                 name="add_to_cart",
                 description="Add items to the pizza order"
             ),
             StructuredTool.from_function(
-                func=lambda item, qty: CartTool.delete_item("session_id_placeholder", item),
+                func=lambda item, qty: CartTool.delete_item(current_session_id(), item),
                 name="delete_from_cart",
                 description="Deletes the item from the cart"
             ),
             StructuredTool.from_function(
-                func=lambda: CartTool.get_cart("session_id_placeholder"),
+                func=lambda: CartTool.get_cart(current_session_id()),
                 name="view_cart",
                 description="View the current order contents"
             ),
             StructuredTool.from_function(
-                func=lambda: CartTool.calculate_total("session_id_placeholder"),
+                func=lambda: CartTool.calculate_total(current_session_id()),
                 name="calculate_total",
                 description="Calculate the total order price"
             ),
             StructuredTool.from_function(
-            func=lambda method, name, address, phone, upi_id: PaymentTool.process_payment("session_id_placeholder", method, name, address, phone, upi_id),
+            func=lambda method, name, address, phone, upi_id: PaymentTool.process_payment(current_session_id(), method, name, address, phone, upi_id),
+            coroutine=lambda method, name, address, phone, upi_id: PaymentTool.aprocess_payment(current_session_id(), method, name, address, phone, upi_id),
             name="process_payment",
             description="Process payment for the order. Ask for the payment method (UPI or COD) and UPI ID if the payment method is UPI, Then ask for the name, address, and phone number of the customer."
             ),
             StructuredTool.from_function(
-                func=lambda query: ProductTool.search_product(query),
+                func=lambda query: self._menu_tool("search_menu", ProductTool.search_product, query),
                 name="search_menu",
                 description="Search pizza menu items by name or description."
             ),
             StructuredTool.from_function(
-                func=lambda: ProductTool.list_all_pizzas(),
+                func=lambda: self._menu_tool("load_menu", ProductTool.list_all_pizzas),
                 name="load_menu",
                 description="List all the pizzas available in the menu"
             ),
             StructuredTool.from_function(
-                func=lambda: ProductTool.list_customizations(),
+                func=lambda: self._menu_tool("Search_customization", ProductTool.list_customizations),
                 name="Search_customization",
                 description="Load the customization options for the pizzas"
             ),
@@ -100,18 +143,336 @@ class PizzaAgent:
             self.llm, self.tools, self.prompt
         )
         self.agent_executor = AgentExecutor(
-            agent=self.agent, tools=self.tools, verbose=True
+            agent=self.agent, tools=self.tools, return_intermediate_steps=True,
+            verbose=os.getenv("AGENT_VERBOSE", "0") == "1"
+        )
+        self._run_config = {"callbacks": [metrics.langchain_handler()]}
+        self.memory = SessionMemory(
+            max_turns=int(os.getenv("AGENT_MEMORY_TURNS", "10")),
+            max_tokens=int(os.getenv("AGENT_MEMORY_TOKENS", "1500")),
+            idle_ttl=float(os.getenv("AGENT_MEMORY_IDLE_TTL", "1800")),
+            max_sessions=int(os.getenv("AGENT_MEMORY_MAX_SESSIONS", "10000")),
+            summarizer=self._summarize if os.getenv("AGENT_MEMORY_SUMMARIZE", "1") == "1" else None,
         )
-        self.chat_history = []
+        self.router = IntentRouter() if os.getenv("AGENT_FAST_PATH", "1") == "1" else None
+        self.tool_cache = ToolResultCache(
+            max_entries=int(os.getenv("AGENT_TOOL_CACHE_SIZE", "512")),
+        ) if os.getenv("AGENT_TOOL_CACHE", "1") == "1" else None
+        self.prompt_cache = PromptCache(
+            ttl=float(os.getenv("AGENT_PROMPT_CACHE_TTL", "300")),
+            max_entries=int(os.getenv("AGENT_PROMPT_CACHE_SIZE", "1000")),
+            catalog_names=lambda: ProductTool.catalog().products,
+        ) if os.getenv("AGENT_PROMPT_CACHE", "0") == "1" else None
+
+    def _route(self, session_id: str, user_input: str):
+        with metrics.span("agent", "router"):
+            return self.router.route(session_id, user_input)
+
+    def _menu_tool(self, name: str, compute, *args):
+        """Runs a read-only catalog tool through the tool result cache."""
+        if self.tool_cache is None:
+            return compute(*args)
+        return self.tool_cache.call(ProductTool.catalog_version(), name, args, compute)
+
+    def _cached_reply(self, user_input: str, history: list):
+        """(key, reply) from the prompt cache; the key is None when the prompt may not be cached.
+
+        Like storing (see ``_remember_reply``), lookups are limited to fresh
+        conversations: mid-conversation, "what pizzas do you have?" may be
+        answered in the light of earlier turns.
+        """
+        if self.prompt_cache is None or history:
+            return None, None
+        with metrics.span("agent", "prompt_cache"):
+            key = self.prompt_cache.key(ProductTool.catalog_version(), user_input)
+            return key, self.prompt_cache.get(key)
+
+    def _remember_reply(self, key, history: list, response: dict):
+        """Keeps a reply for other callers only if it was produced without earlier
+        turns and used read-only menu tools alone; cart and payment turns never qualify."""
+        if key is None:
+            return
+        steps = response.get("intermediate_steps") or []
+        if not history and steps and all(action.tool in MENU_TOOLS for action, _ in steps):
+            self.prompt_cache.put(key, response["output"])
+
+    def _summarize(self, summary: str, turns: list) -> str:
+        """Folds turns that fell out of the memory window into the running summary."""
+        transcript = "\n".join(f"Customer: {human}\nAssistant: {ai}" for human, ai in turns)
+        with metrics.span("llm", "summarize"):
+            result = self.llm.invoke(SUMMARY_PROMPT.format(summary=summary or "(none)", turns=transcript))
+        return result.content.strip()
+
+    def stats(self) -> dict:
+        """Agent-side metrics for monitoring (fast-path hit rate, latency saved)."""
+        return {
+            "fast_path": self.router.stats() if self.router is not None else None,
+            "tool_cache": self.tool_cache.stats() if self.tool_cache is not None else None,
+            "prompt_cache": self.prompt_cache.stats() if self.prompt_cache is not None else None,
+            "sessions_in_memory": len(self.memory),
+        }
 
     def process_message(self, session_id: str, user_input: str) -> str:
-        response = self.agent_executor.invoke({
-            "input": user_input,
-            "chat_history": self.chat_history
-        })
-        self.chat_history.extend([
-            ("human", user_input),
-            ("ai", response["output"])
-        ])
-        print("INSIDE AGENT", response)
-        return response
\ No newline at end of file
+        if self.router is not None:
+            routed = self._route(session_id, user_input)
+            if routed is not None:
+                self.memory.append(session_id, user_input, routed)
+                return {"input": user_input, "output": routed}
+
+        history = self.memory.history(session_id)
+        key, cached = self._cached_reply(user_input, history)
+        if cached is not None:
+            self.memory.append(session_id, user_input, cached)
+            return {"input": user_input, "output": cached}
+
+        started = time.perf_counter()
+        token = _current_session.set(session_id)
+        try:
+            with metrics.span("agent", "executor"):
+                response = self.agent_executor.invoke({
+                    "input": user_input,
+                    "chat_history": history
+                }, config=self._run_config)
+        finally:
+            _current_session.reset(token)
+        if self.router is not None:
+            self.router.record_agent_latency(time.perf_counter() - started)
+        self._remember_reply(key, history, response)
+        self.memory.append(session_id, user_input, response["output"])
+        return response
+
+    async def aprocess_message(self, session_id: str, user_input: str) -> dict:
+        """``process_message`` for ASGI handlers: awaits the LLM instead of holding a thread.
+
+        Tools without network I/O run on the loop's default executor; the
+        fast-path router (cart and catalog reads) and summarizing memory (an
+        LLM call) run on worker threads.
+        """
+        if self.router is not None:
+            routed = await asyncio.to_thread(self._route, session_id, user_input)
+            if routed is not None:
+                await asyncio.to_thread(self.memory.append, session_id, user_input, routed)
+                return {"input": user_input, "output": routed}
+
+        history = self.memory.history(session_id)
+        key, cached = self._cached_reply(user_input, history)
+        if cached is not None:
+            await asyncio.to_thread(self.memory.append, session_id, user_input, cached)
+            return {"input": user_input, "output": cached}
+
+        started = time.perf_counter()
+        token = _current_session.set(session_id)
+        try:
+            with metrics.span("agent", "executor"):
+                response = await self.agent_executor.ainvoke({
+                    "input": user_input,
+                    "chat_history": history
+                }, config=self._run_config)
+        finally:
+            _current_session.reset(token)
+        if self.router is not None:
+            self.router.record_agent_latency(time.perf_counter() - started)
+        self._remember_reply(key, history, response)
+        await asyncio.to_thread(self.memory.append, session_id, user_input, response["output"])
+        return response
+
+    async def astream_message(self, session_id: str, user_input: str):
+        """Yields the reply as text chunks while the LLM produces them.
+
+        Tokens from every LLM call in the turn are forwarded, including text
+        emitted around tool calls. Must be consumed from a single task.
+        """
+        if self.router is not None:
+            routed = await asyncio.to_thread(self._route, session_id, user_input)
+            if routed is not None:
+                await asyncio.to_thread(self.memory.append, session_id, user_input, routed)
+                yield routed
+                return
+
+        history = self.memory.history(session_id)
+        key, cached = self._cached_reply(user_input, history)
+        if cached is not None:
+            await asyncio.to_thread(self.memory.append, session_id, user_input, cached)
+            yield cached
+            return
+
+        started = time.perf_counter()
+        response = None
+        token = _current_session.set(session_id)
+        try:
+            async for event in self.agent_executor.astream_events({
+                "input": user_input,
+                "chat_history": history
+            }, config=self._run_config, version="v2"):
+                if event["event"] == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if content:
+                        yield content
+                elif event["event"] == "on_chain_end" and event["name"] == "AgentExecutor":
+                    response = event["data"]["output"]
+        finally:
+            _current_session.reset(token)
+            metrics.observe("agent", "executor", time.perf_counter() - started, response is None, started)
+        if self.router is not None:
+            self.router.record_agent_latency(time.perf_counter() - started)
+        if response is not None:
+            self._remember_reply(key, history, response)
+            await asyncio.to_thread(self.memory.append, session_id, user_input, response["output"])
+
+    def stream_message(self, session_id: str, user_input: str):
+        """Synchronous wrapper around ``astream_message`` for WSGI handlers.
+
+        Chunks pass through a bounded buffer, and closing the generator (the
+        client went away) cancels the agent run instead of letting it finish.
+        """
+        chunks = queue.Queue(maxsize=STREAM_BUFFER)
+        done = object()
+        stop = threading.Event()
+        running = {}
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        async def consume():
+            running["loop"], running["task"] = asyncio.get_running_loop(), asyncio.current_task()
+            if stop.is_set():
+                return
+            async with contextlib.aclosing(self.astream_message(session_id, user_input)) as stream:
+                async for chunk in stream:
+                    if not put(chunk):
+                        return
+
+        def run():
+            try:
+                asyncio.run(consume())
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is done:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            stop.set()
+            loop, task = running.get("loop"), running.get("task")
+            if task is not None and not task.done():
+                try:
+                    loop.call_soon_threadsafe(task.cancel)
+                except RuntimeError:  # the run already finished and its loop is closed
+                    pass
+
+_agent = None
+_agent_error = None
+_warmup_pid = None
+_warmup_done = threading.Event()
+_warmup_lock = threading.Lock()
+
+
+def _warm_up():
+    global _agent, _agent_error, _warmup_pid
+    started = time.perf_counter()
+    try:
+        agent = PizzaAgent()
+        CartTool.catalog()
+        for warm in (PaymentTool.gateway, DeliveryTool.get_pool):
+            try:
+                warm()
+            except Exception as e:
+                print(f"Warm-up: {warm.__qualname__} failed: {e}")
+        _agent, _agent_error = agent, None
+        print(f"Agent ready in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        _agent_error = e
+        _warmup_pid = None  # the next get_pizza_agent() call tries again
+        print(f"Error starting agent: {e}")
+    finally:
+        _warmup_done.set()
+
+
+def start_warmup():
+    """Builds the shared PizzaAgent in a background thread, once per process.
+
+    Also imports the payment and database clients and opens the connection
+    pool, so the first request does not pay for them. Call it from the
+    process that serves requests (ASGI lifespan, gunicorn's post_fork, the
+    ``__main__`` block), not at import: with ``gunicorn --preload`` the pool
+    and gateway would be created in the master. Safe to call again. With
+    AGENT_WARMUP=0 nothing happens until the first request needs the agent.
+    """
+    if os.getenv("AGENT_WARMUP", "1") == "1":
+        _start_warmup()
+
+
+def _start_warmup():
+    global _warmup_pid, _warmup_done
+    if _agent is not None or _warmup_pid == os.getpid():
+        return
+    with _warmup_lock:
+        if _agent is not None or _warmup_pid == os.getpid():
+            return
+        _warmup_pid = os.getpid()
+        _warmup_done = threading.Event()
+        threading.Thread(target=_warm_up, name="agent-warmup", daemon=True).start()
+
+
+def get_pizza_agent(timeout=None) -> PizzaAgent:
+    """Returns the shared agent, waiting up to ``timeout`` seconds for warm-up to finish."""
+    if _agent is not None:
+        return _agent
+    _start_warmup()
+    if not _warmup_done.wait(timeout):
+        raise TimeoutError("The assistant is still starting up")
+    if _agent is None:
+        raise RuntimeError(f"The assistant failed to start: {_agent_error}")
+    return _agent
+
+
+async def aget_pizza_agent(timeout=None) -> PizzaAgent:
+    """``get_pizza_agent`` for async handlers: waits for warm-up on a worker thread."""
+    if _agent is not None:
+        return _agent
+    return await asyncio.to_thread(get_pizza_agent, timeout)
+
+
+def agent_status() -> dict:
+    """Warm-up state for health checks."""
+    return {
+        "ready": _agent is not None,
+        "warming_up": _agent is None and _warmup_pid == os.getpid() and not _warmup_done.is_set(),
+        "error": None if _agent_error is None else str(_agent_error),
+    }
+
+
+def _collect_metrics():
+    """Gauges for /metrics: fast path and caches, memory, pending UPI payments, DB pool."""
+    if _agent is not None:
+        stats = _agent.stats()
+        for group in ("fast_path", "tool_cache", "prompt_cache"):
+            for key, value in (stats[group] or {}).items():
+                if isinstance(value, (int, float)):
+                    yield f"pizza_{group}_{key}", {}, value
+        for intent, hits in ((stats["fast_path"] or {}).get("hits_by_intent") or {}).items():
+            yield "pizza_fast_path_intent_hits", {"intent": intent}, hits
+        yield "pizza_agent_sessions_in_memory", {}, stats["sessions_in_memory"]
+    yield "pizza_payments_pending", {}, PaymentTool.pending_count()
+    for key, value in DeliveryTool.pool_stats().items():
+        if isinstance(value, (int, float)):
+            yield f"pizza_db_pool_{key}", {}, value
+
+
+metrics.add_collector(_collect_metrics)
@@ -1,14 +1,33 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, render_template, request, jsonify, session, Response
+import hashlib
+import hmac
+import json
+import os
+import queue
 import uuid
-from agent import PizzaAgent
-from tools import ProductTool, CartTool
+from agent import agent_status, get_pizza_agent, start_warmup
+from tools import ProductTool, CartTool, PaymentTool, DeliveryTool
+from http_cache import PrecomputedResponse
+import metrics
 from dotenv import load_dotenv
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = 'pizza_secret_123'
+metrics.instrument_flask(app)
 
-pizza_agent = PizzaAgent()
+AGENT_WAIT = float(os.getenv('AGENT_WARMUP_WAIT', '10'))
+NOT_READY_REPLY = "I'm still getting ready. Please try again in a moment."
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: answers as soon as the app is imported, while the agent warms up."""
+    return jsonify({'status': 'ok', 'agent': agent_status()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = agent_status()
+    return jsonify(status), (200 if status['ready'] else 503)
 
 @app.route('/')
 def index():
@@ -23,26 +42,188 @@ def process_message():
     user_input = data.get('message')
     session_id = session['session_id']
     
+    try:
+        pizza_agent = get_pizza_agent(AGENT_WAIT)
+    except (TimeoutError, RuntimeError) as e:
+        print(f"Agent unavailable: {e}")
+        return jsonify({
+            'response': NOT_READY_REPLY,
+            'session_id': session_id
+        }), 503
+
     response = pizza_agent.process_message(session_id, user_input)
     return jsonify({
         'response': response['output'],
         'session_id': session_id
     })
 
+MENU_CACHE_CONTROL = f"public, max-age={int(os.getenv('MENU_MAX_AGE', '300'))}"
+_menu_responses = {}  # view -> (catalog version, PrecomputedResponse)
+
+def _menu_response(view, render):
+    """Renders a menu view once per catalog version and serves the cached bytes."""
+    version = ProductTool.catalog_version()
+    cached = _menu_responses.get(view)
+    if cached is None or cached[0] != version:
+        body = json.dumps(render(), ensure_ascii=False).encode('utf-8')
+        cached = (version, PrecomputedResponse(body, cache_control=MENU_CACHE_CONTROL))
+        _menu_responses[view] = cached
+    return cached[1].respond(request)
+
 @app.route('/menu', methods=['GET'])
 def get_menu():
-    return jsonify({
+    return _menu_response('text', lambda: {
         'pizzas': ProductTool.list_all_pizzas(),
         'customizations': ProductTool.list_customizations()
     })
 
+@app.route('/menu/items', methods=['GET'])
+def get_menu_items():
+    def render():
+        menu, error = ProductTool.structured_menu()
+        return menu if error is None else {'error': error}
+    return _menu_response('items', render)
+
+@app.route('/agent/stats', methods=['GET'])
+def agent_stats():
+    if not agent_status()['ready']:
+        return jsonify(agent_status()), 503
+    return jsonify(get_pizza_agent().stats())
+
+CART_STREAM_RECHECK = float(os.getenv('CART_STREAM_RECHECK', '15'))
+
+def cart_snapshot(session_id):
+    snapshot = CartTool.snapshot(session_id)
+    body = json.dumps(snapshot)
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
 @app.route('/cart', methods=['GET'])
 def get_cart():
     session_id = session['session_id']
-    return jsonify({
-        'items': CartTool.get_cart(session_id),
-        'total': CartTool.calculate_total(session_id)
-    })
+    body, etag = cart_snapshot(session_id)
+    response = Response(body, content_type='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/cart/stream', methods=['GET'])
+def cart_stream():
+    """Server-sent events: the cart snapshot now and whenever it changes.
+
+    Changes made in this process are pushed immediately. The cart is also
+    re-read every CART_STREAM_RECHECK seconds (which doubles as a keep-alive),
+    so changes made by other workers sharing the cart store arrive too.
+    """
+    session_id = session['session_id']
+    last_sent = request.headers.get('Last-Event-ID')
+    changed = CartTool.changes.subscribe(session_id)
+
+    def generate():
+        nonlocal last_sent
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                changed.clear()
+                body, etag = cart_snapshot(session_id)
+                if etag != last_sent:
+                    last_sent = etag
+                    yield f"id: {etag}\ndata: {body}\n\n"
+                if not changed.wait(CART_STREAM_RECHECK):
+                    yield ": keep-alive\n\n"
+        finally:
+            CartTool.changes.unsubscribe(session_id, changed)
+
+    return Response(generate(), content_type='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+ORDER_PAGE_SIZE = int(os.getenv('ORDER_PAGE_SIZE', '20'))
+
+@app.route('/orders', methods=['GET'])
+def order_history():
+    """The session's orders, newest first, one page at a time.
+
+    ``next`` is the cursor for the following page (``?before=<next>``), or
+    null after the last page.
+    """
+    session_id = session['session_id']
+    try:
+        limit = min(max(int(request.args.get('limit', ORDER_PAGE_SIZE)), 1), 100)
+        before = request.args.get('before')
+        if before:
+            created_at, order_id = before.rsplit(',', 1)
+            before = (created_at, int(order_id))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer and before a "<created_at>,<order_id>" cursor'}), 400
+    orders = DeliveryTool.get_orders(session_id, limit=limit, before=before or None)
+    last = orders[-1] if len(orders) == limit else None
+    return jsonify({'orders': orders, 'next': f"{last['created_at']},{last['order_id']}" if last else None})
+
+@app.route('/razorpay/webhook', methods=['POST'])
+def razorpay_webhook():
+    if not PaymentTool.handle_webhook(request.get_data(), request.headers.get('X-Razorpay-Signature', '')):
+        return jsonify({'error': 'invalid signature'}), 400
+    return jsonify({'status': 'ok'})
+
+def dispatch_authorized(authorization):
+    """Kitchen/dispatch endpoints need ``Authorization: Bearer $DISPATCH_TOKEN``; without a token they are closed."""
+    token = os.getenv('DISPATCH_TOKEN')
+    if not token:
+        print("Error: DISPATCH_TOKEN is not set; refusing dispatch request")
+        return False
+    return hmac.compare_digest(authorization.removeprefix('Bearer '), token)
+
+def _dispatch_authorized():
+    return dispatch_authorized(request.headers.get('Authorization', ''))
+
+@app.route('/orders/status', methods=['POST'])
+def bulk_order_status():
+    if not _dispatch_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    data = request.json or {}
+    order_ids, status = data.get('order_ids'), data.get('status')
+    if not isinstance(order_ids, list) or not order_ids or not status:
+        return jsonify({'error': 'order_ids (list) and status are required'}), 400
+    if not all(isinstance(x, int) and not isinstance(x, bool) for x in order_ids):
+        return jsonify({'error': 'order_ids must be integers'}), 400
+    updated = DeliveryTool.update_delivery_status_bulk(order_ids, status)
+    return jsonify({'updated': updated, 'missing': sorted(set(order_ids) - set(updated))})
+
+@app.route('/orders/feed', methods=['GET'])
+def order_feed():
+    """Server-sent events for kitchen displays: one ``order`` event per new or changed order.
+
+    ``?status=pending,preparing`` first sends a ``snapshot`` event with the
+    orders currently in those states.
+    """
+    if not _dispatch_authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+    feed = DeliveryTool.get_feed()
+    subscriber = feed.subscribe()  # before the snapshot, so nothing falls in between
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    try:
+        snapshot = DeliveryTool.get_orders_by_status(statuses) if statuses else None
+    except Exception:
+        feed.unsubscribe(subscriber)
+        raise
+
+    def generate():
+        try:
+            yield "retry: 2000\n\n"
+            if snapshot is not None:
+                yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            while True:
+                try:
+                    event = subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: order\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            feed.unsubscribe(subscriber)
+
+    return Response(generate(), content_type='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
+    start_warmup()
     app.run(debug=True)
\ No newline at end of file
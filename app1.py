@@ -1,65 +1,129 @@
 from flask import Flask, render_template, request, jsonify, session
 from twilio.twiml.voice_response import VoiceResponse, Gather
 import uuid
-from agent import PizzaAgent
+from agent import agent_status, get_pizza_agent, start_warmup
 from tools import ProductTool, CartTool
 from dotenv import load_dotenv
 import os
 from hashlib import sha256
+import metrics
+import random
+from call_prep import CallPrep
+from voice_turns import VoiceTurns
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'pizza_secret_123')
+metrics.instrument_flask(app)
 
-pizza_agent = PizzaAgent()
+AGENT_WAIT = float(os.getenv('AGENT_WARMUP_WAIT', '10'))
+NOT_READY_REPLY = "Sorry, I'm still getting ready. Could you say that again?"
+
+def ask_agent(session_id, user_input):
+    """Runs the agent, or returns a short apology if it is not ready in time."""
+    try:
+        pizza_agent = get_pizza_agent(AGENT_WAIT)
+    except (TimeoutError, RuntimeError) as e:
+        print(f"Agent unavailable: {e}")
+        return {'output': NOT_READY_REPLY}
+    return pizza_agent.process_message(session_id, user_input)
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: answers as soon as the app is imported, while the agent warms up."""
+    return jsonify({'status': 'ok', 'agent': agent_status()})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = agent_status()
+    return jsonify(status), (200 if status['ready'] else 503)
 
 def get_session_id(phone_number):
     """Generate consistent session ID from phone number"""
     return sha256(phone_number.encode()).hexdigest()
 
-@app.route('/voice', methods=['GET', 'POST'])
-def voice():
-    """Handle incoming voice calls"""
-    caller_number = request.form.get('From')
-    print(f"Incoming call from: {caller_number}")
+WELCOME = "Welcome to PizzaBot! What would you like to order today?"
+NOT_UNDERSTOOD = "Sorry, I didn't get that. Can you please repeat?"
+TOO_SLOW_REPLY = "Sorry, that's taking longer than expected. Could you say that again?"
+FILLERS = ("One moment, let me check that.", "Sure, just a second.", "Let me look that up for you.")
 
+def say_and_listen(text):
+    """TwiML that speaks ``text`` and gathers the caller's next utterance."""
     response = VoiceResponse()
-    
+
     gather = Gather(
         input='speech',
         action='/handle_input',
         method='POST',
         speechTimeout='auto'
     )
-    gather.say("Welcome to PizzaBot! What would you like to order today?")
+    gather.say(text)
     response.append(gather)
-    
+
     response.redirect('/voice')
     return str(response)
 
+def say_and_continue(text, turn_id):
+    """TwiML that speaks ``text`` (a filler) and comes back for the turn's answer."""
+    response = VoiceResponse()
+    response.say(text)
+    response.redirect(f'/voice_result?turn={turn_id}', method='POST')
+    return str(response)
+
+def pause_and_continue(turn_id):
+    """TwiML that keeps the caller on the line a little longer, then checks for the answer again."""
+    response = VoiceResponse()
+    response.pause(length=VoiceTurns.PAUSE)
+    response.redirect(f'/voice_result?turn={turn_id}', method='POST')
+    return str(response)
+
+def turn_reply(turn, response, first):
+    """TwiML for a voice turn: the answer if there is one, otherwise a filler (first) or a pause."""
+    if response is not None:
+        return say_and_listen(response.get('output') or NOT_UNDERSTOOD)
+    if VoiceTurns.expired(turn):
+        VoiceTurns.give_up(turn)
+        return say_and_listen(TOO_SLOW_REPLY)
+    if first:
+        return say_and_continue(random.choice(FILLERS), turn.id)
+    return pause_and_continue(turn.id)
+
+def answer(session_id, user_input):
+    """One voice turn, run on the turn pool: waits briefly for call preparation, then asks the agent."""
+    CallPrep.finish(session_id)
+    return ask_agent(session_id, user_input)
+
+@app.route('/voice', methods=['GET', 'POST'])
+def voice():
+    """Handle incoming voice calls"""
+    caller_number = request.form.get('From')
+    print(f"Incoming call from: {caller_number}")
+    session_id = get_session_id(caller_number) if caller_number else None
+    CallPrep.start(session_id, request.form.get('CallSid'))
+    return say_and_listen(CallPrep.greeting(session_id) or WELCOME)
+
 @app.route('/handle_input', methods=['POST'])
 def handle_input():
     """Process user speech input and generate response"""
-    response = VoiceResponse()
     session_id = get_session_id(request.form.get('From', ''))
     
     user_input = request.form.get('SpeechResult', '')
-    print(f"User input: {user_input}")
-    agent_response = pizza_agent.process_message(session_id, user_input)
-    
-    gather = Gather(
-        input='speech',
-        action='/handle_input',
-        method='POST',
-        speechTimeout='auto'
-    )
+    if not VoiceTurns.ENABLED:
+        agent_response = answer(session_id, user_input)
+        return say_and_listen(agent_response.get('output', NOT_UNDERSTOOD))
 
-    gather.say(agent_response.get('output', 'Sorry, I didn\'t get that. Can you please repeat?'))
-    response.append(gather)
+    turn = VoiceTurns.submit(session_id, answer, session_id, user_input)
+    return turn_reply(turn, VoiceTurns.result(turn, VoiceTurns.INLINE_WAIT), first=True)
 
-    response.redirect('/voice')
-    return str(response)
+@app.route('/voice_result', methods=['POST'])
+def voice_result():
+    """Speaks the answer to a turn started by /handle_input once it is ready"""
+    session_id = get_session_id(request.form.get('From', ''))
+    turn = VoiceTurns.get(session_id, request.args.get('turn', ''))
+    if turn is None:
+        return say_and_listen(NOT_UNDERSTOOD)
+    return turn_reply(turn, VoiceTurns.result(turn, VoiceTurns.RESULT_WAIT), first=False)
 
 @app.route('/process_message', methods=['POST'])
 def process_message():
@@ -67,11 +131,12 @@ def process_message():
     user_input = data.get('message')
     session_id = session['session_id']
     
-    response = pizza_agent.process_message(session_id, user_input)
+    response = ask_agent(session_id, user_input)
     return jsonify({
         'response': response['output'],
         'session_id': session_id
     })
 
 if __name__ == '__main__':
+    start_warmup()
     app.run(debug=True)
\ No newline at end of file
@@ -1,12 +1,28 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
 from hashlib import sha256
-from agent import PizzaAgent
+from agent import agent_status, get_pizza_agent, start_warmup
+import os
 import uuid
 import json
 import time
+import metrics
 
 app = Flask(__name__)
-pizza_agent = PizzaAgent()
+metrics.instrument_flask(app)
+AGENT_WAIT = float(os.getenv('AGENT_WARMUP_WAIT', '10'))
+FALLBACK_REPLY = "Sorry, could you say that again?"
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: answers as soon as the app is imported, while the agent warms up."""
+    return jsonify({"status": "ok", "agent": agent_status()})
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    status = agent_status()
+    return jsonify(status), (200 if status["ready"] else 503)
 
 
 def get_session_id(identifier: str) -> str:
@@ -16,70 +32,86 @@ def get_session_id(identifier: str) -> str:
     return sha256(identifier.encode()).hexdigest()
 
 
-def generate_streaming_response(session_id: str, user_input: str):
+def completion_chunk(response_id: str, created: int, delta: dict, finish_reason=None) -> str:
+    chunk = {
+        "id": response_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": "pizza-agent",
+        "choices": [{
+            "index": 0,
+            "delta": delta,
+            "finish_reason": finish_reason
+        }]
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+def generate_streaming_response(session_id: str, user_input: str, response_id: str, created: int):
     """
-    Generator function to simulate streaming the agent's response as SSE events.
+    Generator that forwards agent tokens as OpenAI-style SSE chunks as soon as they are produced.
     """
-    agent_response = pizza_agent.process_message(session_id, user_input)
-    data = {"response": agent_response.get("output", "Sorry, could you say that again?"),
-            "session_id": session_id}
-    event = f"data: {json.dumps(data)}\n\n"
-    yield event
+    yield completion_chunk(response_id, created, {"role": "assistant", "content": ""})
+    sent_any = False
+    try:
+        for token in get_pizza_agent(AGENT_WAIT).stream_message(session_id, user_input):
+            sent_any = True
+            yield completion_chunk(response_id, created, {"content": token})
+    except Exception as e:
+        print(f"Error streaming agent response: {e}")
+        if not sent_any:
+            yield completion_chunk(response_id, created, {"content": FALLBACK_REPLY})
+    yield completion_chunk(response_id, created, {}, "stop")
+    yield "data: [DONE]\n\n"
 
 
-@app.route("/chat/completions", methods=["POST"])
-def chat_completions():
-    data = request.json
+def parse_chat_request(data: dict):
+    """(session_id, user_input, streaming) from an OpenAI-style chat completion request."""
     messages = data.get('messages', [])
-    streaming = data.get('stream', False)
-    
     user_messages = [msg['content'] for msg in messages if msg.get('role') == 'user']
     user_input = user_messages[-1] if user_messages else "No user message found."
-
     user_identifier = data.get("phone", "anonymous")
-    session_id = get_session_id(user_identifier)
-    agent_response = pizza_agent.process_message(session_id, user_input)
-    content = agent_response.get("output", "Sorry, could you say that again?")
+    return get_session_id(user_identifier), user_input, data.get('stream', False)
+
+
+def completion_body(response_id: str, created: int, content: str) -> str:
+    return json.dumps({
+        "id": response_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": "pizza-agent",
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": content
+            },
+            "finish_reason": "stop"
+        }]
+    })
 
+
+@app.route("/chat/completions", methods=["POST"])
+def chat_completions():
+    session_id, user_input, streaming = parse_chat_request(request.json)
     response_id = f"chatcmpl-{uuid.uuid4().hex}"
     created = int(time.time())
 
     if streaming:
-        def generate():
-            for token in content.split():
-                chunk = {
-                    "id": response_id,
-                    "object": "chat.completion.chunk",
-                    "created": created,
-                    "model": "pizza-agent",
-                    "choices": [{
-                        "index": 0,
-                        "delta": {"content": token + " "},
-                        "finish_reason": None
-                    }]
-                }
-                yield f"data: {json.dumps(chunk)}\n\n"
-            
-            yield "data: [DONE]\n\n"
-        
-        return Response(generate(), content_type='text/event-stream')
-    
+        return Response(
+            stream_with_context(generate_streaming_response(session_id, user_input, response_id, created)),
+            content_type='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
     else:
-        response_data = {
-            "id": response_id,
-            "object": "chat.completion",
-            "created": created,
-            "model": "pizza-agent",
-            "choices": [{
-                "index": 0,
-                "message": {
-                    "role": "assistant",
-                    "content": content
-                },
-                "finish_reason": "stop"
-            }]
-        }
-        return Response(json.dumps(response_data), content_type='application/json')
+        try:
+            agent_response = get_pizza_agent(AGENT_WAIT).process_message(session_id, user_input)
+        except (TimeoutError, RuntimeError) as e:
+            print(f"Agent unavailable: {e}")
+            agent_response = {}
+        content = agent_response.get("output", FALLBACK_REPLY)
+        return Response(completion_body(response_id, created, content), content_type='application/json')
 
 if __name__ == "__main__":
+    start_warmup()
     app.run(debug=True, port=5000)
@@ -0,0 +1,225 @@
+"""ASGI entry point that serves the agent endpoints asynchronously.
+
+/process_message (app.py), /voice, /handle_input and /voice_result (app1.py) and
+/chat/completions (app2.py) run on the event loop and await the agent, so
+a conversation waiting on the LLM holds a coroutine rather than a thread.
+The /cart/stream and /orders/feed event streams are served here too, so
+open pages and kitchen displays do not pin the Flask threads.
+Every other request is passed to the Flask app in app.py on a pool of
+ASGI_WSGI_THREADS threads.
+
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import os
+import queue
+import time
+import uuid
+
+from quart import Quart, Response, jsonify, request, session
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+import app as web_app
+import app1 as voice_app
+import app2 as chat_app
+import metrics
+from agent import agent_status, aget_pizza_agent, start_warmup
+from call_prep import CallPrep
+from tools import CartTool, DeliveryTool
+from voice_turns import VoiceTurns
+
+AGENT_WAIT = float(os.getenv('AGENT_WARMUP_WAIT', '10'))
+ASYNC_PATHS = frozenset({
+    '/process_message', '/voice', '/handle_input', '/voice_result', '/chat/completions', '/healthz', '/readyz',
+    '/metrics', '/orders/feed', '/cart/stream',
+})
+
+app = Quart(__name__)
+app.secret_key = web_app.app.secret_key  # reads the session cookie set by app.py's pages
+metrics.instrument_quart(app)
+
+
+@app.before_serving
+async def warm_up():
+    """Starts the agent warm-up in the serving process (never at import, which may be pre-fork)."""
+    start_warmup()
+
+
+async def ask_agent(session_id, user_input):
+    """Runs one agent turn; None if the agent is not ready in time."""
+    try:
+        pizza_agent = await aget_pizza_agent(AGENT_WAIT)
+    except (TimeoutError, RuntimeError) as e:
+        print(f"Agent unavailable: {e}")
+        return None
+    return await pizza_agent.aprocess_message(session_id, user_input)
+
+
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    return jsonify({'status': 'ok', 'agent': agent_status()})
+
+
+@app.route('/readyz', methods=['GET'])
+async def readyz():
+    status = agent_status()
+    return jsonify(status), (200 if status['ready'] else 503)
+
+
+@app.route('/process_message', methods=['POST'])
+async def process_message():
+    data = await request.get_json()
+    session_id = session['session_id']
+    response = await ask_agent(session_id, data.get('message'))
+    if response is None:
+        return jsonify({'response': web_app.NOT_READY_REPLY, 'session_id': session_id}), 503
+    return jsonify({'response': response['output'], 'session_id': session_id})
+
+
+async def answer(session_id, user_input):
+    """One voice turn: waits briefly for call preparation, then asks the agent."""
+    await CallPrep.afinish(session_id)
+    return await ask_agent(session_id, user_input) or {'output': voice_app.NOT_READY_REPLY}
+
+
+@app.route('/voice', methods=['GET', 'POST'])
+async def voice():
+    form = await request.form
+    caller_number = form.get('From')
+    print(f"Incoming call from: {caller_number}")
+    session_id = voice_app.get_session_id(caller_number) if caller_number else None
+    CallPrep.start(session_id, form.get('CallSid'))
+    return voice_app.say_and_listen(await CallPrep.agreeting(session_id) or voice_app.WELCOME)
+
+
+@app.route('/handle_input', methods=['POST'])
+async def handle_input():
+    form = await request.form
+    session_id = voice_app.get_session_id(form.get('From', ''))
+    user_input = form.get('SpeechResult', '')
+    if not VoiceTurns.ENABLED:
+        response = await answer(session_id, user_input)
+        return voice_app.say_and_listen(response.get('output', voice_app.NOT_UNDERSTOOD))
+
+    turn = VoiceTurns.asubmit(session_id, answer, session_id, user_input)
+    return voice_app.turn_reply(turn, await VoiceTurns.aresult(turn, VoiceTurns.INLINE_WAIT), first=True)
+
+
+@app.route('/voice_result', methods=['POST'])
+async def voice_result():
+    form = await request.form
+    session_id = voice_app.get_session_id(form.get('From', ''))
+    turn = VoiceTurns.get(session_id, request.args.get('turn', ''))
+    if turn is None:
+        return voice_app.say_and_listen(voice_app.NOT_UNDERSTOOD)
+    return voice_app.turn_reply(turn, await VoiceTurns.aresult(turn, VoiceTurns.RESULT_WAIT), first=False)
+
+
+async def stream_completion(session_id, user_input, response_id, created):
+    """Forwards agent tokens as OpenAI-style SSE chunks, straight from ``astream_message``."""
+    yield chat_app.completion_chunk(response_id, created, {"role": "assistant", "content": ""})
+    sent_any = False
+    try:
+        pizza_agent = await aget_pizza_agent(AGENT_WAIT)
+        async for token in pizza_agent.astream_message(session_id, user_input):
+            sent_any = True
+            yield chat_app.completion_chunk(response_id, created, {"content": token})
+    except Exception as e:
+        print(f"Error streaming agent response: {e}")
+        if not sent_any:
+            yield chat_app.completion_chunk(response_id, created, {"content": chat_app.FALLBACK_REPLY})
+    yield chat_app.completion_chunk(response_id, created, {}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+@app.route('/chat/completions', methods=['POST'])
+async def chat_completions():
+    session_id, user_input, streaming = chat_app.parse_chat_request(await request.get_json())
+    response_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if streaming:
+        response = Response(stream_completion(session_id, user_input, response_id, created),
+                            content_type='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        response.timeout = None  # a long reply must not be cut off by RESPONSE_TIMEOUT
+        return response
+
+    agent_response = await ask_agent(session_id, user_input) or {}
+    content = agent_response.get("output", chat_app.FALLBACK_REPLY)
+    return Response(chat_app.completion_body(response_id, created, content), content_type='application/json')
+
+
+@app.route('/cart/stream', methods=['GET'])
+async def cart_stream():
+    """app.py's cart stream, awaited on the loop so open pages hold no threads."""
+    session_id = session['session_id']
+    last_sent = request.headers.get('Last-Event-ID')
+    changed = CartTool.changes.asubscribe(session_id)
+
+    async def generate():
+        nonlocal last_sent
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                changed.clear()
+                body, etag = await asyncio.to_thread(web_app.cart_snapshot, session_id)
+                if etag != last_sent:
+                    last_sent = etag
+                    yield f"id: {etag}\ndata: {body}\n\n"
+                if not await changed.wait(web_app.CART_STREAM_RECHECK):
+                    yield ": keep-alive\n\n"
+        finally:
+            CartTool.changes.unsubscribe(session_id, changed)
+
+    response = Response(generate(), content_type='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
+
+
+@app.route('/orders/feed', methods=['GET'])
+async def order_feed():
+    """app.py's kitchen feed, awaited on the loop so open displays hold no threads."""
+    if not web_app.dispatch_authorized(request.headers.get('Authorization', '')):
+        return jsonify({'error': 'unauthorized'}), 401
+    feed = DeliveryTool.get_feed()
+    subscriber = feed.asubscribe()  # before the snapshot, so nothing falls in between
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    try:
+        snapshot = await asyncio.to_thread(DeliveryTool.get_orders_by_status, statuses) if statuses else None
+    except Exception:
+        feed.unsubscribe(subscriber)
+        raise
+
+    async def generate():
+        try:
+            yield "retry: 2000\n\n"
+            if snapshot is not None:
+                yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            while True:
+                try:
+                    event = await subscriber.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: order\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            feed.unsubscribe(subscriber)
+
+    response = Response(generate(), content_type='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
+
+
+_flask = WSGIMiddleware(web_app.app, workers=int(os.getenv('ASGI_WSGI_THREADS', '32')))
+
+
+async def application(scope, receive, send):
+    """Sends the agent endpoints (and lifespan events) to the async app, everything else to Flask."""
+    if scope['type'] == 'http' and scope['path'] not in ASYNC_PATHS:
+        await _flask(scope, receive, send)
+    else:
+        await app(scope, receive, send)
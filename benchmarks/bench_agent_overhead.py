@@ -0,0 +1,64 @@
+"""Benchmark: per-request overhead of serving a session with PizzaAgent.
+
+Compares building a fresh PizzaAgent for every request (the naive way to
+get per-session tools) with one shared agent that binds the session per
+call. The LLM is stubbed, so the numbers are pure framework overhead.
+
+Run from the repository root:
+    python -m benchmarks.bench_agent_overhead
+"""
+import contextlib
+import io
+import os
+import statistics
+import time
+
+os.environ.setdefault("AGENT_MEMORY_SUMMARIZE", "0")
+
+from agent import PizzaAgent
+from benchmarks.fake_llm import FakeChatModel
+from tools import CartTool
+
+REQUESTS = 200
+
+
+def _quiet_agent(llm):
+    agent = PizzaAgent(llm=llm)
+    agent.agent_executor.verbose = False
+    return agent
+
+
+def _timed(fn):
+    samples = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(REQUESTS):
+            started = time.perf_counter()
+            fn(i)
+            samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def run():
+    llm = FakeChatModel()
+    shared = _quiet_agent(llm)
+
+    per_request = _timed(lambda i: _quiet_agent(llm).process_message(f"s{i % 20}", "hello"))
+    shared_agent = _timed(lambda i: shared.process_message(f"s{i % 20}", "hello"))
+    with_tool = _timed(lambda i: shared.process_message(f"s{i % 20}", "what is in my cart?"))
+
+    print(f"{'mode':<34}{'mean ms':>10}{'p95 ms':>10}")
+    for label, samples in (("new agent per request", per_request),
+                           ("shared agent, session bound", shared_agent),
+                           ("shared agent, tool call", with_tool)):
+        p95 = statistics.quantiles(samples, n=20)[-1]
+        print(f"{label:<34}{statistics.mean(samples):>10.2f}{p95:>10.2f}")
+
+    CartTool.add_item("s1", "Margherita Classic", 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        reply = shared.process_message("s1", "show my cart")["output"]
+        other = shared.process_message("s2", "show my cart")["output"]
+    print(f"\nsession s1 -> {reply!r}\nsession s2 -> {other!r}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,96 @@
+"""Load test: agent endpoint throughput, Flask (WSGI) vs the async ASGI app.
+
+Starts each server in its own process with a stubbed LLM that answers
+after BENCH_LLM_LATENCY seconds (default 1.0), then runs N concurrent
+conversations against POST /chat/completions, each sending
+BENCH_TURNS messages one after another. Servers:
+
+    flask-run      app2.py on the threaded Werkzeug server (what the Dockerfile ran)
+    gunicorn-sync  app2.py on gunicorn sync workers (BENCH_GUNICORN_WORKERS, default 4)
+    asgi           asgi_app.py on uvicorn, one process
+
+The fast path and memory summaries are disabled so every turn waits on
+the LLM. Reports throughput, latency percentiles and failed requests
+(BENCH_TIMEOUT seconds per request).
+
+Run from the repository root:
+    python -m benchmarks.bench_async_serving
+    BENCH_CONCURRENCY=10,100,500 BENCH_SERVERS=flask-run,asgi python -m benchmarks.bench_async_serving
+"""
+import asyncio
+import importlib.util
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import servers
+
+LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "1.0"))
+CONCURRENCY = [int(n) for n in os.getenv("BENCH_CONCURRENCY", "10,100,300").split(",")]
+TURNS = int(os.getenv("BENCH_TURNS", "3"))
+TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "60"))
+GUNICORN_WORKERS = int(os.getenv("BENCH_GUNICORN_WORKERS", "4"))
+SERVERS = os.getenv("BENCH_SERVERS", "flask-run,gunicorn-sync,asgi").split(",")
+SERVER_MODES = {"flask-run": "flask-run", "gunicorn-sync": "gunicorn", "asgi": "asgi"}
+
+
+def start_server(name, tmp):
+    return servers.start_server(SERVER_MODES[name], "app2", tmp, workers=GUNICORN_WORKERS, latency=LLM_LATENCY,
+                                env={"AGENT_FAST_PATH": "0", "AGENT_MEMORY_SUMMARIZE": "0"})
+
+
+async def _conversation(session, url, user, latencies, failures):
+    for turn in range(TURNS):
+        started = time.perf_counter()
+        try:
+            async with session.post(f"{url}/chat/completions", json={
+                "phone": f"bench-{user}",
+                "messages": [{"role": "user", "content": f"hello, this is turn {turn}"}],
+            }) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError(response.status)
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            failures.append(time.perf_counter() - started)
+
+
+async def load(url, concurrency):
+    import aiohttp
+
+    latencies, failures = [], []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=TIMEOUT)) as session:
+        # One warm-up turn so imports and first-request setup are not measured.
+        await _conversation(session, url, "warmup", [], [])
+        started = time.perf_counter()
+        await asyncio.gather(*(_conversation(session, url, user, latencies, failures)
+                               for user in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, failures, elapsed
+
+
+def _pct(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else (samples or [0])[0]
+
+
+def run():
+    names = [s for s in SERVERS if s != "gunicorn-sync" or importlib.util.find_spec("gunicorn")]
+    print(f"stub LLM latency {LLM_LATENCY:.2f}s, {TURNS} turns per conversation, {os.cpu_count()} CPU(s)")
+    print(f"{'server':<15}{'conversations':>14}{'req/s':>9}{'p50 s':>8}{'p95 s':>8}{'p99 s':>8}{'failed':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in names:
+            process, url = start_server(name, tmp)
+            try:
+                for concurrency in CONCURRENCY:
+                    latencies, failures, elapsed = asyncio.run(load(url, concurrency))
+                    print(f"{name:<15}{concurrency:>14}{len(latencies) / elapsed:>9.1f}"
+                          f"{_pct(latencies, 50):>8.2f}{_pct(latencies, 95):>8.2f}{_pct(latencies, 99):>8.2f}"
+                          f"{len(failures):>8}")
+            finally:
+                servers.stop_server(process)
+
+
+if __name__ == "__main__":
+    run()
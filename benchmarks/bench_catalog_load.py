@@ -0,0 +1,109 @@
+"""Benchmark: catalog cold start and per-worker memory, JSON vs compiled binary.
+
+Generates a synthetic catalog (BENCH_CATALOG_ITEMS, default 50000 items),
+compiles it with catalog_bin, then loads each form in a fresh interpreter,
+the way a newly forked worker would, and does the lookups an order needs.
+Reports load time, lookup time and resident memory split into private
+(anonymous) pages, which every worker pays for, and file-backed pages,
+which workers mapping the same file share through the page cache. The
+last columns add the modifier index, which both forms build on the
+first order with toppings.
+
+Run from the repository root:
+    python -m benchmarks.bench_catalog_load
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ITEMS = int(os.getenv("BENCH_CATALOG_ITEMS", "50000"))
+
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+from catalog import CatalogSnapshot
+
+def rss():
+    fields = {{}}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+before = rss()
+started = time.perf_counter()
+snapshot = CatalogSnapshot.load({path!r})
+loaded = time.perf_counter() - started
+
+started = time.perf_counter()
+for name in {names!r}:
+    product = snapshot.products[name]
+    assert product["price"] > 0
+lookups = time.perf_counter() - started
+loaded_rss = rss()
+
+started = time.perf_counter()
+# An exact name: fragments such as "jalapeno" match many toppings and resolve to None.
+assert snapshot.modifiers.lookup("Jalapeno 0 Topping")["name"] == "Jalapeno 0 Topping"
+modifiers = time.perf_counter() - started
+
+after = rss()
+print(json.dumps({{
+    "load_ms": loaded * 1000,
+    "lookup_ms": lookups * 1000,
+    "modifier_ms": modifiers * 1000,
+    "anon_mb": loaded_rss["RssAnon"] - before["RssAnon"],
+    "file_mb": loaded_rss["RssFile"] - before["RssFile"],
+    "anon_total_mb": after["RssAnon"] - before["RssAnon"],
+}}))
+"""
+
+
+def build_catalog(size):
+    items = []
+    for i in range(size):
+        if i % 50 == 0:
+            items.append({"name": f"Jalapeno {i} Topping", "description": "Spicy jalapeno slices topping",
+                          "price": 80, "category": "topping"})
+        else:
+            items.append({"name": f"Store Pizza {i}", "price": 399 + i % 300, "category": "pizza",
+                          "description": f"Hand-stretched base with house sauce, mozzarella and chef's pick #{i % 97}."})
+    return items
+
+
+def probe(path, names):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = PROBE.format(root=root, path=path, names=names)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run():
+    from catalog_bin import build
+
+    items = build_catalog(ITEMS)
+    names = [items[i]["name"].lower() for i in range(0, ITEMS, max(1, ITEMS // 20))]
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "catalog.json")
+        bin_path = os.path.join(tmp, "catalog.bin")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(items, f)
+        build(items, bin_path)
+
+        print(f"{ITEMS} items: JSON {os.path.getsize(json_path) / 1e6:.1f} MB, "
+              f"binary {os.path.getsize(bin_path) / 1e6:.1f} MB")
+        print(f"{'format':<10}{'load ms':>10}{'20 lookups ms':>15}{'private MB':>12}{'shared MB':>11}"
+              f"{'+ modifier index ms':>21}{'private MB':>12}")
+        for label, path in (("json", json_path), ("binary", bin_path)):
+            result = probe(path, names)
+            print(f"{label:<10}{result['load_ms']:>10.1f}{result['lookup_ms']:>15.2f}"
+                  f"{result['anon_mb']:>12.1f}{result['file_mb']:>11.1f}"
+                  f"{result['modifier_ms']:>21.1f}{result['anon_total_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,63 @@
+"""Microbenchmark: modifier resolution in CartTool.add_item.
+
+Compares the old substring scan over every product against the
+precomputed ModifierIndex on a large synthetic catalog. Every query names
+one modifier unambiguously (a full name or a unique fragment), so both
+resolve it to the same product; this is checked before timing.
+
+Run from the repository root:
+    python -m benchmarks.bench_modifier_lookup
+"""
+import random
+import time
+import timeit
+
+from search_index import ModifierIndex
+
+CATALOG_SIZE = 50_000
+TOPPINGS = 400
+# Full names, a unique fragment ("blanket") and toppings late in the catalog ("317 topping").
+QUERIES = ["cheese burst", "blanket", "paneer topping", "black olive topping", "317 topping", "399 topping"]
+
+
+def build_catalog(size, toppings):
+    rng = random.Random(42)
+    words = ["Paneer", "Jalapeno", "Extra Cheese", "Mushroom", "Black Olive", "Onion", "Bacon", "Ham"]
+    products = [{"name": f"Pizza {i}", "price": 499, "category": "pizza"} for i in range(size - toppings - 2)]
+    products += [{"name": "Cheese Burst", "price": 150, "category": "customization"},
+                 {"name": "Cheese Blanket", "price": 250, "category": "customization"}]
+    for i in range(toppings):
+        base = words[i] if i < len(words) else f"{rng.choice(words)} {i}"
+        products.append({"name": f"{base} Topping", "price": 80, "category": "topping"})
+    return products
+
+
+def scan_lookup(products, mod):
+    """The original resolution: first product whose name contains the text."""
+    mod_lower = mod.lower()
+    return next((p for p in products if mod_lower in p["name"].lower()), None)
+
+
+def run():
+    products = build_catalog(CATALOG_SIZE, TOPPINGS)
+    modifiers = [p for p in products if p["category"] in ("topping", "customization")]
+
+    started = time.perf_counter()
+    index = ModifierIndex(modifiers)
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"catalog: {len(products)} products, {len(modifiers)} modifiers; index build {build_ms:.1f} ms")
+
+    for mod in QUERIES:
+        expected = scan_lookup(products, mod)
+        if expected is None or index.lookup(mod) != expected:
+            raise SystemExit(f"'{mod}': index returned {index.lookup(mod)}, scan returned {expected}")
+
+    print(f"{'modifier':<20}{'scan (us)':>14}{'index (us)':>14}{'speedup':>10}")
+    for mod in QUERIES:
+        scan = min(timeit.repeat(lambda: scan_lookup(products, mod), number=20, repeat=3)) / 20
+        indexed = min(timeit.repeat(lambda: index.lookup(mod), number=20000, repeat=3)) / 20000
+        print(f"{mod:<20}{scan * 1e6:>14.1f}{indexed * 1e6:>14.2f}{scan / indexed:>9.0f}x")
+
+
+if __name__ == "__main__":
+    run()
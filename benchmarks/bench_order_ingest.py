@@ -0,0 +1,148 @@
+"""Benchmark: order ingestion throughput, per-order commit vs write-behind batches.
+
+Uses an on-disk SQLite database (synchronous=FULL, so every commit is
+durable) as a stand-in for Postgres. Several threads submit orders
+concurrently, like checkout requests during a rush. Each transaction also
+sleeps BENCH_DB_RTT_MS (default 2) to model the network round trip to a
+hosted Postgres; set it to 0 for raw local numbers.
+
+Run from the repository root:
+    python -m benchmarks.bench_order_ingest
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from order_sink import WriteBehindOrderSink
+
+ORDERS = 2000
+THREADS = 8
+DB_RTT = float(os.getenv("BENCH_DB_RTT_MS", "2")) / 1000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS orders (
+        order_id INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        product_details TEXT NOT NULL,
+        user_details TEXT NOT NULL,
+        payment_status TEXT,
+        delivery_status TEXT DEFAULT 'pending',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        payment_ref TEXT UNIQUE
+    )
+"""
+
+
+class SQLiteOrders:
+    """Minimal SQLite version of the DeliveryTool order writes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._id_lock = threading.Lock()
+        self.conn().execute(SCHEMA)
+        self.conn().execute("CREATE TABLE IF NOT EXISTS order_seq (id INTEGER NOT NULL)")
+        if self.conn().execute("SELECT COUNT(*) FROM order_seq").fetchone()[0] == 0:
+            self.conn().execute("INSERT INTO order_seq VALUES (0)")
+        self.conn().commit()
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def log_order(self, session_id, products, user_details, payment_status):
+        time.sleep(DB_RTT)
+        conn = self.conn()
+        cur = conn.execute(
+            "INSERT INTO orders (session_id, product_details, user_details, payment_status) VALUES (?, ?, ?, ?)",
+            (session_id, json.dumps(products), json.dumps(user_details), payment_status),
+        )
+        conn.commit()
+        return cur.lastrowid
+
+    def allocate_ids(self, count):
+        with self._id_lock:
+            time.sleep(DB_RTT)
+            conn = self.conn()
+            conn.execute("UPDATE order_seq SET id = id + ?", (count,))
+            last = conn.execute("SELECT id FROM order_seq").fetchone()[0]
+            conn.commit()
+        return list(range(last - count + 1, last + 1))
+
+    def insert_batch(self, rows):
+        time.sleep(DB_RTT)
+        conn = self.conn()
+        conn.executemany(
+            "INSERT OR IGNORE INTO orders (order_id, session_id, product_details, user_details, payment_status,"
+            " delivery_status, payment_ref, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(r["order_id"], r["session_id"], json.dumps(r["products"]), json.dumps(r["user"]),
+              r["payment_status"], r["delivery_status"], r["payment_ref"], r["created_at"]) for r in rows],
+        )
+        conn.commit()
+
+    def count(self):
+        return self.conn().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+def _drive(submit):
+    per_thread = ORDERS // THREADS
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(t):
+        local = []
+        for i in range(per_thread):
+            started = time.perf_counter()
+            submit(f"session-{t}-{i}", {"Margherita Classic": 1}, {"name": "Bench", "phone": "0"}, "pending")
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(THREADS)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def _report(label, elapsed, latencies, total):
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{label:<26}{total / elapsed:>10.0f}{latencies[len(latencies) // 2] * 1000:>11.2f}{p99:>11.2f}")
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{ORDERS} orders from {THREADS} threads, {DB_RTT * 1000:.1f} ms simulated DB round trip")
+        print(f"{'mode':<26}{'orders/s':>10}{'p50 ms':>11}{'p99 ms':>11}")
+
+        direct = SQLiteOrders(os.path.join(tmp, "direct.db"))
+        elapsed, latencies = _drive(direct.log_order)
+        _report("per-order commit", elapsed, latencies, direct.count())
+
+        batched = SQLiteOrders(os.path.join(tmp, "batched.db"))
+        sink = WriteBehindOrderSink(os.path.join(tmp, "journal"), batched.insert_batch, batched.allocate_ids,
+                                    batch_size=200, max_latency=0.2)
+        elapsed, latencies = _drive(sink.submit)
+        sink.close()
+        _report("write-behind (acked)", elapsed, latencies, ORDERS)
+        print(f"  rows in database after flush: {batched.count()}, batches: {sink.stats['batches']}")
+
+        sink_nofsync = WriteBehindOrderSink(os.path.join(tmp, "journal2"), batched.insert_batch,
+                                            batched.allocate_ids, batch_size=200, max_latency=0.2, fsync=False)
+        elapsed, latencies = _drive(sink_nofsync.submit)
+        sink_nofsync.close()
+        _report("write-behind, no fsync", elapsed, latencies, ORDERS)
+
+
+if __name__ == "__main__":
+    run()
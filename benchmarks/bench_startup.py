@@ -0,0 +1,121 @@
+"""Benchmark: cold start of the Flask entry points (app.py, app1.py, app2.py).
+
+For each app, in a fresh interpreter:
+  * ``python -X importtime -c "import <app>"`` with AGENT_WARMUP=0, so only
+    the import itself is measured; reports the total and the modules with
+    the largest cumulative import time;
+  * time until ``/healthz`` answers and until ``/readyz`` reports the
+    agent warmed up (OPENAI_API_KEY defaults to a dummy value; no request
+    reaches OpenAI while warming up).
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --root /path/to/other/checkout   # e.g. an older revision
+    python -m benchmarks.bench_startup --report benchmarks/startup_importtime.txt
+
+benchmarks/startup_importtime.txt is the checked-in report: this tree
+after lazy imports and background warm-up, then the tree before them.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APPS = ("app", "app1", "app2")
+TOP = int(os.getenv("BENCH_STARTUP_TOP", "12"))
+RUNS = int(os.getenv("BENCH_STARTUP_RUNS", "3"))
+
+PROBE = r"""
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import {app} as module
+imported = time.perf_counter()
+# What the server does once it runs in the worker (trees that warm up at import have no hook).
+getattr(sys.modules.get("agent"), "start_warmup", lambda: None)()
+client = module.app.test_client()
+# Trees without /healthz build the agent during import: ready once the app answers.
+has_health = client.get("/healthz").status_code == 200
+healthy = time.perf_counter()
+while has_health and client.get("/readyz").status_code != 200:
+    if time.perf_counter() - started > 120:
+        raise SystemExit("agent never became ready")
+    time.sleep(0.01)
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "healthz_ms": (healthy - started) * 1000,
+    "ready_ms": (ready - started) * 1000,
+}}))
+"""
+
+
+def _env(**extra):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-bench")
+    env.update(extra)
+    return env
+
+
+def import_profile(root, app):
+    """(total_us, [(cumulative_us, self_us, module), ...]) from ``-X importtime``."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {app}"], cwd=root,
+                            env=_env(AGENT_WARMUP="0"), capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.rstrip()))
+    total = next(c for c, _, name in reversed(rows) if name.strip() == app)
+    return total, rows
+
+
+def probe(root, app):
+    code = PROBE.format(root=root, app=app)
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, env=_env(),
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(root, label, out=print):
+    out(f"Startup of the Flask entry points: {label}")
+    out(f"(best of {RUNS} runs; python {sys.version.split()[0]})")
+    out("")
+    out(f"{'app':<8}{'import ms':>11}{'/healthz ms':>13}{'agent ready ms':>16}")
+    profiles = {}
+    for app in APPS:
+        best = min((import_profile(root, app) for _ in range(RUNS)), key=lambda p: p[0])
+        profiles[app] = best
+        timings = min((probe(root, app) for _ in range(RUNS)), key=lambda t: t["healthz_ms"])
+        out(f"{app:<8}{best[0] / 1000:>11.0f}{timings['healthz_ms']:>13.0f}{timings['ready_ms']:>16.0f}")
+
+    for app, (total, rows) in profiles.items():
+        out("")
+        out(f"-X importtime: {app} ({total / 1000:.0f} ms), top {TOP} by cumulative time")
+        out(f"{'cumulative us':>14}{'self us':>10}  module")
+        for cumulative, self_us, name in sorted(rows, reverse=True)[:TOP]:
+            out(f"{cumulative:>14}{self_us:>10}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument("--label", default="working tree", help="name for the profiled tree in the report")
+    parser.add_argument("--report", help="append the results to this file")
+    args = parser.parse_args()
+    lines = []
+
+    def out(line):
+        print(line)
+        lines.append(line)
+
+    run(os.path.abspath(args.root), args.label, out)
+    if args.report:
+        with open(args.report, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Deterministic stand-in for ChatOpenAI used by the benchmarks.
+
+The model never calls the network. By default it answers the latest human
+message with a canned reply, and calls the ``view_cart`` tool first when the
+customer mentions their cart, so the tool path is exercised as well.
+``ordering_responder`` follows a scripted ordering conversation instead
+(menu, add items, cart, total, payment), calling the matching tool per turn.
+The async methods wait with ``asyncio.sleep``, like a network-bound client,
+so async serving is not measured through a thread pool.
+"""
+import asyncio
+import json
+import re
+import time
+import uuid
+from typing import Any, Callable, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+def _tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}])
+
+
+def _last_human(messages: List[BaseMessage]) -> str:
+    return next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+
+
+def default_responder(messages: List[BaseMessage]) -> AIMessage:
+    last = messages[-1]
+    if isinstance(last, ToolMessage):
+        return AIMessage(content=f"Here you go: {last.content}")
+    human = _last_human(messages)
+    if "cart" in human.lower():
+        return _tool_call("view_cart", {})
+    return AIMessage(content=f"Sure! You said: {human}")
+
+
+_ADD = re.compile(r"\badd (\d+) (.+)", re.IGNORECASE)
+_PAY = re.compile(r"\bpay by (upi|cod)(?: (\S+@\S+))?, name (.+?), address (.+?), phone (\+?\d+)", re.IGNORECASE)
+
+
+def ordering_responder(messages: List[BaseMessage]) -> AIMessage:
+    """Scripted ordering assistant: one tool call per customer turn, then a reply built from its output.
+
+    Understands "add <qty> <item>", "pay by cod|upi [<upi id>], name <name>,
+    address <address>, phone <digits>" and mentions of the menu, toppings,
+    cart or total.
+    """
+    last = messages[-1]
+    if isinstance(last, ToolMessage):
+        return AIMessage(content=f"Done. {last.content}")
+    human = _last_human(messages)
+    text = human.lower()
+    pay = _PAY.search(human)
+    if pay:
+        method, upi_id, name, address, phone = pay.groups()
+        return _tool_call("process_payment", {"method": method.lower(), "name": name, "address": address,
+                                              "phone": phone, "upi_id": upi_id or ""})
+    add = _ADD.search(human)
+    if add:
+        return _tool_call("add_to_cart", {"item": add.group(2).strip(), "qty": int(add.group(1))})
+    if "topping" in text or "customi" in text:
+        return _tool_call("Search_customization", {})
+    if "menu" in text or "pizzas" in text:
+        return _tool_call("load_menu", {})
+    if "total" in text:
+        return _tool_call("calculate_total", {})
+    if "cart" in text:
+        return _tool_call("view_cart", {})
+    return AIMessage(content="Happy to help! Would you like to see the menu?")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model whose replies come from ``responder(messages)`` after ``latency`` seconds."""
+
+    responder: Callable[[List[BaseMessage]], AIMessage] = default_responder
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.responder(messages))])
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        message = self.responder(messages)
+        if message.tool_calls:
+            if self.latency:
+                time.sleep(self.latency)
+            chunk = AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ])
+            yield ChatGenerationChunk(message=chunk)
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            if self.latency:
+                time.sleep(self.latency / len(words))
+            token = word if i == 0 else " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self.responder(messages))])
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any):
+        message = self.responder(messages)
+        if message.tool_calls:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": call["name"], "args": json.dumps(call["args"]), "id": call["id"], "index": i}
+                for i, call in enumerate(message.tool_calls)
+            ]))
+            return
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            if self.latency:
+                await asyncio.sleep(self.latency / len(words))
+            token = word if i == 0 else " " + word
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
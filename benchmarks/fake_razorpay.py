@@ -0,0 +1,160 @@
+"""Local stand-in for the Razorpay orders API.
+
+Implements just what PaymentTool uses:
+    POST /v1/orders                 create an order
+    GET  /v1/orders/<id>            fetch an order (including notes)
+    GET  /v1/orders/<id>/payments   list payments for an order
+
+Every order is paid ``capture_after`` seconds after it is created. When
+``webhook_url`` is set, a signed ``order.paid`` webhook is delivered at that
+moment, like Razorpay would.
+
+Point the app at it with RAZORPAY_BASE_URL=http://127.0.0.1:<port>, or run
+it standalone:
+    python -m benchmarks.fake_razorpay --port 8765 --capture-after 2
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeRazorpayServer:
+    def __init__(self, host="127.0.0.1", port=0, capture_after=1.0, webhook_url=None,
+                 webhook_secret=None, latency=0.0):
+        self.capture_after = capture_after
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.latency = latency
+        self.orders = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _create_order(self, data):
+        order_id = f"order_{uuid.uuid4().hex[:14]}"
+        order = {
+            "id": order_id,
+            "entity": "order",
+            "amount": data.get("amount"),
+            "currency": data.get("currency", "INR"),
+            "status": "created",
+            "notes": data.get("notes") or {},
+            "created_at": int(time.time()),
+        }
+        with self._lock:
+            self.orders[order_id] = {"order": order, "created": time.monotonic(), "paid": False}
+        if self.capture_after is not None:
+            timer = threading.Timer(self.capture_after, self._capture, args=(order_id,))
+            timer.daemon = True
+            timer.start()
+        return order
+
+    def _capture(self, order_id):
+        with self._lock:
+            entry = self.orders[order_id]
+            entry["paid"] = True
+            entry["order"]["status"] = "paid"
+            order = dict(entry["order"])
+        if self.webhook_url:
+            body = json.dumps({"event": "order.paid", "payload": {"order": {"entity": order}}}).encode()
+            signature = hmac.new((self.webhook_secret or "").encode(), body, hashlib.sha256).hexdigest()
+            request = urllib.request.Request(self.webhook_url, data=body, headers={
+                "Content-Type": "application/json", "X-Razorpay-Signature": signature,
+            })
+            try:
+                urllib.request.urlopen(request, timeout=5).read()
+            except Exception as e:
+                print(f"Fake Razorpay: webhook delivery failed: {e}")
+
+    def _payments(self, order_id):
+        with self._lock:
+            entry = self.orders[order_id]
+            status = "captured" if entry["paid"] else "created"
+            amount = entry["order"]["amount"]
+        return {"entity": "collection", "count": 1, "items": [{
+            "id": f"pay_{order_id[6:]}", "entity": "payment", "order_id": order_id,
+            "amount": amount, "status": status, "method": "upi",
+        }]}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _not_found(self):
+                self._reply(400, {"error": {"code": "BAD_REQUEST_ERROR", "description": "The id provided does not exist"}})
+
+            def do_POST(self):
+                server.requests += 1
+                length = int(self.headers.get("Content-Length") or 0)
+                data = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                if self.path.rstrip("/") == "/v1/orders":
+                    return self._reply(200, server._create_order(data))
+                self._not_found()
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if len(parts) >= 3 and parts[:2] == ["v1", "orders"] and parts[2] in server.orders:
+                    if len(parts) == 3:
+                        with server._lock:
+                            return self._reply(200, server.orders[parts[2]]["order"])
+                    if len(parts) == 4 and parts[3] == "payments":
+                        return self._reply(200, server._payments(parts[2]))
+                self._not_found()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--capture-after", type=float, default=2.0)
+    parser.add_argument("--webhook-url")
+    parser.add_argument("--webhook-secret")
+    args = parser.parse_args()
+    server = FakeRazorpayServer(port=args.port, capture_after=args.capture_after,
+                                webhook_url=args.webhook_url, webhook_secret=args.webhook_secret)
+    print(f"Fake Razorpay listening on {server.base_url}")
+    server._httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Offline load test of the ordering flows in app.py, app1.py and app2.py.
+
+Every simulated customer runs the same scripted order, one turn after
+another: ask for the menu, add pizzas (two with a customization), check
+the cart and the total, then pay (cash on delivery, or UPI for every
+--upi-every'th customer). Targets:
+
+    web          app.py     GET / for the session cookie, then POST /process_message
+    voice        app1.py    POST /voice, then Twilio form posts to /handle_input (following
+                            /voice_result redirects on slow turns)
+    chat         app2.py    POST /chat/completions with the growing message history
+    chat-stream  app2.py    the same with "stream": true (also reports time to first token)
+
+Nothing leaves the machine:
+- the agent runs on benchmarks.fake_llm's ``ordering_responder``, which takes
+  --llm-latency seconds per call;
+- Razorpay is benchmarks.fake_razorpay (UPI payments are captured after 1s);
+- orders go to a throwaway Postgres started with pgserver, or to --db-url.
+
+Each (server, target) pair gets a fresh server process. The report gives
+latency percentiles per turn, throughput, failed turns and the resident
+memory of each worker. Orders logged in the database are checked against
+completed checkouts.
+Use --save to keep the results as JSON. With --baseline, the run is
+compared against saved results and exits with status 1 when p95 latency
+or throughput is more than --tolerance worse.
+
+Run from the repository root:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --servers asgi --targets chat,chat-stream --users 200 --save before.json
+    python -m benchmarks.load_test --servers asgi --targets chat,chat-stream --users 200 --baseline before.json
+"""
+import argparse
+import asyncio
+import html
+import importlib.util
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks import servers
+from benchmarks.fake_razorpay import FakeRazorpayServer
+
+TARGETS = {"web": "app", "voice": "app1", "chat": "app2", "chat-stream": "app2"}
+WEBHOOK_SECRET = "bench-webhook-secret"
+_RESULT_REDIRECT = re.compile(r"<Redirect[^>]*>(/voice_result[^<]*)</Redirect>")
+
+
+def script(user: int, upi: bool) -> list:
+    payment = f"pay by upi guest{user}@okbank" if upi else "pay by cod"
+    return [
+        "Hi, what pizzas do you have on the menu?",
+        "add 2 Margherita Classic with Cheese Burst",
+        "add 1 Classic Pepperoni",
+        "what is in my cart",
+        "what is the total",
+        f"{payment}, name Guest {user}, address {user} MG Road Bengaluru, phone {9800000000 + user}",
+    ]
+
+
+class Conversation:
+    """One customer's turns against one target, recording each turn's latency."""
+
+    def __init__(self, http, url, target, user, upi):
+        self.http = http
+        self.url = url
+        self.target = target
+        self.user = user
+        self.turns = script(user, upi)
+        self.phone = f"+91{9800000000 + user}"
+        self.history = []
+
+    async def start(self):
+        if self.target == "web":
+            async with self.http.get(f"{self.url}/") as response:
+                await response.read()
+        elif self.target == "voice":
+            async with self.http.post(f"{self.url}/voice", data={"From": self.phone}) as response:
+                await response.read()
+
+    async def turn(self, text):
+        """Sends one turn; returns (reply text, seconds to first token or None)."""
+        if self.target == "web":
+            async with self.http.post(f"{self.url}/process_message", json={"message": text}) as response:
+                response.raise_for_status()
+                return (await response.json())["response"], None
+        if self.target == "voice":
+            async with self.http.post(f"{self.url}/handle_input",
+                                      data={"From": self.phone, "SpeechResult": text}) as response:
+                response.raise_for_status()
+                twiml = await response.text()
+            # A slow turn answers with a filler and a redirect; follow it like Twilio until the answer comes.
+            while (redirect := _RESULT_REDIRECT.search(twiml)) is not None:
+                async with self.http.post(f"{self.url}{html.unescape(redirect.group(1))}",
+                                          data={"From": self.phone}) as response:
+                    response.raise_for_status()
+                    twiml = await response.text()
+            return twiml, None
+
+        self.history.append({"role": "user", "content": text})
+        payload = {"phone": self.phone, "messages": self.history, "stream": self.target == "chat-stream"}
+        started = time.perf_counter()
+        async with self.http.post(f"{self.url}/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            if self.target == "chat":
+                reply = (await response.json())["choices"][0]["message"]["content"]
+                first_token = None
+            else:
+                reply, first_token = "", None
+                async for line in response.content:
+                    line = line.decode().strip()
+                    if not line.startswith("data: ") or line == "data: [DONE]":
+                        continue
+                    content = json.loads(line[6:])["choices"][0]["delta"].get("content")
+                    if content:
+                        if first_token is None:
+                            first_token = time.perf_counter() - started
+                        reply += content
+        self.history.append({"role": "assistant", "content": reply})
+        return reply, first_token
+
+
+async def run_conversation(http, url, target, user, upi, think, stats, pay=True):
+    conversation = Conversation(http, url, target, user, upi)
+    if not pay:
+        conversation.turns.pop()
+    try:
+        await conversation.start()
+    except Exception as e:
+        stats["failed"].append(f"start: {e!r}")
+        return
+    for i, text in enumerate(conversation.turns):
+        if think and i:
+            await asyncio.sleep(think)
+        started = time.perf_counter()
+        try:
+            reply, first_token = await conversation.turn(text)
+        except Exception as e:
+            stats["failed"].append(f"turn {i + 1}: {e!r}")
+            return
+        stats["latencies"].append(time.perf_counter() - started)
+        if first_token is not None:
+            stats["first_token"].append(first_token)
+        if not reply or "Error" in reply:
+            stats["failed"].append(f"turn {i + 1}: {reply[:120]!r}")
+            return
+    stats["checkouts"] += 1
+
+
+async def load(url, target, args):
+    import aiohttp
+
+    stats = {"latencies": [], "first_token": [], "failed": [], "checkouts": 0}
+    connector = aiohttp.TCPConnector(limit=0)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+
+    def session():  # one cookie jar per customer, sharing the connection pool
+        return aiohttp.ClientSession(connector=connector, connector_owner=False, timeout=timeout,
+                                     cookie_jar=aiohttp.CookieJar(unsafe=True))  # the server is an IP address
+
+    async def customer(user):
+        async with session() as http:
+            await run_conversation(http, url, target, user, args.upi_every and user % args.upi_every == 0,
+                                   args.think, stats)
+
+    # One conversation (without checkout) first, so imports, catalog loading and
+    # first-request setup are not measured.
+    async with session() as http:
+        await run_conversation(http, url, target, 10 ** 6, False, 0,
+                               {"latencies": [], "first_token": [], "failed": [], "checkouts": 0}, pay=False)
+    started = time.perf_counter()
+    await asyncio.gather(*(customer(user) for user in range(args.users)))
+    elapsed = time.perf_counter() - started
+    await connector.close()
+    return stats, elapsed
+
+
+def count_orders(db_url):
+    import psycopg2
+
+    with psycopg2.connect(db_url) as conn, conn.cursor() as cur:
+        cur.execute("SELECT count(*) FROM orders")
+        return cur.fetchone()[0]
+
+
+def wait_for_orders(db_url, before, expected, settle):
+    """Orders logged since ``before``, waiting up to ``settle`` seconds for UPI captures to land."""
+    deadline = time.monotonic() + settle
+    while True:
+        logged = count_orders(db_url) - before
+        if logged >= expected or time.monotonic() >= deadline:
+            return logged
+        time.sleep(0.5)
+
+
+def _pct(samples, q):
+    if not samples:
+        return None
+    return statistics.quantiles(samples, n=100)[q - 1] if len(samples) > 1 else samples[0]
+
+
+def run_target(server, target, args, db_url, razorpay, tmp):
+    module = TARGETS[target]
+    env = {
+        "RENDER_DB_URL": db_url,
+        "RAZORPAY_BASE_URL": razorpay.base_url,
+        "RAZORPAY_KEY_ID": "rzp_test_bench",
+        "RAZORPAY_KEY_SECRET": "bench-secret",
+        "RAZORPAY_WEBHOOK_SECRET": WEBHOOK_SECRET,
+    }
+    if server == "gunicorn" and "CART_STORE" not in os.environ:
+        # Carts must be shared between workers: a web session's requests land on any of them.
+        env.update(CART_STORE="sqlite", CART_DB_PATH=os.path.join(tmp, f"carts_{target}.db"))
+    process, url = servers.start_server(server, module, tmp, env=env, workers=args.workers,
+                                        latency=args.llm_latency, responder="ordering_responder")
+    # Only app.py (directly or behind asgi_app) has the webhook route; elsewhere the poller confirms.
+    razorpay.webhook_url = f"{url}/razorpay/webhook" if module == "app" or server == "asgi" else None
+    try:
+        before = count_orders(db_url)
+        stats, elapsed = asyncio.run(load(url, target, args))
+        orders = wait_for_orders(db_url, before, stats["checkouts"], args.settle)
+        workers = servers.worker_memory(process.pid)
+    finally:
+        servers.stop_server(process)
+
+    latencies = stats["latencies"]
+    return {
+        "server": server,
+        "target": target,
+        "users": args.users,
+        "turns": len(latencies),
+        "failed": len(stats["failed"]),
+        "failures": stats["failed"][:5],
+        "elapsed_s": elapsed,
+        "req_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": _pct(latencies, 50),
+        "p95_s": _pct(latencies, 95),
+        "p99_s": _pct(latencies, 99),
+        "first_token_p50_s": _pct(stats["first_token"], 50),
+        "first_token_p95_s": _pct(stats["first_token"], 95),
+        "checkouts": stats["checkouts"],
+        "orders_logged": orders,
+        "workers": [{"pid": pid, "rss_mb": rss, "peak_mb": peak} for pid, rss, peak in workers],
+    }
+
+
+def _fmt(value, width, digits=2):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+
+def print_result(r):
+    peak = max((w["peak_mb"] for w in r["workers"]), default=None)
+    rss = max((w["rss_mb"] for w in r["workers"]), default=None)
+    print(f"{r['server']:<10}{r['target']:<13}{r['turns']:>7}{r['failed']:>7}{_fmt(r['req_per_s'], 8, 1)}"
+          f"{_fmt(r['p50_s'], 7)}{_fmt(r['p95_s'], 7)}{_fmt(r['p99_s'], 7)}{_fmt(r['first_token_p95_s'], 8)}"
+          f"{r['orders_logged']:>6}/{r['checkouts']:<4}{len(r['workers']):>8}{_fmt(rss, 8, 0)}{_fmt(peak, 8, 0)}")
+    for failure in r["failures"]:
+        print(f"    failed {failure}")
+
+
+def compare(results, baseline, tolerance):
+    """Prints changes against a saved run; returns True if any pair regressed beyond ``tolerance``."""
+    previous = {(r["server"], r["target"]): r for r in baseline["results"]}
+    regressed = False
+    print(f"\ncompared with the baseline (tolerance {tolerance:.0%}):")
+    for r in results:
+        base = previous.get((r["server"], r["target"]))
+        if base is None or not base["p95_s"] or not base["req_per_s"] or r["p95_s"] is None:
+            continue
+        p95 = r["p95_s"] / base["p95_s"] - 1
+        throughput = r["req_per_s"] / base["req_per_s"] - 1
+        worse = p95 > tolerance or throughput < -tolerance or r["failed"] > base["failed"]
+        regressed |= worse
+        print(f"  {r['server']:<10}{r['target']:<13} p95 {p95:+7.1%}  req/s {throughput:+7.1%}  "
+              f"failed {base['failed']} -> {r['failed']}{'  REGRESSION' if worse else ''}")
+    return regressed
+
+
+def start_database(tmp):
+    """A throwaway local Postgres (pgserver) for the orders table; returns (server, url)."""
+    if importlib.util.find_spec("pgserver") is None:
+        sys.exit("No database: pass --db-url (or BENCH_DB_URL), or pip install pgserver")
+    import pgserver
+
+    server = pgserver.get_server(os.path.join(tmp, "pgdata"), cleanup_mode="stop")
+    return server, server.get_uri()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", default="flask-run,gunicorn,asgi",
+                        help="comma-separated: flask-run, gunicorn, asgi")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"comma-separated: {', '.join(TARGETS)}")
+    parser.add_argument("--users", type=int, default=20, help="concurrent conversations per target")
+    parser.add_argument("--upi-every", type=int, default=4, help="every n'th customer pays by UPI (0: never)")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per fake LLM call")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds a customer waits between turns")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per request")
+    parser.add_argument("--settle", type=float, default=20.0, help="seconds to wait for UPI orders to be logged")
+    parser.add_argument("--db-url", default=os.getenv("BENCH_DB_URL"), help="Postgres URL (default: pgserver)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with results saved by --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    server_modes = [s for s in args.servers.split(",") if s != "gunicorn" or importlib.util.find_spec("gunicorn")]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database, db_url = (None, args.db_url) if args.db_url else start_database(tmp)
+        razorpay = FakeRazorpayServer(capture_after=1.0, webhook_secret=WEBHOOK_SECRET).start()
+        try:
+            from tools import DeliveryTool
+
+            DeliveryTool.DB_URL = db_url
+            DeliveryTool.setup_database()
+            print(f"{args.users} conversations x {len(script(0, False))} turns, fake LLM {args.llm_latency:.2f}s/call, "
+                  f"{os.cpu_count()} CPU(s)")
+            print(f"{'server':<10}{'target':<13}{'turns':>7}{'failed':>7}{'req/s':>8}{'p50 s':>7}{'p95 s':>7}"
+                  f"{'p99 s':>7}{'ttft95':>8}{'orders':>8}{'workers':>11}{'rss MB':>8}{'peak MB':>8}")
+            for server in server_modes:
+                for target in args.targets.split(","):
+                    result = run_target(server, target, args, db_url, razorpay, tmp)
+                    print_result(result)
+                    results.append(result)
+        finally:
+            razorpay.stop()
+            if database is not None:
+                database.cleanup()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"created": time.time(), "args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
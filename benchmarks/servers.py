@@ -0,0 +1,127 @@
+"""App servers for the benchmarks, each started in its own process with the fake LLM.
+
+    process, url = start_server("flask-run", "app2", tmp, latency=1.0)
+    ...
+    stop_server(process)
+
+Servers:
+    flask-run  the module's Flask app on the threaded Werkzeug server
+    gunicorn   the module's Flask app on gunicorn sync workers
+    asgi       asgi_app.py on uvicorn (serves every app's agent endpoints)
+
+The agent in every server (and every gunicorn worker) is a PizzaAgent
+over ``FakeChatModel(responder=<responder>, latency=<latency>)``, so no
+request reaches OpenAI. Warm-up is disabled so the real model is never built.
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INSTALL_AGENT = r"""
+import sys
+sys.path.insert(0, {root!r})
+import agent
+from benchmarks import fake_llm
+
+def install_agent():
+    llm = fake_llm.FakeChatModel(responder=getattr(fake_llm, {responder!r}), latency={latency!r})
+    agent._agent = agent.PizzaAgent(llm=llm)
+"""
+
+SERVE = {
+    "flask-run": INSTALL_AGENT + r"""
+install_agent()
+import {module} as target
+from werkzeug.serving import make_server
+make_server("127.0.0.1", {port}, target.app, threaded=True).serve_forever()
+""",
+    "asgi": INSTALL_AGENT + r"""
+install_agent()
+import asgi_app
+import uvicorn
+uvicorn.run(asgi_app.application, host="127.0.0.1", port={port}, log_level="warning", backlog=2048)
+""",
+}
+
+GUNICORN_CONFIG = INSTALL_AGENT + r"""
+def post_worker_init(worker):
+    install_agent()
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server, module, tmp, env=None, workers=4, latency=1.0, responder="default_responder"):
+    """Starts ``module`` (app, app1 or app2) under ``server``; returns (process, base url)."""
+    port = free_port()
+    params = {"root": ROOT, "latency": latency, "responder": responder, "port": port, "module": module}
+    full_env = dict(os.environ, OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "sk-bench"), AGENT_WARMUP="0",
+                    PYTHONPATH=ROOT)
+    full_env.update(env or {})
+    if server == "gunicorn":
+        config = os.path.join(tmp, f"gunicorn_{port}.py")
+        with open(config, "w") as f:
+            f.write(GUNICORN_CONFIG.format(**params))
+        command = [sys.executable, "-m", "gunicorn", "-c", config, "-w", str(workers),
+                   "-b", f"127.0.0.1:{port}", "--backlog", "2048", "--timeout", "120", f"{module}:app"]
+    else:
+        command = [sys.executable, "-c", SERVE[server].format(**params)]
+    process = subprocess.Popen(command, cwd=ROOT, env=full_env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{server} ({module}) exited with status {process.returncode}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{server} ({module}) did not start")
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def _status(pid):
+    fields = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.split()
+    return fields
+
+
+def worker_memory(pid):
+    """[(pid, rss MB, peak rss MB)] for a server process and its children (gunicorn workers). Linux only."""
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                if int(_status(entry)["PPid"][0]) == pid:
+                    pids.append(int(entry))
+            except (OSError, KeyError):
+                continue
+    memory = []
+    for p in pids:
+        try:
+            status = _status(p)
+        except OSError:
+            continue
+        memory.append((p, int(status["VmRSS"][0]) / 1024, int(status["VmHWM"][0]) / 1024))
+    # With gunicorn the arbiter only supervises; the workers serve requests.
+    return memory[1:] if len(memory) > 1 else memory
@@ -0,0 +1,242 @@
+"""Background preparation of a caller's session when a voice call starts.
+
+/voice calls ``CallPrep.start`` for the caller's session and answers right
+away. A worker thread loads the cart and the caller's recent orders, builds
+a personalized greeting with a reorder suggestion, and seeds the agent's
+memory with them. /voice waits at most VOICE_GREETING_WAIT seconds for the
+greeting (the generic welcome is used otherwise), and the first
+/handle_input waits at most VOICE_PREP_WAIT seconds for the rest, so no
+Twilio webhook waits on cold state.
+
+Preparation is tied to the Twilio call (its CallSid): a new call from the
+same number is prepared afresh. The agent's notes are rebuilt whenever the
+caller's cart changes, e.g. after adding items or checking out, so they
+never describe a cart or order history that is out of date.
+
+Preparation lives in the process that answered /voice: with several
+workers, a call that moves to another worker simply starts cold there.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+import pricing
+from agent import agent_status, get_pizza_agent
+from tools import CartTool, DeliveryTool
+
+
+class _Call:
+    __slots__ = ("call_sid", "started", "greeting", "greeted", "future", "past", "stale", "refreshing")
+
+    def __init__(self, call_sid):
+        self.call_sid = call_sid
+        self.started = time.monotonic()
+        self.greeting = None
+        self.greeted = threading.Event()
+        self.future = None
+        self.past = None  # recent orders with their lines, once loaded
+        self.stale = False  # cart changed since the notes were built
+        self.refreshing = False  # a refresh is queued or running
+
+
+class CallPrep:
+    ENABLED = os.getenv("VOICE_PREWARM", "1") == "1"
+    GREETING_WAIT = float(os.getenv("VOICE_GREETING_WAIT", "0.5"))
+    FIRST_TURN_WAIT = float(os.getenv("VOICE_PREP_WAIT", "2"))
+    RECENT_ORDERS = int(os.getenv("VOICE_RECENT_ORDERS", "3"))
+    THREADS = int(os.getenv("VOICE_PREP_THREADS", "4"))
+    TTL = float(os.getenv("VOICE_PREP_TTL", "3600"))
+    AGENT_WAIT = float(os.getenv("AGENT_WARMUP_WAIT", "10"))
+    _calls = {}  # session id -> its latest _Call, oldest first
+    _lock = threading.Lock()
+    _executor = None
+
+    @classmethod
+    def start(cls, session_id: str, call_sid: str = None):
+        """Starts preparing a session in the background; the same call (``call_sid``) is prepared once."""
+        if not cls.ENABLED or not session_id:
+            return
+        now = time.monotonic()
+        with cls._lock:
+            while cls._calls:  # calls long over
+                oldest = next(iter(cls._calls))
+                if now - cls._calls[oldest].started < cls.TTL:
+                    break
+                del cls._calls[oldest]
+            current = cls._calls.pop(session_id, None)
+            if current is not None and call_sid and current.call_sid == call_sid:
+                cls._calls[session_id] = current
+                return
+            call = cls._calls[session_id] = _Call(call_sid)
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.THREADS, thread_name_prefix="call-prep")
+            call.future = cls._executor.submit(cls._prepare, session_id, call)
+
+    @classmethod
+    def greeting(cls, session_id: str, timeout=None):
+        """The personalized greeting, if ready within ``timeout`` (default VOICE_GREETING_WAIT); else None."""
+        call = cls._calls.get(session_id)
+        if call is None:
+            return None
+        call.greeted.wait(cls.GREETING_WAIT if timeout is None else timeout)
+        return call.greeting
+
+    @classmethod
+    async def agreeting(cls, session_id: str, timeout=None):
+        call = cls._calls.get(session_id)
+        if call is None:
+            return None
+        if not call.greeted.is_set():
+            await cls._await(call, cls.GREETING_WAIT if timeout is None else timeout, greeting_only=True)
+        return call.greeting
+
+    @classmethod
+    def finish(cls, session_id: str, timeout=None):
+        """Waits up to ``timeout`` (default VOICE_PREP_WAIT) for the session's preparation to finish."""
+        call = cls._calls.get(session_id)
+        if call is None or call.future is None:
+            return
+        try:
+            call.future.result(cls.FIRST_TURN_WAIT if timeout is None else timeout)
+        except FutureTimeout:
+            print(f"Call preparation still running for {session_id[:12]}; answering without it")
+        except Exception as e:
+            print(f"Error preparing call: {e}")
+
+    @classmethod
+    async def afinish(cls, session_id: str, timeout=None):
+        call = cls._calls.get(session_id)
+        if call is None or call.future is None or call.future.done():
+            return
+        await cls._await(call, cls.FIRST_TURN_WAIT if timeout is None else timeout)
+
+    @staticmethod
+    async def _await(call, timeout, greeting_only=False):
+        """Waits without cancelling the preparation when the time runs out."""
+        future = asyncio.wrap_future(call.future)
+        waiters = {future}
+        if greeting_only:
+            waiters.add(asyncio.ensure_future(asyncio.to_thread(call.greeted.wait, timeout)))
+        done, pending = await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in pending - {future}:
+            waiter.cancel()
+
+    @classmethod
+    def _load(cls, session_id: str):
+        """The session's cart lines and recent orders (each with its lines)."""
+        products = CartTool.catalog().products
+        cart = CartTool.get_lines(session_id)
+        try:
+            orders = DeliveryTool.get_orders(session_id, limit=cls.RECENT_ORDERS)
+        except Exception as e:
+            print(f"Error loading recent orders for call: {e}")
+            orders = []
+        return cart["lines"], [(order, CallPrep._order_lines(order, products)) for order in orders]
+
+    @classmethod
+    def _prepare(cls, session_id: str, call: _Call):
+        with metrics.span("voice", "prepare"):
+            try:
+                cart_lines, past = cls._load(session_id)
+                call.greeting = cls._greeting(cart_lines, past)
+            finally:
+                call.greeted.set()
+
+            try:
+                # Always set, so notes left from an earlier call are replaced.
+                get_pizza_agent(cls.AGENT_WAIT).memory.set_context(session_id, cls._context(cart_lines, past))
+            except (TimeoutError, RuntimeError) as e:
+                print(f"Agent unavailable for call preparation: {e}")
+            call.past = past  # from here on, cart changes refresh the notes
+
+    @classmethod
+    def cart_changed(cls, session_id: str):
+        """Schedules a rebuild of the agent's notes for a prepared call after its cart changed.
+
+        Registered with ``CartTool.changes``, so it runs inside every cart
+        mutation: it only marks the call stale and leaves the reload to the
+        call-prep threads. Sessions without a prepared call are ignored.
+        """
+        call = cls._calls.get(session_id)
+        if call is None or call.past is None:
+            return
+        with cls._lock:
+            call.stale = True
+            if call.refreshing:
+                return
+            call.refreshing = True
+        cls._executor.submit(cls._refresh, session_id, call)
+
+    @classmethod
+    def _refresh(cls, session_id: str, call: _Call):
+        """Reloads the cart and recent orders until no change arrived meanwhile.
+
+        A checkout clears the cart, so the order just logged shows up among
+        the previous orders as well.
+        """
+        while True:
+            with cls._lock:
+                if not call.stale or cls._calls.get(session_id) is not call:
+                    call.refreshing = False
+                    return
+                call.stale = False
+            try:
+                if agent_status()["ready"]:
+                    cart_lines, past = cls._load(session_id)
+                    call.past = past
+                    get_pizza_agent().memory.set_context(session_id, cls._context(cart_lines, past))
+            except Exception as e:
+                print(f"Error refreshing call notes: {e}")
+
+    @staticmethod
+    def _order_lines(order: dict, products) -> list:
+        """Line items of a logged order; legacy ``{name: qty}`` carts are priced from the catalog."""
+        details = order.get("products")
+        if not isinstance(details, dict):
+            return []
+        return pricing.upgrade(dict(details), products).get("lines", [])
+
+    @staticmethod
+    def _describe(lines) -> str:
+        items = [f"{line['qty']} {pricing.line_label(line)}" for line in lines]
+        return items[0] if len(items) == 1 else ", ".join(items[:-1]) + " and " + items[-1]
+
+    @staticmethod
+    def _greeting(cart_lines, past):
+        """A greeting for a caller with a cart in progress or an earlier order; None for new callers."""
+        if cart_lines:
+            return (f"Welcome back! You still have {CallPrep._describe(cart_lines)} in your cart. "
+                    "Would you like to add anything, or shall we check out?")
+        for order, lines in past:
+            if lines:
+                name = (order.get("user") or {}).get("name")
+                return (f"Welcome back{', ' + name if name else ''}! Last time you ordered "
+                        f"{CallPrep._describe(lines)}. Say 'same again' to order it again, "
+                        "or tell me what you'd like today.")
+        return None
+
+    @staticmethod
+    def _context(cart_lines, past) -> str:
+        """Notes for the agent about this caller, or an empty string for a new caller."""
+        notes = []
+        if cart_lines:
+            notes.append(f"Items already in the cart: {CallPrep._describe(cart_lines)}.")
+        orders = [(order, lines) for order, lines in past if lines]
+        if orders:
+            notes.append("Previous orders, newest first: " + "; ".join(
+                f"{CallPrep._describe(lines)} ({order['created_at'][:10]}, {order['delivery_status']})"
+                for order, lines in orders) + ".")
+            user = orders[0][0].get("user") or {}
+            details = ", ".join(f"{key} {user[key]}" for key in ("name", "address", "phone") if user.get(key))
+            if details:
+                notes.append(f"Details on the last order: {details}. Confirm them before reusing them.")
+            notes.append("If the caller wants the same again, add those items with add_to_cart.")
+        if not notes:
+            return ""
+        return "About this caller: " + " ".join(notes)
+
+
+CartTool.changes.on_change(CallPrep.cart_changed)
@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class CartStore(ABC):
+    """Where carts live between requests.
+
+    A cart is a JSON-serialisable dict. ``update`` hands the current cart to a
+    ``mutate`` callback that edits it in place, then persists the result
+    atomically; whatever the callback returns is passed back to the caller.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str) -> dict:
+        """A copy of the session's cart ({} if it has none)."""
+
+    @abstractmethod
+    def update(self, session_id: str, mutate):
+        """Applies ``mutate(cart)`` and stores the result; the cart is unchanged if ``mutate`` raises."""
+
+    @abstractmethod
+    def pop(self, session_id: str) -> dict:
+        """Removes and returns the session's cart."""
+
+
+class InMemoryCartStore(CartStore):
+    """Process-local store with idle expiry and a cap on the number of sessions."""
+
+    def __init__(self, ttl=3600.0, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._carts = OrderedDict()  # session_id -> (cart, last_access), least recently used first
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._carts:
+            session_id, (_, last_access) = next(iter(self._carts.items()))
+            if now - last_access < self.ttl and len(self._carts) <= self.max_sessions:
+                break
+            del self._carts[session_id]
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._carts.get(session_id)
+            if entry is None:
+                return {}
+            self._carts[session_id] = (entry[0], now)
+            self._carts.move_to_end(session_id)
+            return json.loads(json.dumps(entry[0]))
+
+    def update(self, session_id, mutate):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._carts.get(session_id)
+            # Mutate a copy: if the callback raises, the stored cart is left as it was.
+            cart = json.loads(json.dumps(entry[0])) if entry else {}
+            result = mutate(cart)
+            if cart:
+                self._carts[session_id] = (cart, now)
+                self._carts.move_to_end(session_id)
+            else:
+                self._carts.pop(session_id, None)
+            self._evict(now)
+            return result
+
+    def pop(self, session_id):
+        with self._lock:
+            entry = self._carts.pop(session_id, None)
+            return entry[0] if entry else {}
+
+    def __len__(self):
+        return len(self._carts)
+
+
+class SQLiteCartStore(CartStore):
+    """Store shared by every worker process on the host, backed by SQLite in WAL mode."""
+
+    PURGE_INTERVAL = 60.0
+
+    def __init__(self, path, ttl=3600.0):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS carts (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_carts_updated_at ON carts (updated_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _purge_expired(self, conn, now):
+        if now - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        conn.execute("DELETE FROM carts WHERE updated_at < ?", (now - self.ttl,))
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT data FROM carts WHERE session_id = ? AND updated_at >= ?",
+            (session_id, time.time() - self.ttl),
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, session_id, mutate):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data FROM carts WHERE session_id = ? AND updated_at >= ?",
+                (session_id, now - self.ttl),
+            ).fetchone()
+            cart = json.loads(row[0]) if row else {}
+            result = mutate(cart)
+            if cart:
+                conn.execute(
+                    "INSERT INTO carts (session_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (session_id, json.dumps(cart), now),
+                )
+            else:
+                conn.execute("DELETE FROM carts WHERE session_id = ?", (session_id,))
+            self._purge_expired(conn, now)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def pop(self, session_id):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT data, updated_at FROM carts WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            conn.execute("DELETE FROM carts WHERE session_id = ?", (session_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if not row or row[1] < time.time() - self.ttl:
+            return {}
+        return json.loads(row[0])
+
+
+class CartChanges:
+    """Wakes listeners (e.g. open cart streams) when a session's cart changes in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}  # session_id -> set of threading.Event
+        self._callbacks = []
+
+    def subscribe(self, session_id: str) -> threading.Event:
+        event = threading.Event()
+        with self._lock:
+            self._listeners.setdefault(session_id, set()).add(event)
+        return event
+
+    def on_change(self, callback):
+        """Calls ``callback(session_id)`` on every change, on the thread that made it."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def asubscribe(self, session_id: str) -> "LoopEvent":
+        """``subscribe`` for async handlers: the event is awaited on the running loop."""
+        event = LoopEvent()
+        with self._lock:
+            self._listeners.setdefault(session_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, session_id: str, event: threading.Event):
+        with self._lock:
+            listeners = self._listeners.get(session_id)
+            if listeners is not None:
+                listeners.discard(event)
+                if not listeners:
+                    del self._listeners[session_id]
+
+    def notify(self, session_id: str):
+        with self._lock:
+            listeners = list(self._listeners.get(session_id, ()))
+            callbacks = list(self._callbacks)
+        for event in listeners:
+            event.set()
+        for callback in callbacks:
+            try:
+                callback(session_id)
+            except Exception as e:
+                print(f"Error in cart change callback: {e}")
+
+
+class LoopEvent:
+    """An ``asyncio.Event`` that may be set from any thread."""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def set(self):
+        try:
+            self.loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:  # the loop is closed; the handler is gone
+            pass
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self, timeout) -> bool:
+        """True once set, False after ``timeout`` seconds, like ``threading.Event.wait``."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+def create_cart_store():
+    """Builds the store selected by CART_STORE ("memory" or "sqlite")."""
+    backend = os.getenv("CART_STORE", "memory").lower()
+    ttl = float(os.getenv("CART_TTL", "3600"))
+    if backend == "sqlite":
+        return SQLiteCartStore(os.getenv("CART_DB_PATH", "carts.db"), ttl=ttl)
+    if backend == "memory":
+        return InMemoryCartStore(ttl=ttl, max_sessions=int(os.getenv("CART_MAX_SESSIONS", "10000")))
+    raise ValueError(f"Unknown CART_STORE backend: {backend}")
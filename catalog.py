@@ -0,0 +1,178 @@
+import json
+import os
+import struct
+import threading
+import time
+from functools import cached_property
+from types import MappingProxyType
+
+from catalog_bin import BinaryCatalog, CatalogItems, ProductMap
+from search_index import MenuSearchIndex, ModifierIndex
+
+MODIFIER_CATEGORIES = ("topping", "customization")
+
+
+class CatalogSnapshot:
+    """One immutable version of the product catalog with everything derived from it.
+
+    ``products`` maps lowercased names to ``{"name", "price", "category"}``;
+    ``pizzas``, ``customizations`` and ``toppings`` are the per-category
+    views of it. ``items`` is the catalog as loaded (used by the menu and
+    search). The modifier and search indexes are built on first use. A
+    snapshot that failed to load is empty and carries ``error``.
+    """
+
+    def __init__(self, items, version=None, error=None):
+        self.items = tuple(items)
+        self.version = version
+        self.error = error
+
+        products = {}
+        for item in self.items:
+            products[item["name"].strip().lower()] = MappingProxyType({
+                "name": item["name"],
+                "price": item["price"],
+                "category": item["category"],
+            })
+        self.products = MappingProxyType(products)
+        self.pizzas = self._category("pizza")
+        self.customizations = self._category("customization")
+        self.toppings = self._category("topping")
+
+    def _category(self, category):
+        return MappingProxyType({k: v for k, v in self.products.items() if v["category"] == category})
+
+    def _products_in(self, categories):
+        """Products in any of ``categories``, in catalog order."""
+        return [dict(v) for v in self.products.values() if v["category"] in categories]
+
+    @cached_property
+    def modifiers(self):
+        return ModifierIndex(self._products_in(MODIFIER_CATEGORIES))
+
+    @cached_property
+    def search_index(self):
+        return MenuSearchIndex(self.items)
+
+    @staticmethod
+    def load(path, version=None):
+        """Loads a JSON catalog, or a compiled one (see catalog_bin.py) if ``path`` ends in ``.bin``."""
+        if path.endswith(".bin"):
+            return BinaryCatalogSnapshot(path, version=version)
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        if not isinstance(items, list):
+            raise ValueError("Invalid menu format.")
+        return CatalogSnapshot(items, version=version)
+
+
+class BinaryCatalogSnapshot(CatalogSnapshot):
+    """A snapshot read in place from a memory-mapped compiled catalog.
+
+    Opening it only maps the file; items and products are decoded when
+    they are accessed, and the pages are shared by every process mapping
+    the same file.
+    """
+
+    def __init__(self, path, version=None):
+        self._binary = BinaryCatalog(path)
+        self.items = CatalogItems(self._binary)
+        self.version = version
+        self.error = None
+        self.products = ProductMap(self._binary)
+        self.pizzas = ProductMap(self._binary, "pizza")
+        self.customizations = ProductMap(self._binary, "customization")
+        self.toppings = ProductMap(self._binary, "topping")
+
+    def _products_in(self, categories):
+        numbers = sorted(n for category in categories for n in self._binary.members(category))
+        return [self._binary.product(n) for n in numbers]
+
+
+class Catalog:
+    """Serves the current ``CatalogSnapshot`` of a catalog file and reloads it when the file changes.
+
+    ``current()`` is a plain attribute read. A daemon thread stats the file
+    every ``check_interval`` seconds and, when its size or mtime changed,
+    parses it into a new snapshot and swaps it in. Readers holding the old
+    snapshot keep a consistent view. A file that fails to parse (e.g. half
+    written) leaves the previous snapshot in place until it changes again.
+    """
+
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._snapshot = None
+        self._failed_version = None
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def reload(self, force=False):
+        """Re-reads the file if it changed since the current snapshot; returns the current snapshot."""
+        with self._lock:
+            version = self._file_version()
+            current = self._snapshot
+            if not force and current is not None and current.version == version and current.error is None:
+                return current
+            try:
+                self._snapshot = CatalogSnapshot.load(self.path, version)
+                if current is not None:
+                    self.reloads += 1
+            except (OSError, ValueError, KeyError, struct.error) as e:
+                if version != self._failed_version:
+                    self._failed_version = version
+                    print(f"Error loading catalog {self.path}: {e}")
+                if current is None or current.error is not None:
+                    self._snapshot = CatalogSnapshot([], error="Error: Unable to load menu.")
+            return self._snapshot
+
+    def current(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None or self._watcher_pid != os.getpid():
+            snapshot = self._start()
+        return snapshot
+
+    def _start(self):
+        with self._lock:
+            # A forked worker inherits the snapshot but not the watcher thread.
+            if self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                if self.check_interval:
+                    threading.Thread(target=self._watch, name="catalog-watcher", daemon=True).start()
+        if self._snapshot is None:
+            return self.reload()
+        return self._snapshot
+
+    def _watch(self):
+        pid = os.getpid()
+        while self._watcher_pid == pid:
+            time.sleep(self.check_interval)
+            snapshot = self._snapshot
+            version = self._file_version()
+            if snapshot is None or (version != snapshot.version and version != self._failed_version):
+                self.reload()
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path="product_catalog.json") -> Catalog:
+    """Returns the process-wide ``Catalog`` for a file, shared by every tool that reads it."""
+    key = os.path.abspath(path)
+    catalog = _catalogs.get(key)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(key)
+            if catalog is None:
+                interval = float(os.getenv("CATALOG_CHECK_INTERVAL", "1.0"))
+                catalog = _catalogs[key] = Catalog(path, check_interval=interval)
+    return catalog
@@ -0,0 +1,250 @@
+"""Compiled, memory-mappable form of product_catalog.json.
+
+Build it with:
+    python catalog_bin.py product_catalog.json product_catalog.bin
+
+Layout (little-endian):
+    header      magic, counts and section offsets (HEADER)
+    records     one fixed-width RECORD per catalog item, in catalog order
+    categories  per category: name and a slice of the member array (CATEGORY),
+                followed by the member array of u32 record numbers
+    hash index  open-addressing table of u32 (record number + 1, 0 = empty)
+                keyed by FNV-1a of the lowercased name, linear probing
+    strings     UTF-8 string table (deduplicated)
+
+Items are decoded on access straight from the mapping, so every worker
+process shares the same page-cache pages instead of its own parsed copy.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Mapping, Sequence
+
+MAGIC = b"PZCAT\x00\x00\x01"
+HEADER = struct.Struct("<8sIIIIIIIII")  # magic, count, keys, slots, categories, records, cats, hash, strings, strings_len
+RECORD = struct.Struct("<IIIIIIdHH4x")  # name, name_len, desc, desc_len, key, key_len, price, category, flags
+CATEGORY = struct.Struct("<IIII")  # name, name_len, first member, member count
+FLAG_INT_PRICE = 1
+
+
+def _fnv1a(data: bytes) -> int:
+    h = 0x811C9DC5
+    for byte in data:
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def build(items, path):
+    """Writes ``items`` (the parsed JSON catalog) to ``path`` atomically."""
+    strings = bytearray()
+    offsets = {}
+
+    def intern(text):
+        data = text.encode("utf-8")
+        if data not in offsets:
+            offsets[data] = len(strings)
+            strings.extend(data)
+        return offsets[data], len(data)
+
+    categories = []
+    category_codes = {}
+    keys = {}  # lowercased name -> record number; later duplicates win, as in the JSON loader
+    records = bytearray()
+    for number, item in enumerate(items):
+        category = item["category"]
+        if category not in category_codes:
+            category_codes[category] = len(categories)
+            categories.append(category)
+        key = item["name"].strip().lower()
+        keys[key] = number
+        price = item["price"]
+        records += RECORD.pack(*intern(item["name"]), *intern(item.get("description", "")), *intern(key),
+                               float(price), category_codes[category],
+                               FLAG_INT_PRICE if isinstance(price, int) else 0)
+
+    members = {code: [] for code in range(len(categories))}
+    for key, number in sorted(keys.items(), key=lambda kv: kv[1]):
+        members[category_codes[items[number]["category"]]].append(number)
+    category_table = bytearray()
+    member_array = []
+    for code, category in enumerate(categories):
+        category_table += CATEGORY.pack(*intern(category), len(member_array), len(members[code]))
+        member_array.extend(members[code])
+    category_table += struct.pack(f"<{len(member_array)}I", *member_array)
+
+    slots = 8
+    while slots < len(keys) * 2:
+        slots *= 2
+    table = [0] * slots
+    for key, number in keys.items():
+        slot = _fnv1a(key.encode("utf-8")) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = number + 1
+    hash_table = struct.pack(f"<{slots}I", *table)
+
+    records_off = HEADER.size
+    cats_off = records_off + len(records)
+    hash_off = cats_off + len(category_table)
+    strings_off = hash_off + len(hash_table)
+    header = HEADER.pack(MAGIC, len(items), len(keys), slots, len(categories),
+                         records_off, cats_off, hash_off, strings_off, len(strings))
+
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        for section in (header, records, category_table, hash_table, strings):
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)  # open mappings keep the old file until they are dropped
+
+
+class BinaryCatalog:
+    """Read-only view of a compiled catalog file over ``mmap``."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self.key_count, self._slots, category_count, self._records,
+         cats_off, self._hash, self._strings, _) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled catalog")
+        members_off = cats_off + category_count * CATEGORY.size
+        self.categories = {}
+        self._category_names = []
+        for code in range(category_count):
+            name_off, name_len, first, count = CATEGORY.unpack_from(self._mm, cats_off + code * CATEGORY.size)
+            name = self._str(name_off, name_len)
+            self._category_names.append(name)
+            self.categories[name] = (code, members_off + first * 4, count)
+
+    def _str(self, offset, length):
+        start = self._strings + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _record(self, number):
+        return RECORD.unpack_from(self._mm, self._records + number * RECORD.size)
+
+    def key(self, number):
+        record = self._record(number)
+        return self._str(record[4], record[5])
+
+    def category_code(self, number):
+        return self._record(number)[7]
+
+    def item(self, number):
+        """The catalog item as it appeared in the JSON file."""
+        name, name_len, desc, desc_len, _, _, price, category, flags = self._record(number)
+        return {
+            "name": self._str(name, name_len),
+            "description": self._str(desc, desc_len),
+            "price": int(price) if flags & FLAG_INT_PRICE else price,
+            "category": self._category_names[category],
+        }
+
+    def product(self, number):
+        """The ``{"name", "price", "category"}`` entry used for pricing."""
+        name, name_len, _, _, _, _, price, category, flags = self._record(number)
+        return {
+            "name": self._str(name, name_len),
+            "price": int(price) if flags & FLAG_INT_PRICE else price,
+            "category": self._category_names[category],
+        }
+
+    def find(self, key):
+        """Record number for a lowercased name, or -1."""
+        data = key.encode("utf-8")
+        mask = self._slots - 1
+        slot = _fnv1a(data) & mask
+        while True:
+            entry = struct.unpack_from("<I", self._mm, self._hash + slot * 4)[0]
+            if not entry:
+                return -1
+            record = self._record(entry - 1)
+            start = self._strings + record[4]
+            if record[5] == len(data) and self._mm[start:start + record[5]] == data:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def members(self, category):
+        """Record numbers in a category, in catalog order."""
+        if category not in self.categories:
+            return ()
+        _, offset, count = self.categories[category]
+        return struct.unpack_from(f"<{count}I", self._mm, offset)
+
+
+class CatalogItems(Sequence):
+    """The catalog items, decoded one at a time."""
+
+    def __init__(self, binary):
+        self._binary = binary
+
+    def __len__(self):
+        return self._binary.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._binary.item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._binary.item(index)
+
+
+class ProductMap(Mapping):
+    """Lowercased name -> product, looked up through the hash index.
+
+    With ``category`` set, only products in that category are visible.
+    """
+
+    def __init__(self, binary, category=None):
+        self._binary = binary
+        self._category = category
+        self._code = binary.categories[category][0] if category in binary.categories else -1
+
+    def numbers(self):
+        """Record numbers of the visible products, in catalog order."""
+        if self._category is None:
+            # Every name has one winning record, and the category lists hold them all.
+            return sorted(n for name in self._binary.categories for n in self._binary.members(name))
+        return self._binary.members(self._category)
+
+    def _visible(self, number):
+        return number >= 0 and (self._category is None or self._binary.category_code(number) == self._code)
+
+    def __getitem__(self, key):
+        number = self._binary.find(key) if isinstance(key, str) else -1
+        if not self._visible(number):
+            raise KeyError(key)
+        return self._binary.product(number)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._visible(self._binary.find(key))
+
+    def __iter__(self):
+        for number in self.numbers():
+            yield self._binary.key(number)
+
+    def __len__(self):
+        if self._category is None:
+            return self._binary.key_count
+        return self._binary.categories[self._category][2] if self._code >= 0 else 0
+
+
+def main(argv):
+    if len(argv) != 3:
+        print(__doc__)
+        return 2
+    with open(argv[1], "r", encoding="utf-8") as f:
+        items = json.load(f)
+    build(items, argv[2])
+    print(f"Wrote {len(items)} items to {argv[2]} ({os.path.getsize(argv[2])} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
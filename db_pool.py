@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the wait timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of DB-API connections.
+
+    Connections are created lazily up to ``maxconn``; ``minconn`` of them are
+    kept warm even when idle. Idle connections beyond the minimum are closed
+    after ``idle_timeout`` seconds, and a connection that has sat idle for more
+    than ``health_check_after`` seconds is pinged before it is handed out.
+    """
+
+    def __init__(self, connect, minconn=1, maxconn=10, idle_timeout=300.0,
+                 health_check_after=30.0, wait_timeout=10.0):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: need 0 <= minconn <= maxconn and maxconn >= 1")
+        self._connect = connect
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.wait_timeout = wait_timeout
+
+        self._idle = deque()  # (connection, last_used) pairs, most recently used on the right
+        self._in_use = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "health_check_failures": 0,
+            "evicted_idle": 0,
+            "timeouts": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._stats["created"] += 1
+        return conn
+
+    def _close_connection(self, conn):
+        """Closes a connection; called with the lock held so the counters stay consistent."""
+        self._stats["closed"] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(conn):
+        """Runs a trivial query to make sure the server side is still there."""
+        if getattr(conn, "closed", False):
+            return False
+        try:
+            cur = conn.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self, now):
+        """Closes connections idle for too long, keeping at least ``minconn`` open."""
+        while self._idle and len(self._idle) + len(self._in_use) > self.minconn:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._stats["evicted_idle"] += 1
+            self._close_connection(conn)
+
+    def getconn(self, timeout=None):
+        """Checks out a healthy connection, waiting up to ``timeout`` seconds."""
+        timeout = self.wait_timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                now = time.monotonic()
+                self._evict_idle(now)
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    if now - last_used < self.health_check_after:
+                        break
+                    # Ping outside the lock so one slow socket does not stall every checkout;
+                    # the connection stays counted as in use meanwhile.
+                    self._in_use.add(conn)
+                    self._cond.release()
+                    try:
+                        alive = self._is_alive(conn)
+                    finally:
+                        self._cond.acquire()
+                    if alive:
+                        break
+                    self._in_use.discard(conn)
+                    self._stats["health_check_failures"] += 1
+                    self._close_connection(conn)
+                    self._cond.notify()
+                    continue
+
+                if len(self._in_use) < self.maxconn:
+                    # Reserve the slot before releasing the lock for the (slow) connect.
+                    placeholder = object()
+                    self._in_use.add(placeholder)
+                    self._cond.release()
+                    try:
+                        conn = self._connect()
+                    except BaseException:
+                        self._cond.acquire()
+                        self._in_use.discard(placeholder)
+                        self._cond.notify()  # the reserved slot is free again
+                        raise
+                    self._cond.acquire()
+                    self._in_use.discard(placeholder)
+                    self._stats["created"] += 1
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"No database connection available within {timeout:.1f}s "
+                        f"(max {self.maxconn} in use)"
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use.add(conn)
+            waited = time.monotonic() - started
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += waited
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], waited)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """Returns a connection to the pool, closing it if it is broken or ``discard`` is set."""
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or self._closed or getattr(conn, "closed", False):
+                self._close_connection(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager that commits on success, rolls back on error and returns the connection."""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Snapshot of pool counters and gauges."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats["in_use"] = len(self._in_use)
+            stats["idle"] = len(self._idle)
+            stats["size"] = stats["in_use"] + stats["idle"]
+            stats["wait_time_avg"] = (
+                stats["wait_time_total"] / stats["checkouts"] if stats["checkouts"] else 0.0
+            )
+            return stats
+
+    def close(self):
+        """Closes idle connections and rejects further checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close_connection(conn)
+            self._cond.notify_all()
@@ -0,0 +1,8 @@
+"""gunicorn settings, read from the working directory (e.g. ``gunicorn -w 4 app:app``)."""
+
+
+def post_fork(server, worker):
+    """Starts the agent warm-up in each worker, so nothing is built in the master (also with --preload)."""
+    from agent import start_warmup
+
+    start_warmup()
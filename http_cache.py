@@ -0,0 +1,47 @@
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+class PrecomputedResponse:
+    """A response body rendered once, with a strong ETag and pre-compressed variants.
+
+    Each encoding gets its own ETag, since the bytes differ. ``respond``
+    negotiates the encoding from Accept-Encoding and answers a matching
+    If-None-Match with 304 Not Modified.
+    """
+
+    MIN_COMPRESS_SIZE = 256
+
+    def __init__(self, body: bytes, content_type="application/json", cache_control="public, max-age=300"):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.variants = {"identity": (body, digest)}
+        if len(body) >= self.MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = (gzip.compress(body, compresslevel=9, mtime=0), f"{digest}-gzip")
+            if brotli is not None:
+                self.variants["br"] = (brotli.compress(body, quality=11), f"{digest}-br")
+
+    def _negotiate(self, request):
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and request.accept_encodings[encoding] > 0:
+                return encoding
+        return "identity"
+
+    def respond(self, request):
+        encoding = self._negotiate(request)
+        body, etag = self.variants[encoding]
+        response = Response(body, content_type=self.content_type)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = self.cache_control
+        response.headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            response.headers["Content-Encoding"] = encoding
+        return response.make_conditional(request)
@@ -0,0 +1,167 @@
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+from tools import CartTool, ProductTool
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+
+POLITE_PREFIX = re.compile(
+    r"^(?:(?:hi|hello|hey|ok|okay|please|kindly|can you|could you|would you|will you|"
+    r"i want to|i would like to|i'd like to|let me|just)\s+)+"
+)
+POLITE_SUFFIX = re.compile(r"(?:\s+(?:please|thanks|thank you|now))+$")
+
+CART_PATTERN = re.compile(
+    r"^(?:(?:show|view|see|display|check|open)(?: me)?\s+)?(?:what(?:'s| is) in\s+)?(?:my|the)\s+cart$"
+    r"|^cart$"
+)
+TOTAL_PATTERN = re.compile(
+    r"^(?:(?:what(?:'s| is)|show(?: me)?|calculate|tell me)\s+)?(?:my|the)\s+(?:total|bill)(?: amount)?$"
+    r"|^(?:total|how much(?: is it| is my order| do i owe)?)$"
+)
+MENU_PATTERN = re.compile(
+    r"^(?:(?:show|list|see|view|display|read)(?: me)?\s+)?(?:the\s+)?menu$"
+    r"|^what(?:'s| is) on the menu$"
+    r"|^(?:what|which) pizzas (?:do you have|are there|are available)$"
+    r"|^(?:show|list)(?: me)?\s+(?:all\s+)?(?:the\s+|your\s+)?pizzas$"
+)
+ADD_PATTERN = re.compile(
+    r"^(?:add|order|get me|i want|i'll have|i will have|i'd like|i would like|give me)\s+"
+    r"(?:(?P<qty>\d+|[a-z]+)\s+)?(?P<item>.+?)(?:\s+to\s+(?:my|the)\s+(?:cart|order))?$"
+)
+
+
+def normalize(text: str) -> str:
+    """Lowercases, folds accents, drops punctuation and politeness padding."""
+    text = unicodedata.normalize("NFKD", text.strip().lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace("’", "'")
+    text = re.sub(r"[^a-z0-9' ]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = POLITE_PREFIX.sub("", text)
+    return POLITE_SUFFIX.sub("", text)
+
+
+class IntentRouter:
+    """Answers simple, unambiguous requests without calling the LLM.
+
+    ``route`` returns the reply when the whole message matches one of the
+    known intents (view cart, total, list menu, add a catalog pizza with
+    exactly-named modifiers) and ``None`` otherwise, in which case the caller
+    should fall through to the agent.
+    """
+
+    def __init__(self, agent_latency_alpha=0.1):
+        self.alpha = agent_latency_alpha
+        self._lock = threading.Lock()
+        self._pizza_names = None
+        self._hits = {}
+        self._misses = 0
+        self._router_seconds = 0.0
+        self._agent_latency = None
+
+    def _pizzas(self, catalog):
+        """Maps normalized pizza names (with and without a trailing "pizza") to catalog keys."""
+        cached = self._pizza_names
+        if cached is None or cached[0] is not catalog:
+            names = {}
+            for key in catalog.pizzas:
+                norm = normalize(key)
+                names[norm] = key
+                names[norm + " pizza"] = key
+                names[norm + " pizzas"] = key
+            cached = self._pizza_names = (catalog, names)  # rebuilt when the catalog is reloaded
+        return cached[1]
+
+    def _match_add(self, session_id, text):
+        match = ADD_PATTERN.match(text)
+        if not match:
+            return None
+
+        qty = 1
+        item = match.group("item")
+        if match.group("qty"):
+            word = match.group("qty")
+            if word.isdigit():
+                qty = int(word)
+            elif word in NUMBER_WORDS:
+                qty = NUMBER_WORDS[word]
+            else:
+                item = f"{word} {item}"
+        if not 0 < qty <= 20:
+            return None
+
+        catalog = CartTool.catalog()
+        parts = item.split(" with ")
+        pizza = self._pizzas(catalog).get(parts[0].strip())
+        if pizza is None:
+            return None
+
+        modifiers = []
+        if len(parts) == 2:
+            for mod in re.split(r"\s+and\s+|\s*,\s*", parts[1]):
+                product = catalog.modifiers.lookup_exact(mod)
+                if product is None:
+                    return None
+                modifiers.append(product["name"])
+        elif len(parts) > 2:
+            return None
+
+        order_line = pizza + (" with " + " and ".join(modifiers) if modifiers else "")
+        result = CartTool.add_item(session_id, order_line, qty)
+        return None if result.startswith("Error") else result
+
+    def _dispatch(self, session_id, text):
+        if CART_PATTERN.match(text):
+            return "view_cart", CartTool.get_cart(session_id)
+        if TOTAL_PATTERN.match(text):
+            return "calculate_total", CartTool.calculate_total(session_id)
+        if MENU_PATTERN.match(text):
+            return "load_menu", ProductTool.list_all_pizzas()
+        added = self._match_add(session_id, text)
+        if added is not None:
+            return "add_to_cart", added
+        return None, None
+
+    def route(self, session_id: str, user_input: str) -> Optional[str]:
+        started = time.perf_counter()
+        intent, reply = self._dispatch(session_id, normalize(user_input or ""))
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._router_seconds += elapsed
+            if intent is None:
+                self._misses += 1
+            else:
+                self._hits[intent] = self._hits.get(intent, 0) + 1
+        return reply
+
+    def record_agent_latency(self, seconds: float):
+        """Feeds the moving average used to estimate latency saved by hits."""
+        with self._lock:
+            if self._agent_latency is None:
+                self._agent_latency = seconds
+            else:
+                self._agent_latency += self.alpha * (seconds - self._agent_latency)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = sum(self._hits.values())
+            total = hits + self._misses
+            router_avg = self._router_seconds / total if total else 0.0
+            saved = hits * max((self._agent_latency or 0.0) - router_avg, 0.0)
+            return {
+                "requests": total,
+                "hits": hits,
+                "misses": self._misses,
+                "hit_rate": hits / total if total else 0.0,
+                "hits_by_intent": dict(self._hits),
+                "router_latency_avg_seconds": router_avg,
+                "agent_latency_avg_seconds": self._agent_latency or 0.0,
+                "latency_saved_seconds": saved,
+            }
@@ -0,0 +1,304 @@
+"""Per-stage latency metrics and sampled request traces.
+
+Every timed stage (http, agent, llm, tool, db, razorpay) is observed in the
+``pizza_stage_seconds`` histogram, labelled by stage and name, and exposed
+in the Prometheus text format by ``render()`` (served on /metrics). With
+TRACE_SAMPLE_RATE above 0, that fraction of requests also prints one JSON
+line listing its spans.
+
+    with metrics.span("db", "log_order"):
+        ...
+
+Metrics are per process: scrape every worker, or run one async worker.
+"""
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+_trace = ContextVar("metrics_trace", default=None)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Histogram:
+    """Latency histogram with one series per label set (cumulative buckets, like Prometheus)."""
+
+    def __init__(self, name, help_text, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            names = self.labelnames + ("le",)
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (repr(bound),))} {count}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {values[-2]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {values[-2]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}"
+                     for labels, value in sorted(values.items()))
+        return lines
+
+
+STAGE_SECONDS = Histogram("pizza_stage_seconds", "Time spent in each stage of a request.", ("stage", "name"))
+STAGE_ERRORS = Counter("pizza_stage_errors_total", "Stage executions that raised an error.", ("stage", "name"))
+_collectors = []
+
+
+class Trace:
+    """Spans recorded for one sampled request, printed as a single JSON line when it ends."""
+
+    def __init__(self, request):
+        self.id = uuid.uuid4().hex[:16]
+        self.request = request
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, name, started, seconds, error):
+        offset = (started if started is not None else time.perf_counter() - seconds) - self.started
+        with self._lock:
+            self.spans.append({"stage": stage, "name": name, "start_ms": round(offset * 1000, 3),
+                               "duration_ms": round(seconds * 1000, 3), "error": error})
+
+    def log(self, seconds, status=None):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        print(json.dumps({"trace": self.id, "request": self.request, "status": status,
+                          "duration_ms": round(seconds * 1000, 3), "spans": spans}))
+
+
+def observe(stage: str, name: str, seconds: float, error=False, started=None):
+    """Records one finished stage in the histogram and, if sampled, in the current trace."""
+    STAGE_SECONDS.observe((stage, name), seconds)
+    if error:
+        STAGE_ERRORS.inc((stage, name))
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(stage, name, started, seconds, error)
+
+
+@contextmanager
+def span(stage: str, name: str):
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        observe(stage, name, time.perf_counter() - started, error, started)
+
+
+def timed(stage: str, name=None):
+    """Decorator form of ``span``; ``name`` defaults to the function's qualified name."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, label):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_request(name: str):
+    """Starts timing a request (and maybe tracing it); pass the result to ``finish_request``."""
+    trace = Trace(name) if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE else None
+    return name, time.perf_counter(), trace, _trace.set(trace)
+
+
+def finish_request(state, status=None, error=False):
+    name, started, trace, token = state
+    seconds = time.perf_counter() - started
+    observe("http", name, seconds, error, started)
+    try:
+        _trace.reset(token)
+    except ValueError:  # finished in another context, e.g. after a streamed body
+        _trace.set(None)
+    if trace is not None:
+        trace.log(seconds, status)
+
+
+def add_collector(collect):
+    """Registers ``collect()`` returning ``(metric name, labels dict, value)`` gauge samples for /metrics."""
+    _collectors.append(collect)
+
+
+def render() -> str:
+    lines = STAGE_SECONDS.render() + STAGE_ERRORS.render()
+    gauges = {}
+    for collect in _collectors:
+        try:
+            for metric, labels, value in collect():
+                gauges.setdefault(metric, []).append((labels, value))
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    for metric, samples in sorted(gauges.items()):
+        lines.append(f"# TYPE {metric} gauge")
+        for labels, value in samples:
+            lines.append(f"{metric}{_labels(tuple(labels), tuple(labels.values()))} {float(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument_flask(app):
+    """Times every request to a Flask app as an ``http`` span and serves ``/metrics``."""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g._metrics_request = start_request(request.endpoint or "unmatched")
+
+    @app.after_request
+    def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_timer(exc=None):
+        state = g.pop("_metrics_request", None)
+        if state is not None:
+            finish_request(state, g.pop("_metrics_status", None), error=exc is not None)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+
+def instrument_quart(app):
+    """``instrument_flask`` for Quart; the hooks are coroutines so the trace stays in the request task."""
+    from quart import Response, g, request
+
+    @app.before_request
+    async def _start_request_timer():
+        g._metrics_request = start_request(request.endpoint or "unmatched")
+
+    @app.after_request
+    async def _record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    async def _finish_request_timer(exc=None):
+        state = g.pop("_metrics_request", None)
+        if state is not None:
+            finish_request(state, g.pop("_metrics_status", None), error=exc is not None)
+
+    @app.route("/metrics", methods=["GET"])
+    async def metrics():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+
+_langchain_handler = None
+
+
+def langchain_handler():
+    """A LangChain callback handler that times every LLM and tool call (``llm`` / ``tool`` spans)."""
+    global _langchain_handler
+    if _langchain_handler is None:
+        from langchain_core.callbacks import BaseCallbackHandler
+
+        class StageTimer(BaseCallbackHandler):
+            run_inline = True
+
+            def __init__(self):
+                self._running = {}  # run id -> (stage, name, started)
+
+            def _start(self, run_id, stage, name):
+                self._running[run_id] = (stage, name, time.perf_counter())
+
+            def _end(self, run_id, error=False):
+                entry = self._running.pop(run_id, None)
+                if entry is not None:
+                    stage, name, started = entry
+                    observe(stage, name, time.perf_counter() - started, error, started)
+
+            @staticmethod
+            def _model(serialized, kwargs):
+                params = kwargs.get("invocation_params") or {}
+                return params.get("model_name") or params.get("model") or (serialized or {}).get("name") or "llm"
+
+            def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+                self._start(run_id, "llm", self._model(serialized, kwargs))
+
+            def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+                self._start(run_id, "llm", self._model(serialized, kwargs))
+
+            def on_llm_end(self, response, *, run_id, **kwargs):
+                self._end(run_id)
+
+            def on_llm_error(self, error, *, run_id, **kwargs):
+                self._end(run_id, error=True)
+
+            def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+                self._start(run_id, "tool", (serialized or {}).get("name") or kwargs.get("name") or "tool")
+
+            def on_tool_end(self, output, *, run_id, **kwargs):
+                self._end(run_id)
+
+            def on_tool_error(self, error, *, run_id, **kwargs):
+                self._end(run_id, error=True)
+
+        _langchain_handler = StageTimer()
+    return _langchain_handler
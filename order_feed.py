@@ -0,0 +1,158 @@
+import asyncio
+import json
+import queue
+import select
+import threading
+import time
+
+
+class OrderFeed:
+    """Fans order change events out to subscribers such as kitchen displays.
+
+    A single background thread per process reads changes from ``source``
+    (Postgres LISTEN/NOTIFY or a polling fallback) and puts each event on
+    every subscriber's queue. Slow subscribers lose their oldest events
+    rather than holding the feed up.
+    """
+
+    def __init__(self, source, queue_size=1000):
+        self.source = source
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.source.run, args=(self.publish,),
+                                                name="order-feed", daemon=True)
+                self._thread.start()
+        return self
+
+    def subscribe(self) -> queue.Queue:
+        self.start()
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def asubscribe(self) -> "LoopQueue":
+        """``subscribe`` for async handlers: events arrive on a queue owned by the running loop."""
+        self.start()
+        subscriber = LoopQueue(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+class LoopQueue:
+    """A subscriber queue read on an event loop; the feed thread may put to it from outside."""
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put_nowait(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # the loop is closed; the handler is gone
+            pass
+
+    def _put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except asyncio.QueueFull:
+                self.queue.get_nowait()
+
+    async def get(self, timeout):
+        """The next event; raises ``queue.Empty`` after ``timeout`` seconds, like ``queue.Queue``."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            raise queue.Empty from None
+
+
+class PostgresNotifySource:
+    """Receives ``pg_notify`` payloads on ``channel`` over a dedicated connection."""
+
+    def __init__(self, connect, channel="orders_feed", reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.connect = connect
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+    def run(self, publish):
+        delay = self.reconnect_delay
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                delay = self.reconnect_delay
+                while True:
+                    if select.select([conn], [], [], 30.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            publish(json.loads(notify.payload))
+                        except json.JSONDecodeError:
+                            print(f"Error: malformed order feed payload: {notify.payload[:200]}")
+            except Exception as e:
+                print(f"Order feed connection lost, reconnecting in {delay:.0f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+class PollingSource:
+    """Fallback for databases without LISTEN/NOTIFY.
+
+    ``fetch_changes(cursor)`` returns ``(events, new_cursor)`` for rows
+    changed after ``cursor`` (``None`` on the first call, which should only
+    establish the starting point).
+    """
+
+    def __init__(self, fetch_changes, interval=1.0):
+        self.fetch_changes = fetch_changes
+        self.interval = interval
+
+    def run(self, publish):
+        cursor = None
+        while True:
+            try:
+                events, cursor = self.fetch_changes(cursor)
+                for event in events:
+                    publish(event)
+            except Exception as e:
+                print(f"Error polling order changes: {e}")
+            time.sleep(self.interval)
@@ -0,0 +1,234 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+
+class WriteBehindOrderSink:
+    """Acknowledges orders immediately and writes them to the database in batches.
+
+    ``submit`` gives the order an id from a block reserved through
+    ``allocate_ids(n)``, appends it to a local journal segment (fsynced when
+    ``fsync`` is set) and returns that id. A background thread hands batches
+    of up to ``batch_size`` orders to ``insert_batch(rows)`` at most
+    ``max_latency`` seconds after the first one arrived, then deletes the
+    journal segment they came from. ``insert_batch`` must be idempotent (e.g.
+    ``ON CONFLICT DO NOTHING``): on start-up any segments left behind by a
+    crash are replayed through it before new orders are accepted.
+
+    Each sink journals into its own ``worker-N`` slot under ``journal_dir``,
+    held with an exclusive file lock, so several worker processes can share
+    one directory and a restarted worker only replays slots nobody holds.
+    """
+
+    def __init__(self, journal_dir, insert_batch, allocate_ids, batch_size=200,
+                 max_latency=0.5, id_block=100, fsync=True, retry_delay=1.0):
+        self.journal_dir = journal_dir
+        self.insert_batch = insert_batch
+        self.allocate_ids = allocate_ids
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.id_block = id_block
+        self.fsync = fsync
+        self.retry_delay = retry_delay
+
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()  # serializes fsync against segment rotation
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._ids = deque()
+        self._pending = []
+        self._first_pending_at = None
+        self._inflight = 0
+        self._closed = False
+        self._segment_path = None
+        self._segment = None
+        self.stats = {"submitted": 0, "flushed": 0, "batches": 0, "recovered": 0, "insert_failures": 0}
+
+        os.makedirs(journal_dir, exist_ok=True)
+        self._slot_dir, self._slot_lock = self._claim_slot()
+        self.recover()
+        self._open_segment()
+        self._thread = threading.Thread(target=self._run, name="order-sink", daemon=True)
+        self._thread.start()
+
+    def _lock_slot(self, slot_dir):
+        """Returns the held lock file for a slot, or None if another process holds it."""
+        lock = open(slot_dir + ".lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock
+        except BlockingIOError:
+            lock.close()
+            return None
+
+    def _claim_slot(self):
+        n = 0
+        while True:
+            slot_dir = os.path.join(self.journal_dir, f"worker-{n}")
+            os.makedirs(slot_dir, exist_ok=True)
+            lock = self._lock_slot(slot_dir)
+            if lock is not None:
+                return slot_dir, lock
+            n += 1
+
+    def _open_segment(self):
+        self._segment_path = os.path.join(self._slot_dir, f"orders-{time.time_ns()}.jsonl")
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def recover(self):
+        """Replays journal segments left by crashed processes, then removes them."""
+        for slot_dir in sorted(glob.glob(os.path.join(self.journal_dir, "worker-*[0-9]"))):
+            if slot_dir == self._slot_dir:
+                self._replay(slot_dir)
+                continue
+            lock = self._lock_slot(slot_dir)
+            if lock is None:
+                continue
+            try:
+                self._replay(slot_dir)
+            finally:
+                lock.close()
+
+    def _replay(self, slot_dir):
+        for path in sorted(glob.glob(os.path.join(slot_dir, "orders-*.jsonl"))):
+            if path == self._segment_path:
+                continue
+            rows = []
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn final line means the order was never acknowledged.
+                        break
+            for start in range(0, len(rows), self.batch_size):
+                self.insert_batch(rows[start:start + self.batch_size])
+            self.stats["recovered"] += len(rows)
+            os.remove(path)
+
+    def submit(self, session_id, products, user_details, payment_status, payment_ref=None):
+        """Journals an order and returns its reserved order id.
+
+        Rows that conflict in ``insert_batch`` (e.g. a duplicate ``payment_ref``)
+        are dropped there, so orders that must be deduplicated should not be
+        submitted here.
+        """
+        row = {
+            "session_id": session_id,
+            "products": products,
+            "user": user_details,
+            "payment_status": payment_status,
+            "delivery_status": "pending",
+            "payment_ref": payment_ref,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Order sink is closed")
+            if not self._ids:
+                self._ids.extend(self.allocate_ids(self.id_block))
+            row["order_id"] = self._ids.popleft()
+
+            self._segment.write(json.dumps(row) + "\n")
+            self._segment.flush()
+            self._written_seq += 1
+            seq = self._written_seq
+
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending.append(row)
+            self.stats["submitted"] += 1
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+        if self.fsync:
+            self._sync(seq)
+        return row["order_id"]
+
+    def _sync(self, seq):
+        """Group commit: one fsync covers every line written before it started."""
+        with self._sync_lock:
+            with self._cond:
+                if self._synced_seq >= seq:
+                    return
+                target = self._written_seq
+                fd = self._segment.fileno()
+            os.fsync(fd)
+            with self._cond:
+                self._synced_seq = max(self._synced_seq, target)
+
+    def _take_batch(self):
+        """Waits for a full batch or the latency deadline, then rotates the journal segment."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return None, None
+            while len(self._pending) < self.batch_size and not self._closed:
+                # Re-read each time: flush() moves the deadline forward.
+                remaining = self._first_pending_at + self.max_latency - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+        with self._sync_lock, self._cond:
+            batch, segment_path = self._pending, self._segment_path
+            self._pending = []
+            self._inflight += len(batch)
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+                self._synced_seq = self._written_seq
+            self._segment.close()
+            self._open_segment()
+            return batch, segment_path
+
+    def _run(self):
+        while True:
+            batch, segment_path = self._take_batch()
+            if batch is None:
+                return
+            while True:
+                try:
+                    self.insert_batch(batch)
+                    break
+                except Exception as e:
+                    self.stats["insert_failures"] += 1
+                    print(f"Error flushing {len(batch)} orders, retrying: {e}")
+                    time.sleep(self.retry_delay)
+            os.remove(segment_path)
+            with self._cond:
+                self._inflight -= len(batch)
+                self.stats["flushed"] += len(batch)
+                self.stats["batches"] += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Blocks until every submitted order has been written; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._first_pending_at = 0.0  # make any open batch due immediately
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=None):
+        """Flushes outstanding orders and stops the background writer."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._sync_lock, self._cond:
+            self._segment.close()
+            if os.path.exists(self._segment_path) and os.path.getsize(self._segment_path) == 0:
+                os.remove(self._segment_path)
+            self._slot_lock.close()
@@ -0,0 +1,236 @@
+import hashlib
+import heapq
+import hmac
+import itertools
+import threading
+import time
+import weakref
+
+import metrics
+
+
+def verify_webhook_signature(body: bytes, signature: str, secret: str) -> bool:
+    """Checks the X-Razorpay-Signature header of a webhook delivery."""
+    if not signature or not secret:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _timeout_session(timeout):
+    """A requests Session that applies a default timeout to every request."""
+    import requests
+
+    class TimeoutSession(requests.Session):
+        def request(self, method, url, **kwargs):
+            kwargs.setdefault("timeout", timeout)
+            return super().request(method, url, **kwargs)
+
+    return TimeoutSession()
+
+
+class RazorpayGateway:
+    """Process-wide Razorpay client over one keep-alive connection pool.
+
+    Reads (GET) are retried with exponential backoff on connection errors and
+    5xx/429 responses; order creation is never retried, since repeating a
+    POST could create a second order. Every call is timed per operation.
+    ``acreate_order`` is the same call for async callers, over an httpx
+    client per event loop.
+    """
+
+    def __init__(self, key_id, key_secret, base_url="https://api.razorpay.com",
+                 connect_timeout=3.05, read_timeout=10.0, retries=3, backoff=0.3, pool_size=20):
+        # razorpay and requests are imported here, on first use, to keep app start-up fast.
+        import razorpay
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = _timeout_session((connect_timeout, read_timeout))
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self.client = razorpay.Client(session=session, auth=(key_id, key_secret), base_url=base_url)
+        self.base_url = base_url
+        self._auth = (key_id or "", key_secret or "")
+        self._timeouts = (connect_timeout, read_timeout)
+        self._pool_size = pool_size
+        self._async_clients = weakref.WeakKeyDictionary()  # event loop -> httpx.AsyncClient
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _record(self, operation, elapsed, failed):
+        metrics.observe("razorpay", operation, elapsed, failed, time.perf_counter() - elapsed)
+        with self._lock:
+            stats = self._stats.setdefault(operation, {"count": 0, "errors": 0, "total_seconds": 0.0,
+                                                       "max_seconds": 0.0})
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def _timed(self, operation, fn, *args):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return fn(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(operation, time.perf_counter() - started, failed)
+
+    def _async_client(self):
+        import asyncio
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            connect, read = self._timeouts
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=self._auth,
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=self._pool_size, max_keepalive_connections=self._pool_size),
+            )
+            self._async_clients[loop] = client
+        return client
+
+    def create_order(self, data: dict) -> dict:
+        return self._timed("order.create", self.client.order.create, data)
+
+    async def acreate_order(self, data: dict) -> dict:
+        """``create_order`` without blocking the event loop; raises the same razorpay errors."""
+        from razorpay.errors import BadRequestError, GatewayError, ServerError
+
+        started = time.perf_counter()
+        failed = False
+        try:
+            response = await self._async_client().post("/v1/orders", json=data)
+            if response.is_success:
+                return response.json()
+            try:
+                error = response.json().get("error") or {}
+            except ValueError:
+                error = {}
+            code = str(error.get("code", "")).upper()
+            message = error.get("description", response.text)
+            raise {"BAD_REQUEST_ERROR": BadRequestError, "GATEWAY_ERROR": GatewayError}.get(code, ServerError)(message)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record("order.create", time.perf_counter() - started, failed)
+
+    def fetch_order(self, order_id: str) -> dict:
+        return self._timed("order.fetch", self.client.order.fetch, order_id)
+
+    def order_payments(self, order_id: str) -> dict:
+        return self._timed("order.payments", self.client.order.payments, order_id)
+
+    def stats(self) -> dict:
+        """Per-operation call counts, errors and latency."""
+        with self._lock:
+            return {
+                op: dict(stats, avg_seconds=stats["total_seconds"] / stats["count"])
+                for op, stats in self._stats.items()
+            }
+
+
+class PaymentPoller:
+    """Background checker for payments that have not been confirmed yet.
+
+    Each watched order is re-checked with exponential backoff (``initial_delay``
+    doubling up to ``max_delay``) until ``check(order_id)`` returns a final
+    status or ``max_wait`` seconds pass. ``on_status(order_id, status)`` is
+    then called with the status ``check`` returned, or "expired". If
+    ``on_status`` raises, the order stays watched and is handled again on the
+    next check, so a captured payment is not dropped by a transient failure.
+    Webhooks remain the primary signal; the poller covers missed or delayed
+    deliveries.
+    """
+
+    def __init__(self, check, on_status, initial_delay=2.0, max_delay=60.0, max_wait=900.0):
+        self.check = check
+        self.on_status = on_status
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self._heap = []  # (due, seq, order_id, delay, deadline)
+        self._watched = set()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def watch(self, order_id: str):
+        now = time.monotonic()
+        with self._cond:
+            if order_id in self._watched:
+                return
+            self._watched.add(order_id)
+            heapq.heappush(self._heap, (now + self.initial_delay, next(self._seq), order_id,
+                                        self.initial_delay, now + self.max_wait))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="payment-poller", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def forget(self, order_id: str):
+        """Stops polling an order, e.g. once a webhook has confirmed it."""
+        with self._cond:
+            self._watched.discard(order_id)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._watched)
+
+    def _next_due(self):
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2] not in self._watched:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait = self._heap[0][0] - time.monotonic()
+                if wait <= 0:
+                    return heapq.heappop(self._heap)
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            _, _, order_id, delay, deadline = self._next_due()
+            try:
+                status = self.check(order_id)
+            except Exception as e:
+                print(f"Error checking payment {order_id}: {e}")
+                status = None
+
+            if status is None and time.monotonic() >= deadline:
+                status = "expired"
+            if status is not None:
+                with self._cond:
+                    if order_id not in self._watched:
+                        continue
+                    self._watched.discard(order_id)
+                try:
+                    self.on_status(order_id, status)
+                    continue
+                except Exception as e:
+                    print(f"Error handling payment {order_id} ({status}): {e}")
+                with self._cond:
+                    self._watched.add(order_id)
+
+            delay = min(delay * 2, self.max_delay)
+            with self._cond:
+                if order_id in self._watched:
+                    heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq),
+                                                order_id, delay, deadline))
@@ -0,0 +1,96 @@
+"""Cart line items and exact pricing in integer paise.
+
+A cart is stored as::
+
+    {"lines": [{"item": "Margherita Classic", "item_paise": 49900,
+                "modifiers": [{"name": "Cheese Burst", "paise": 15000}],
+                "qty": 2, "unit_paise": 64900, "line_paise": 129800}],
+     "total_paise": 129800}
+
+Prices are fixed when a line is added, and ``unit_paise``, ``line_paise``
+and ``total_paise`` are kept in step by every mutation, so reading the
+total never re-prices the cart.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def to_paise(price) -> int:
+    """Converts a catalog price in rupees (int, float or str) to exact paise."""
+    return int((Decimal(str(price)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_rupees(paise: int) -> str:
+    sign = "-" if paise < 0 else ""
+    rupees, rest = divmod(abs(paise), 100)
+    return f"{sign}₹{rupees}.{rest:02d}"
+
+
+def make_line(item: dict, modifiers, qty: int) -> dict:
+    """A priced line for catalog product ``item`` with modifier products ``modifiers``."""
+    item_paise = to_paise(item["price"])
+    mods = [{"name": m["name"], "paise": to_paise(m["price"])} for m in modifiers]
+    unit_paise = item_paise + sum(m["paise"] for m in mods)
+    return {"item": item["name"], "item_paise": item_paise, "modifiers": mods,
+            "qty": qty, "unit_paise": unit_paise, "line_paise": qty * unit_paise}
+
+
+def add_line(cart: dict, line: dict):
+    """Adds a line, merging it into an identically priced line already in the cart."""
+    lines = cart.setdefault("lines", [])
+    for existing in lines:
+        if (existing["item"], existing["item_paise"], existing["modifiers"]) == \
+                (line["item"], line["item_paise"], line["modifiers"]):
+            existing["qty"] += line["qty"]
+            existing["line_paise"] += line["line_paise"]
+            break
+    else:
+        lines.append(line)
+    cart["total_paise"] = cart.get("total_paise", 0) + line["line_paise"]
+
+
+def remove_item(cart: dict, name: str) -> bool:
+    """Removes every line for item ``name``, or strips modifier ``name`` off the lines that have it.
+
+    Returns whether anything was removed; an emptied cart is cleared entirely.
+    """
+    removed = False
+    kept = []
+    for line in cart.get("lines", []):
+        if line["item"] == name:
+            cart["total_paise"] -= line["line_paise"]
+            removed = True
+            continue
+        kept_mods = [m for m in line["modifiers"] if m["name"] != name]
+        if len(kept_mods) != len(line["modifiers"]):
+            stripped = sum(m["paise"] for m in line["modifiers"] if m["name"] == name)
+            line["modifiers"] = kept_mods
+            line["unit_paise"] -= stripped
+            line["line_paise"] = line["qty"] * line["unit_paise"]
+            cart["total_paise"] -= line["qty"] * stripped
+            removed = True
+        kept.append(line)
+    if kept:
+        cart["lines"] = kept
+    else:
+        cart.clear()
+    return removed
+
+
+def line_label(line: dict) -> str:
+    label = line["item"]
+    if line["modifiers"]:
+        label += " with " + " and ".join(m["name"] for m in line["modifiers"])
+    return label
+
+
+def upgrade(cart: dict, products) -> dict:
+    """Converts a legacy ``{name: qty}`` cart to line items in place, priced from ``products``."""
+    if not cart or "lines" in cart:
+        return cart
+    legacy = dict(cart)
+    cart.clear()
+    for name, qty in legacy.items():
+        product = products.get(name.lower())
+        if product is not None:
+            add_line(cart, make_line(product, (), qty))
+    return cart
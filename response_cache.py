@@ -0,0 +1,152 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+class ToolResultCache:
+    """Outputs of pure catalog tools, keyed by (catalog version, tool, arguments).
+
+    A reloaded catalog has a new version, so it simply misses; entries for
+    older versions age out of the LRU. Error strings are never stored.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def call(self, version, name: str, args: tuple, compute):
+        """Returns the cached result of ``name(*args)`` for ``version``, computing it on a miss."""
+        key = (version, name, args)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key]
+            self._misses += 1
+
+        result = compute(*args)
+        if version is not None and not (isinstance(result, str) and result.startswith("Error")):
+            with self._lock:
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+class PromptCache:
+    """Agent replies to stateless menu questions, keyed by catalog version and normalized prompt.
+
+    ``key()`` only accepts prompts that read as a menu question on their
+    own: at least one menu word (generic ones, plus the words of the
+    catalog's item names from ``catalog_names()``), and nothing about the caller's cart,
+    order, payment or details, no quantities, and no pronouns pointing back
+    at earlier turns. The agent decides what gets stored (see
+    ``PizzaAgent``); this class handles normalization, TTL and LRU eviction.
+    """
+
+    FILLER = frozenset({
+        "a", "an", "the", "please", "pls", "hi", "hey", "hello", "can", "could", "would", "will", "you",
+        "tell", "me", "show", "give", "list", "what", "whats", "which", "are", "is", "do", "does", "there",
+        "have", "got", "your", "any", "all", "available", "kindly", "i", "to", "see", "know", "about",
+        "of", "on", "for", "with", "in", "we", "us", "so", "ok", "okay", "and", "or", "some", "offer",
+    })
+    MENU_WORDS = frozenset({
+        "menu", "pizza", "topping", "customization", "customisation", "crust", "cheese", "veg",
+        "vegetarian", "veggie", "nonveg", "spicy", "price", "cost", "option", "special", "burst", "blanket", "size",
+    })
+    PERSONAL_WORDS = frozenset({
+        "add", "remove", "delete", "cart", "order", "ordered", "buy", "pay", "payment", "upi", "cod", "cash",
+        "checkout", "address", "phone", "name", "my", "mine", "it", "that", "this", "them", "those", "one",
+        "yes", "yeah", "no", "nope", "same", "again", "total", "bill", "deliver", "delivery", "track",
+        "status", "cancel", "confirm", "change", "instead", "more", "less", "extra", "also",
+    })
+    _TOKEN = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, ttl=300.0, max_entries=1000, catalog_names=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.catalog_names = catalog_names
+        self._name_words = (None, frozenset())  # (catalog version, words of its item names)
+        self._entries = OrderedDict()  # key -> (expires_at, reply)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._uncacheable = 0
+
+    @staticmethod
+    def _stem(token: str) -> str:
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            return token[:-1]
+        return token
+
+    def _menu_words(self, version):
+        """MENU_WORDS plus the words of the catalog's item names, recomputed once per catalog version."""
+        if self.catalog_names is None:
+            return self.MENU_WORDS
+        cached_version, words = self._name_words
+        if cached_version != version:
+            words = frozenset(self._stem(t) for name in self.catalog_names()
+                              for t in self._TOKEN.findall(name.lower())
+                              if not t.isdigit()) - self.FILLER - self.PERSONAL_WORDS
+            self._name_words = (version, words)
+        return self.MENU_WORDS | words
+
+    def key(self, version, prompt: str):
+        """Cache key for a prompt, or None if it is not a stateless menu question."""
+        raw = set(self._TOKEN.findall((prompt or "").lower()))
+        tokens = {self._stem(t) for t in raw - self.FILLER}
+        if (version is None or raw & self.PERSONAL_WORDS or tokens & self.PERSONAL_WORDS
+                or any(t.isdigit() for t in tokens) or not tokens & self._menu_words(version)):
+            return None
+        return version, " ".join(sorted(tokens))
+
+    def get(self, key):
+        if key is None:
+            with self._lock:
+                self._uncacheable += 1
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key, reply: str):
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, reply)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "uncacheable": self._uncacheable,
+                "hit_rate": self._hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,192 @@
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict
+
+FUZZY_THRESHOLD = 0.4
+SUBSTRING_SCORE = 2
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class MenuSearchIndex:
+    """Inverted trigram index over menu names and descriptions.
+
+    Scoring mirrors the original linear scan: an item whose lowercased name or
+    description contains the query scores 2, otherwise it scores the best
+    ``difflib`` ratio of the query against its name and description and is
+    kept when that ratio exceeds 0.4. Instead of scoring every item, substring
+    matches come from intersecting the query's trigram postings, and fuzzy
+    scoring only runs on fields whose length can still reach the threshold
+    and that share the most trigrams with the query.
+    """
+
+    def __init__(self, items, max_fuzzy_candidates=256, cache_size=512):
+        self.items = list(items)
+        self.max_fuzzy_candidates = max_fuzzy_candidates
+        self.cache_size = cache_size
+
+        # Field id = 2 * item index for the name, 2 * item index + 1 for the description.
+        self._fields = []
+        self._postings = {}
+        for idx, item in enumerate(self.items):
+            for text in (item.get("name", "").lower(), item.get("description", "").lower()):
+                fid = len(self._fields)
+                self._fields.append(text)
+                for gram in _trigrams(text):
+                    self._postings.setdefault(gram, set()).add(fid)
+
+        by_length = sorted((len(text), fid) for fid, text in enumerate(self._fields))
+        self._lengths = [length for length, _ in by_length]
+        self._fids_by_length = [fid for _, fid in by_length]
+
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, query):
+        """Returns ``(score, item)`` pairs ranked best first."""
+        query = query.lower()
+        with self._cache_lock:
+            cached = self._cache.get(query)
+            if cached is not None:
+                self._cache.move_to_end(query)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        results = self._search(query)
+
+        with self._cache_lock:
+            self._cache[query] = results
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def _substring_matches(self, query):
+        """Item indices whose name or description contains the query."""
+        grams = _trigrams(query)
+        if not grams:
+            # One- and two-character queries have no trigrams to look up.
+            return {fid >> 1 for fid, text in enumerate(self._fields) if query in text}
+
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        fids = set(postings[0])
+        for posting in postings[1:]:
+            fids &= posting
+            if not fids:
+                return set()
+        return {fid >> 1 for fid in fids if query in self._fields[fid]}
+
+    def _fuzzy_candidates(self, query, exclude):
+        """Field ids that may still score above the fuzzy threshold."""
+        # ratio = 2M / (len(a) + len(b)) with M <= min(len(a), len(b)), so only
+        # fields strictly between a quarter and four times the query length can pass.
+        size = len(query)
+        lo = bisect_right(self._lengths, size / 4)
+        hi = bisect_left(self._lengths, size * 4)
+        in_band = self._fids_by_length[lo:hi]
+
+        grams = _trigrams(query)
+        if not grams or len(in_band) <= self.max_fuzzy_candidates:
+            return [fid for fid in in_band if fid >> 1 not in exclude]
+
+        band = set(in_band)
+        overlap = Counter()
+        for gram in grams:
+            for fid in self._postings.get(gram, ()):
+                if fid in band and fid >> 1 not in exclude:
+                    overlap[fid] += 1
+        return [fid for fid, _ in overlap.most_common(self.max_fuzzy_candidates)]
+
+    def _search(self, query):
+        import difflib  # only needed once a query misses the cache
+
+        scores = dict.fromkeys(self._substring_matches(query), SUBSTRING_SCORE)
+
+        matcher = difflib.SequenceMatcher(None, query, "")
+        for fid in self._fuzzy_candidates(query, scores):
+            matcher.set_seq2(self._fields[fid])
+            if (matcher.real_quick_ratio() <= FUZZY_THRESHOLD
+                    or matcher.quick_ratio() <= FUZZY_THRESHOLD):
+                continue
+            ratio = matcher.ratio()
+            idx = fid >> 1
+            if ratio > FUZZY_THRESHOLD and ratio > scores.get(idx, 0):
+                scores[idx] = ratio
+
+        # Ties keep catalog order, like the stable sort of the original scan.
+        ranked = sorted(scores.items(), key=lambda entry: (-entry[1], entry[0]))
+        return [(score, self.items[idx]) for idx, score in ranked]
+
+
+def _fold(text):
+    """Lowercases and strips accents so "jalapeño" and "jalapeno" collide."""
+    decomposed = unicodedata.normalize("NFKD", text.strip().lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class ModifierIndex:
+    """Constant-time lookup of toppings/customizations from free-form order text.
+
+    Every modifier is reachable by its exact name, by aliases (accent-folded
+    name, name without the " topping" suffix) and by any fragment of those of
+    at least ``min_fragment`` characters. A fragment shared by several
+    modifiers ("cheese") matches none of them: ``lookup`` returns None and
+    ``candidates`` lists them, so the customer is asked rather than charged
+    for a guess.
+    """
+
+    SUFFIXES = (" topping",)
+
+    def __init__(self, products, min_fragment=3):
+        self.min_fragment = min_fragment
+        self._exact = {}
+        self._fragments = {}
+
+        for product in products:
+            for key in self._aliases(product["name"]):
+                self._exact.setdefault(key, product)
+
+        for product in products:
+            for key in self._aliases(product["name"]):
+                for start in range(len(key)):
+                    for end in range(start + min_fragment, len(key) + 1):
+                        matches = self._fragments.setdefault(key[start:end], [])
+                        if not any(m is product for m in matches):
+                            matches.append(product)
+
+    def _aliases(self, name):
+        folded = _fold(name)
+        aliases = [name.strip().lower(), folded]
+        for suffix in self.SUFFIXES:
+            if folded.endswith(suffix):
+                aliases.append(folded[:-len(suffix)])
+        return aliases
+
+    def lookup_exact(self, text):
+        """Like ``lookup`` but only accepts a full name or alias, never a fragment."""
+        key = text.strip().lower()
+        product = self._exact.get(key)
+        return product if product is not None else self._exact.get(_fold(key))
+
+    def candidates(self, text):
+        """Every modifier ``text`` could mean: one for a name, alias or unique fragment, several if ambiguous."""
+        product = self.lookup_exact(text)
+        if product is not None:
+            return [product]
+        folded = _fold(text)
+        if len(folded) < self.min_fragment:
+            return []
+        return list(self._fragments.get(folded, ()))
+
+    def lookup(self, text):
+        """Returns the matching modifier product, or ``None`` if there is none or the text is ambiguous."""
+        matches = self.candidates(text)
+        return matches[0] if len(matches) == 1 else None
+
+    def __len__(self):
+        return len(self._exact)
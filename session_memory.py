@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+class _Session:
+    __slots__ = ("turns", "summary", "context", "unsummarized", "summarizing", "last_access", "lock")
+
+    def __init__(self):
+        self.turns = deque()  # (human, ai) pairs, oldest first
+        self.summary = ""
+        self.context = ""
+        self.unsummarized = []  # turns that left the window and wait for the summarizer
+        self.summarizing = False
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+
+
+class SessionMemory:
+    """Bounded chat history per session.
+
+    Each session keeps at most ``max_turns`` recent exchanges and at most
+    ``max_tokens`` (estimated) of them. Older exchanges are folded into a
+    running summary by ``summarizer(previous_summary, turns)`` when one is
+    given, or dropped otherwise. Summaries are written on a background
+    thread, so a reply never waits for one; until then the overflowing
+    turns are still sent as history. Sessions idle for ``idle_ttl`` seconds, and
+    the least recently used ones beyond ``max_sessions``, are evicted.
+    """
+
+    def __init__(self, max_turns=10, max_tokens=1500, idle_ttl=1800.0,
+                 max_sessions=10000, summarizer=None, summary_workers=2):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.summarizer = summarizer
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._summary_executor = ThreadPoolExecutor(
+            max_workers=summary_workers, thread_name_prefix="memory-summary") if summarizer else None
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.last_access < self.idle_ttl and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = _Session()
+            else:
+                self._sessions.move_to_end(session_id)
+            state.last_access = now
+            return state
+
+    def history(self, session_id: str) -> list:
+        """Messages to send as ``chat_history`` for the next turn."""
+        state = self._session(session_id)
+        with state.lock:
+            messages = []
+            if state.context:
+                messages.append(("system", state.context))
+            if state.summary:
+                messages.append(("system", f"Summary of the earlier conversation: {state.summary}"))
+            for human, ai in list(state.unsummarized) + list(state.turns):
+                messages.extend([("human", human), ("ai", ai)])
+            return messages
+
+    def append(self, session_id: str, human: str, ai: str):
+        """Records one exchange and trims the window back to budget."""
+        state = self._session(session_id)
+        with state.lock:
+            state.turns.append((human, ai))
+            overflow = []
+            tokens = sum(estimate_tokens(h) + estimate_tokens(a) for h, a in state.turns)
+            # The latest exchange is always kept, even if it alone exceeds the budget.
+            while len(state.turns) > self.max_turns or (len(state.turns) > 1 and tokens > self.max_tokens):
+                human_old, ai_old = state.turns.popleft()
+                tokens -= estimate_tokens(human_old) + estimate_tokens(ai_old)
+                overflow.append((human_old, ai_old))
+
+            if overflow and self.summarizer is not None:
+                state.unsummarized.extend(overflow)
+                if not state.summarizing:
+                    state.summarizing = True
+                    self._summary_executor.submit(self._summarize, state)
+
+    def _summarize(self, state):
+        """Folds queued overflow turns into the session summary, off the request path."""
+        while True:
+            with state.lock:
+                turns = state.unsummarized[:]
+                if not turns:
+                    state.summarizing = False
+                    return
+                summary = state.summary
+            try:
+                summary = self.summarizer(summary, turns)
+            except Exception as e:
+                print(f"Error summarizing conversation: {e}")
+            with state.lock:
+                state.summary = summary
+                del state.unsummarized[:len(turns)]
+
+    def set_context(self, session_id: str, context: str):
+        """Standing notes about the caller (e.g. their previous orders), sent ahead of the history."""
+        state = self._session(session_id)
+        with state.lock:
+            state.context = context
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
@@ -1,8 +1,36 @@
 document.addEventListener('DOMContentLoaded', () => {
     loadMenu();
-    setInterval(updateCart, 3000);
+    watchCart();
 });
 
+let cartEtag = null;
+let cartPolling = null;
+
+function renderCart(cart) {
+    document.getElementById('cartItems').textContent = cart.items;
+    document.getElementById('cartTotal').textContent = cart.total;
+}
+
+function watchCart() {
+    // The server pushes the cart whenever it changes; fall back to
+    // conditional polling where EventSource is unavailable or keeps failing.
+    if (!window.EventSource) {
+        startCartPolling();
+        return;
+    }
+    const source = new EventSource('/cart/stream');
+    source.onmessage = (event) => renderCart(JSON.parse(event.data));
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) startCartPolling();
+    };
+}
+
+function startCartPolling() {
+    if (cartPolling) return;
+    updateCart();
+    cartPolling = setInterval(updateCart, 3000);
+}
+
 async function loadMenu() {
     try {
         const response = await fetch('/menu');
@@ -22,11 +50,12 @@ async function loadMenu() {
 
 async function updateCart() {
     try {
-        const response = await fetch('/cart');
-        const cart = await response.json();
+        const headers = cartEtag ? { 'If-None-Match': cartEtag } : {};
+        const response = await fetch('/cart', { headers, cache: 'no-store' });
+        if (response.status === 304) return;
 
-        document.getElementById('cartItems').textContent = cart.items;
-        document.getElementById('cartTotal').textContent = cart.total;
+        cartEtag = response.headers.get('ETag');
+        renderCart(await response.json());
     } catch (error) {
         console.error('Error updating cart:', error);
     }
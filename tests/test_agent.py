@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from agent import PizzaAgent
+from session_memory import SessionMemory
+
+
+class SlowRouter:
+    """Fast-path router whose lookups block, like a cart read from a slow store."""
+
+    def route(self, session_id, user_input):
+        time.sleep(0.3)
+        return "Your cart is empty."
+
+
+def make_agent():
+    agent = PizzaAgent.__new__(PizzaAgent)  # skips LangChain and LLM setup
+    agent.router = SlowRouter()
+    agent.memory = SessionMemory()
+    return agent
+
+
+async def ticks_during(coro):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, ticks
+
+
+def test_routing_does_not_block_the_event_loop():
+    agent = make_agent()
+    response, ticks = asyncio.run(ticks_during(agent.aprocess_message("s", "show my cart")))
+    assert response["output"] == "Your cart is empty."
+    assert ticks >= 10
+    assert agent.memory.history("s")
+
+
+def test_streamed_routing_does_not_block_the_event_loop():
+    agent = make_agent()
+
+    async def collect():
+        return [chunk async for chunk in agent.astream_message("s", "show my cart")]
+
+    chunks, ticks = asyncio.run(ticks_during(collect()))
+    assert chunks == ["Your cart is empty."]
+    assert ticks >= 10
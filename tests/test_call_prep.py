@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import call_prep
+from call_prep import CallPrep, _Call
+
+
+class Memory:
+    def __init__(self):
+        self.contexts = []
+
+    def set_context(self, session_id, context):
+        self.contexts.append((session_id, context))
+
+
+class Agent:
+    def __init__(self):
+        self.memory = Memory()
+
+
+@pytest.fixture
+def prepared(monkeypatch):
+    """One prepared call for session "s"; ``_load`` blocks until released and records its thread."""
+    agent, loads, release = Agent(), [], threading.Event()
+
+    def load(session_id):
+        loads.append(threading.current_thread().name)
+        release.wait(5)
+        return [], []
+
+    call = _Call("CA1")
+    call.past = []
+    monkeypatch.setattr(CallPrep, "_calls", {"s": call})
+    monkeypatch.setattr(CallPrep, "_load", load)
+    monkeypatch.setattr(call_prep, "agent_status", lambda: {"ready": True})
+    monkeypatch.setattr(call_prep, "get_pizza_agent", lambda *args: agent)
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="call-prep")
+    monkeypatch.setattr(CallPrep, "_executor", executor)
+    yield call, agent, loads, release
+    release.set()
+    executor.shutdown()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_cart_change_reloads_off_the_calling_thread(prepared):
+    call, agent, loads, release = prepared
+    started = time.monotonic()
+    CallPrep.cart_changed("s")
+    assert time.monotonic() - started < 0.5
+    assert wait_for(lambda: loads)
+    assert loads[0].startswith("call-prep")
+    release.set()
+    assert wait_for(lambda: not call.refreshing)
+    assert agent.memory.contexts == [("s", "")]
+
+
+def test_changes_during_a_reload_are_coalesced(prepared):
+    call, agent, loads, release = prepared
+    CallPrep.cart_changed("s")
+    assert wait_for(lambda: loads)
+    for _ in range(5):
+        CallPrep.cart_changed("s")
+    release.set()
+    assert wait_for(lambda: not call.refreshing)
+    assert len(loads) == 2
+
+
+def test_sessions_without_a_prepared_call_are_ignored(prepared):
+    call, agent, loads, release = prepared
+    CallPrep.cart_changed("web-session")
+    call.past = None  # still preparing
+    CallPrep.cart_changed("s")
+    time.sleep(0.05)
+    assert loads == [] and agent.memory.contexts == []
@@ -0,0 +1,72 @@
+import pytest
+
+from cart_store import CartStore, InMemoryCartStore, SQLiteCartStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryCartStore()
+    return SQLiteCartStore(str(tmp_path / "carts.db"))
+
+
+def add(cart):
+    cart["lines"] = cart.get("lines", []) + ["pizza"]
+    return len(cart["lines"])
+
+
+def test_update_get_and_pop(store):
+    assert store.get("s") == {}
+    assert store.update("s", add) == 1
+    assert store.update("s", add) == 2
+    assert store.get("s") == {"lines": ["pizza", "pizza"]}
+    assert store.pop("s") == {"lines": ["pizza", "pizza"]}
+    assert store.get("s") == {}
+
+
+def test_get_returns_a_copy(store):
+    store.update("s", add)
+    store.get("s")["lines"].append("sneaky")
+    assert store.get("s") == {"lines": ["pizza"]}
+
+
+def test_failed_mutation_keeps_the_cart(store):
+    store.update("s", add)
+
+    def fail(cart):
+        cart.clear()
+        raise ValueError("bad item")
+
+    with pytest.raises(ValueError):
+        store.update("s", fail)
+    assert store.get("s") == {"lines": ["pizza"]}
+
+
+def test_emptied_cart_is_removed(store):
+    store.update("s", add)
+    store.update("s", lambda cart: cart.clear())
+    assert store.get("s") == {}
+
+
+def test_expired_carts_are_gone(tmp_path):
+    for store in (InMemoryCartStore(ttl=0), SQLiteCartStore(str(tmp_path / "carts.db"), ttl=0)):
+        store.update("s", add)
+        assert store.get("s") == {}
+
+
+def test_memory_store_is_bounded():
+    store = InMemoryCartStore(max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        store.update(session_id, add)
+    assert len(store) == 2 and store.get("a") == {}
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "carts.db")
+    SQLiteCartStore(path).update("s", add)
+    assert SQLiteCartStore(path).get("s") == {"lines": ["pizza"]}
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        CartStore()
@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if not self.conn.alive:
+            raise RuntimeError("server closed the connection")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self):
+        self.alive = True
+        self.closed = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+def test_connections_are_created_lazily_and_reused():
+    pool = ConnectionPool(FakeConnection, minconn=0, maxconn=2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()["created"] == 1
+
+
+def test_getconn_times_out_when_exhausted():
+    pool = ConnectionPool(FakeConnection, minconn=0, maxconn=1)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.05)
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_waiter_is_woken_by_putconn():
+    pool = ConnectionPool(FakeConnection, minconn=0, maxconn=1)
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+    assert pool.getconn(timeout=2) is conn
+
+
+def test_dead_idle_connection_is_replaced():
+    pool = ConnectionPool(FakeConnection, minconn=0, maxconn=1, health_check_after=0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.alive = False
+    fresh = pool.getconn()
+    assert fresh is not conn and conn.closed
+    stats = pool.stats()
+    assert stats["health_check_failures"] == 1 and stats["in_use"] == 1
+
+
+def test_failed_connect_frees_its_slot():
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("connection refused")
+        return FakeConnection()
+
+    pool = ConnectionPool(connect, minconn=0, maxconn=1)
+    with pytest.raises(RuntimeError):
+        pool.getconn()
+    assert pool.getconn(timeout=0.1) is not None
+    assert pool.stats()["created"] == 1
+
+
+def test_health_check_runs_outside_the_lock():
+    release = threading.Event()
+
+    class SlowConnection(FakeConnection):
+        def cursor(self):
+            release.wait(2)
+            return FakeCursor(self)
+
+    pool = ConnectionPool(SlowConnection, minconn=0, maxconn=2, health_check_after=0)
+    slow = pool.getconn()
+    pool.putconn(slow)
+    checker = threading.Thread(target=pool.getconn)
+    checker.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    other = pool.getconn(timeout=1)  # a new connection while the first is being pinged
+    assert other is not slow and time.monotonic() - started < 0.5
+    release.set()
+    checker.join()
+
+
+def test_connection_context_commits_or_rolls_back():
+    pool = ConnectionPool(FakeConnection, minconn=1, maxconn=1)
+    with pool.connection() as conn:
+        pass
+    assert conn.commits == 1
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError("boom")
+    assert conn.rollbacks == 1 and pool.stats()["in_use"] == 0
+
+
+def test_idle_connections_beyond_minimum_are_evicted():
+    pool = ConnectionPool(FakeConnection, minconn=1, maxconn=3, idle_timeout=0)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+    pool.getconn()
+    assert pool.stats()["evicted_idle"] == 2
@@ -0,0 +1,33 @@
+from search_index import ModifierIndex
+
+MODIFIERS = [
+    {"name": "Cheese Burst", "price": 150, "category": "customization"},
+    {"name": "Extra Cheese", "price": 60, "category": "topping"},
+    {"name": "Jalapeño Topping", "price": 40, "category": "topping"},
+    {"name": "Olives", "price": 40, "category": "topping"},
+]
+
+
+def test_exact_names_and_aliases_resolve():
+    index = ModifierIndex(MODIFIERS)
+    assert index.lookup("Cheese Burst")["name"] == "Cheese Burst"
+    assert index.lookup("jalapeno")["name"] == "Jalapeño Topping"
+    assert index.lookup_exact("burst") is None
+
+
+def test_unique_fragment_resolves():
+    index = ModifierIndex(MODIFIERS)
+    assert index.lookup("burst")["name"] == "Cheese Burst"
+    assert index.lookup("oliv")["name"] == "Olives"
+
+
+def test_ambiguous_fragment_does_not_resolve():
+    index = ModifierIndex(MODIFIERS)
+    assert index.lookup("cheese") is None
+    assert sorted(m["name"] for m in index.candidates("cheese")) == ["Cheese Burst", "Extra Cheese"]
+
+
+def test_short_or_unknown_text_has_no_candidates():
+    index = ModifierIndex(MODIFIERS)
+    assert index.candidates("ch") == []
+    assert index.lookup("pineapple") is None
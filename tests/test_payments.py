@@ -0,0 +1,54 @@
+import hashlib
+import hmac
+import threading
+
+from payments import PaymentPoller, verify_webhook_signature
+
+BODY = b'{"event": "order.paid"}'
+
+
+def sign(body, secret):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def test_valid_signature():
+    assert verify_webhook_signature(BODY, sign(BODY, "secret"), "secret")
+
+
+def test_tampered_body_or_wrong_secret():
+    assert not verify_webhook_signature(BODY + b" ", sign(BODY, "secret"), "secret")
+    assert not verify_webhook_signature(BODY, sign(BODY, "other"), "secret")
+
+
+def test_missing_signature_or_secret():
+    assert not verify_webhook_signature(BODY, "", "secret")
+    assert not verify_webhook_signature(BODY, sign(BODY, ""), "")
+
+
+def test_poller_retries_until_status_is_handled():
+    calls = []
+    done = threading.Event()
+
+    def on_status(order_id, status):
+        calls.append((order_id, status))
+        if len(calls) < 3:
+            raise RuntimeError("database unavailable")
+        done.set()
+
+    poller = PaymentPoller(lambda order_id: "captured", on_status,
+                           initial_delay=0.01, max_delay=0.02, max_wait=5)
+    poller.watch("order_1")
+    assert done.wait(5)
+    assert calls == [("order_1", "captured")] * 3
+    assert poller.pending() == 0
+
+
+def test_poller_expires_unpaid_orders():
+    statuses = []
+    done = threading.Event()
+    poller = PaymentPoller(lambda order_id: None,
+                           lambda order_id, status: (statuses.append(status), done.set()),
+                           initial_delay=0.01, max_delay=0.02, max_wait=0.05)
+    poller.watch("order_2")
+    assert done.wait(5)
+    assert statuses == ["expired"]
@@ -0,0 +1,42 @@
+import pricing
+
+MARGHERITA = {"name": "Margherita Classic", "price": 499, "category": "pizza"}
+CHEESE_BURST = {"name": "Cheese Burst", "price": "150.50", "category": "customization"}
+
+
+def test_to_paise_is_exact():
+    assert pricing.to_paise(0.1) == 10
+    assert pricing.to_paise("149.995") == 15000
+    assert pricing.format_rupees(129800) == "₹1298.00"
+    assert pricing.format_rupees(-5) == "-₹0.05"
+
+
+def test_identical_lines_merge_and_total_is_kept():
+    cart = {}
+    pricing.add_line(cart, pricing.make_line(MARGHERITA, [CHEESE_BURST], 1))
+    pricing.add_line(cart, pricing.make_line(MARGHERITA, [CHEESE_BURST], 2))
+    pricing.add_line(cart, pricing.make_line(MARGHERITA, [], 1))
+    assert [line["qty"] for line in cart["lines"]] == [3, 1]
+    assert cart["total_paise"] == 3 * 64950 + 49900
+    assert pricing.line_label(cart["lines"][0]) == "Margherita Classic with Cheese Burst"
+
+
+def test_removing_a_modifier_reprices_its_lines():
+    cart = {}
+    pricing.add_line(cart, pricing.make_line(MARGHERITA, [CHEESE_BURST], 2))
+    assert pricing.remove_item(cart, "Cheese Burst")
+    assert cart["lines"][0]["line_paise"] == 2 * 49900 == cart["total_paise"]
+
+
+def test_removing_the_last_item_clears_the_cart():
+    cart = {}
+    pricing.add_line(cart, pricing.make_line(MARGHERITA, [], 1))
+    assert pricing.remove_item(cart, "Margherita Classic")
+    assert cart == {}
+    assert not pricing.remove_item(cart, "Margherita Classic")
+
+
+def test_legacy_cart_is_upgraded():
+    cart = {"Margherita Classic": 2, "Discontinued": 1}
+    pricing.upgrade(cart, {"margherita classic": MARGHERITA})
+    assert cart["total_paise"] == 99800 and len(cart["lines"]) == 1
@@ -0,0 +1,47 @@
+from response_cache import PromptCache
+
+
+def test_menu_questions_share_a_key():
+    cache = PromptCache()
+    assert cache.key("v1", "What pizzas do you have?") == ("v1", "pizza")
+    assert cache.key("v1", "Which pizzas?") == cache.key("v1", "pizzas")
+
+
+def test_key_depends_on_catalog_version():
+    cache = PromptCache()
+    assert cache.key("v1", "menu") != cache.key("v2", "menu")
+    assert cache.key(None, "menu") is None
+
+
+def test_personal_or_stateful_prompts_are_not_cached():
+    cache = PromptCache()
+    for prompt in ("add a pizza to my cart", "what's the total", "2 pizzas please", "is that one spicy?",
+                   "hello", ""):
+        assert cache.key("v1", prompt) is None, prompt
+
+
+def test_catalog_item_names_count_as_menu_words():
+    calls = []
+
+    def names():
+        calls.append(1)
+        return ["Margherita Classic", "Pepperoni 2 Go"]
+
+    cache = PromptCache(catalog_names=names)
+    assert cache.key("v1", "how much is the margherita?") == ("v1", "how margherita much")
+    assert cache.key("v1", "tell me about pepperoni") is not None
+    assert PromptCache().key("v1", "tell me about pepperoni") is None
+    assert len(calls) == 1  # once per catalog version
+    cache.key("v2", "margherita")
+    assert len(calls) == 2
+
+
+def test_get_put_and_expiry():
+    cache = PromptCache(ttl=60)
+    key = cache.key("v1", "menu")
+    assert cache.get(key) is None
+    cache.put(key, "We have pizzas.")
+    assert cache.get(key) == "We have pizzas."
+    assert PromptCache(ttl=0).get(key) is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
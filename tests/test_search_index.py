@@ -0,0 +1,49 @@
+import json
+import os
+from difflib import SequenceMatcher
+
+from search_index import MenuSearchIndex
+
+
+ITEMS = [
+    {"name": "Margherita Classic", "description": "Tomato, mozzarella and basil"},
+    {"name": "Classic Pepperoni", "description": "Spicy pepperoni and cheese"},
+    {"name": "Farmhouse", "description": "Onion, capsicum, tomato and mushroom"},
+]
+
+
+def test_substring_matches_rank_first_in_catalog_order():
+    results = MenuSearchIndex(ITEMS).search("classic")
+    assert [item["name"] for score, item in results[:2]] == ["Margherita Classic", "Classic Pepperoni"]
+    assert results[0][0] == 2
+
+
+def test_fuzzy_match_and_cache():
+    index = MenuSearchIndex(ITEMS)
+    assert index.search("farmhose")[0][1]["name"] == "Farmhouse"
+    index.search("farmhose")
+    assert index.hits == 1
+
+
+def linear_scan(items, query):
+    """The original ProductTool.search_product scoring, kept as the reference."""
+    query = query.lower()
+    results = []
+    for item in items:
+        name, description = item.get("name", "").lower(), item.get("description", "").lower()
+        if query in name or query in description:
+            score = 2
+        else:
+            score = max(SequenceMatcher(None, query, name).ratio(), SequenceMatcher(None, query, description).ratio())
+            if score <= 0.4:
+                continue
+        results.append((score, item))
+    return sorted(results, key=lambda entry: -entry[0])
+
+
+def test_ranking_matches_the_linear_scan():
+    with open(os.path.join(os.path.dirname(os.path.dirname(__file__)), "product_catalog.json"), encoding="utf-8") as f:
+        items = json.load(f)
+    index = MenuSearchIndex(items)
+    for query in ("pepperoni", "cheese", "margarita", "spicy chicken", "veg", "xyz"):
+        assert index.search(query) == linear_scan(items, query), query
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from voice_turns import VoiceTurns
+
+
+@pytest.fixture(autouse=True)
+def fresh_turns(monkeypatch):
+    monkeypatch.setattr(VoiceTurns, "_turns", {})
+    monkeypatch.setattr(VoiceTurns, "_tails", {})
+    monkeypatch.setattr(VoiceTurns, "TURN_TIMEOUT", 5)
+
+
+def recorder():
+    log, active, lock = [], [], threading.Lock()
+
+    def work(name, seconds):
+        with lock:
+            active.append(name)
+            log.append((name, len(active)))
+        time.sleep(seconds)
+        with lock:
+            active.remove(name)
+        return {"output": name}
+
+    return log, work
+
+
+def test_turns_of_a_session_run_in_order():
+    log, work = recorder()
+    first = VoiceTurns.submit("s", work, "first", 0.2)
+    second = VoiceTurns.submit("s", work, "second", 0)
+    assert VoiceTurns.result(second, 2) == {"output": "second"}
+    assert log == [("first", 1), ("second", 1)]
+    assert first.future.done()
+
+
+def test_order_survives_give_up():
+    log, work = recorder()
+    slow = VoiceTurns.submit("s", work, "slow", 0.3)
+    assert VoiceTurns.result(slow, 0.05) is None
+    VoiceTurns.give_up(slow)
+    assert VoiceTurns.get("s", slow.id) is None
+    nxt = VoiceTurns.submit("s", work, "next", 0)
+    assert VoiceTurns.result(nxt, 2) == {"output": "next"}
+    assert log == [("slow", 1), ("next", 1)]
+
+
+def test_latest_turn_is_looked_up_by_id():
+    _, work = recorder()
+    turn = VoiceTurns.submit("s", work, "t", 0)
+    assert VoiceTurns.get("s", turn.id) is turn
+    assert VoiceTurns.get("s", "other") is None
+    assert VoiceTurns.result(turn, 2) == {"output": "t"}
+    assert VoiceTurns.get("s", turn.id) is None  # delivered
+
+
+def test_failed_turn_delivers_an_empty_response():
+    def fail():
+        raise RuntimeError("llm down")
+
+    turn = VoiceTurns.submit("s", fail)
+    assert VoiceTurns.result(turn, 2) == {}
+
+
+def test_async_turns_run_in_order_after_give_up():
+    log = []
+
+    async def work(name, seconds):
+        log.append(("start", name))
+        await asyncio.sleep(seconds)
+        log.append(("end", name))
+        return {"output": name}
+
+    async def scenario():
+        slow = VoiceTurns.asubmit("s", work, "slow", 0.2)
+        assert await VoiceTurns.aresult(slow, 0.05) is None
+        VoiceTurns.give_up(slow)
+        del slow
+        nxt = VoiceTurns.asubmit("s", work, "next", 0)
+        assert len(VoiceTurns._tasks) == 2
+        return await VoiceTurns.aresult(nxt, 2)
+
+    assert asyncio.run(scenario()) == {"output": "next"}
+    assert log == [("start", "slow"), ("end", "slow"), ("start", "next"), ("end", "next")]
+    assert not VoiceTurns._tasks
+
+
+def test_cancelled_async_turn_delivers_an_empty_response():
+    async def interrupted():
+        raise asyncio.CancelledError()
+
+    async def scenario():
+        turn = VoiceTurns.asubmit("s", interrupted)
+        return await VoiceTurns.aresult(turn, 2), VoiceTurns.get("s", turn.id)
+
+    assert asyncio.run(scenario()) == ({}, None)
+
+
+def test_cancelled_turn_delivers_an_empty_response():
+    release = threading.Event()
+    VoiceTurns.submit("s", release.wait, 5)
+    turn = VoiceTurns.submit("s", lambda: {"output": "late"})
+    assert turn.future.cancel()
+    assert VoiceTurns.result(turn, 2) == {}
+    release.set()
@@ -1,54 +1,50 @@
+import asyncio
 import os
-import random
 import json
-import difflib
-import razorpay
-from razorpay.errors import BadRequestError
-import time
-import psycopg2
-from psycopg2 import sql
 import uuid
-from typing import Dict, Optional
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from db_pool import ConnectionPool
+from catalog import get_catalog
+import metrics
+import pricing
+from cart_store import CartChanges, create_cart_store
+from payments import PaymentPoller, RazorpayGateway, verify_webhook_signature
+from collections import OrderedDict
+from order_sink import WriteBehindOrderSink
+from order_feed import OrderFeed, PollingSource, PostgresNotifySource
 load_dotenv()
 
 class CartTool:
-    cart_data = {}
-    PRODUCTS = {}
-    PIZZAS = {}
-    CUSTOMIZATIONS = {}
-    TOPPINGS = {}
-    PRICE_FILE = "product_catalog.json"
+    _store = None
+    _store_lock = threading.Lock()
+    changes = CartChanges()
+    PRICE_FILE = os.getenv("CATALOG_FILE", "product_catalog.json")
+
+    @staticmethod
+    def catalog():
+        """Returns the current catalog snapshot (shared with ProductTool, reloaded on file change)."""
+        return get_catalog(CartTool.PRICE_FILE).current()
 
     @classmethod
-    def load_products(cls):
-        """Load product data from JSON file and categorize them, but only if empty."""
-        if cls.PRODUCTS:
-            return
-        
-        try:
-            with open(cls.PRICE_FILE, "r") as f:
-                products = json.load(f)
-                cls.PRODUCTS.clear()
-                for item in products:
-                    key = item["name"].strip().lower()
-                    cls.PRODUCTS[key] = {
-                        "name": item["name"],
-                        "price": item["price"],
-                        "category": item["category"]
-                    }
-
-                cls.PIZZAS = {k: v for k, v in cls.PRODUCTS.items() if v["category"] == "pizza"}
-                cls.CUSTOMIZATIONS = {k: v for k, v in cls.PRODUCTS.items() if v["category"] == "customization"}
-                cls.TOPPINGS = {k: v for k, v in cls.PRODUCTS.items() if v["category"] == "topping"}
-        except Exception as e:
-            print(f"Error loading products: {e}")
+    def get_store(cls):
+        """Returns the cart store for this process, creating it on first use."""
+        if cls._store is None:
+            with cls._store_lock:
+                if cls._store is None:
+                    cls._store = create_cart_store()
+        return cls._store
+
+    @classmethod
+    def set_store(cls, store):
+        """Replaces the cart store (e.g. with a shared backend)."""
+        cls._store = store
 
     @staticmethod
     def add_item(session_id: str, item_name: str, quantity: int):
         """Adds an item to the cart with proper parsing of pizza, customizations, and toppings."""
-        CartTool.load_products()
+        catalog = CartTool.catalog()
         item_name = item_name.strip().lower()
 
         parts = item_name.split(" with ")
@@ -57,123 +53,163 @@ class CartTool:
         if len(parts) > 1:
             modifiers = [m.strip() for m in parts[1].split(" and ")]
 
-        if base_part not in CartTool.PIZZAS:
+        if base_part not in catalog.pizzas:
             return f"Error: '{base_part}' is not a valid pizza."
 
-        base_product = CartTool.PRODUCTS[base_part]
-        base_name = base_product["name"]
+        base_product = catalog.products[base_part]
 
         valid_modifiers = []
         for mod in modifiers:
-            mod_lower = mod.lower()
-            
-            product_match = next(
-                (p for p in CartTool.PRODUCTS.values() if mod_lower in p["name"].lower()), None
-            )
-
-            if not product_match:
+            matches = catalog.modifiers.candidates(mod)
+
+            if len(matches) > 1:
+                options = " or ".join(m["name"] for m in matches)
+                return f"Error: '{mod}' could mean {options}. Please ask the customer which one."
+            if not matches:
+                if mod.lower() in catalog.products:
+                    return f"Error: '{mod}' is not a valid topping or customization."
                 return f"Error: Modifier '{mod}' not found."
-            
-            if product_match["category"] not in ["topping", "customization"]:
-                return f"Error: '{mod}' is not a valid topping or customization."
-            
-            valid_modifiers.append(product_match["name"])
 
-        cart = CartTool.cart_data.setdefault(session_id, {})
-        cart[base_name] = cart.get(base_name, 0) + quantity
-        for mod in valid_modifiers:
-            cart[mod] = cart.get(mod, 0) + quantity
+            valid_modifiers.append(matches[0])
 
-        response = f"Added {quantity} {base_name}"
+        line = pricing.make_line(base_product, valid_modifiers, quantity)
+
+        def add(cart):
+            pricing.upgrade(cart, catalog.products)
+            pricing.add_line(cart, line)
+
+        CartTool.get_store().update(session_id, add)
+        CartTool.changes.notify(session_id)
+
+        response = f"Added {quantity} {line['item']}"
         if valid_modifiers:
-            response += f" with {', '.join(valid_modifiers)}"
+            response += f" with {', '.join(m['name'] for m in line['modifiers'])}"
         return response + "."
 
     @staticmethod
     def delete_item(session_id: str, item_name: str):
         """Removes an item from the cart with case-insensitive lookup."""
-        CartTool.load_products()
         item_lower = item_name.strip().lower()
-        product = CartTool.PRODUCTS.get(item_lower)
+        product = CartTool.catalog().products.get(item_lower)
         if not product:
             return f"Error: {item_name} not in menu."
         original_name = product["name"]
-        
-        if session_id in CartTool.cart_data and original_name in CartTool.cart_data[session_id]:
-            del CartTool.cart_data[session_id][original_name]
+        products = CartTool.catalog().products
+
+        def remove(cart):
+            pricing.upgrade(cart, products)
+            return pricing.remove_item(cart, original_name)
+
+        removed = CartTool.get_store().update(session_id, remove)
+        if removed:
+            CartTool.changes.notify(session_id)
             return f"Removed {original_name} from cart."
         return f"{original_name} not found in cart."
 
+    @staticmethod
+    def get_lines(session_id: str):
+        """Returns the priced cart: ``{"lines": [...], "total_paise": int}`` (see pricing.py)."""
+        cart = pricing.upgrade(CartTool.get_store().get(session_id), CartTool.catalog().products)
+        return {"lines": cart.get("lines", []), "total_paise": cart.get("total_paise", 0)}
+
+    @staticmethod
+    def total_paise(session_id: str) -> int:
+        """Exact cart total in paise."""
+        return CartTool.get_lines(session_id)["total_paise"]
+
+    @staticmethod
+    def _format_cart(cart: dict):
+        if not cart["lines"]:
+            return "Your cart is empty."
+        return "\n".join(f"{line['qty']}x {pricing.line_label(line)}" for line in cart["lines"])
+
+    @staticmethod
+    def _format_total(cart: dict):
+        return f"Total: {pricing.format_rupees(cart['total_paise'])}"
+
     @staticmethod
     def get_cart(session_id: str):
         """Retrieves formatted cart contents."""
-        items = CartTool.cart_data.get(session_id, {})
-        if not items:
-            return "Your cart is empty."
-        return "\n".join([f"{qty}x {item}" for item, qty in items.items()])
+        return CartTool._format_cart(CartTool.get_lines(session_id))
 
     @staticmethod
     def calculate_total(session_id: str):
         """Calculates the total price of items in the cart."""
-        total = 0.0
-        cart = CartTool.cart_data.get(session_id, {})
-        for item, qty in cart.items():
-            product = CartTool.PRODUCTS.get(item.lower())
-            if product:
-                total += product["price"] * qty
-        return f"Total: ₹{total:.2f}"
+        return CartTool._format_total(CartTool.get_lines(session_id))
+
+    @staticmethod
+    def snapshot(session_id: str):
+        """Cart contents and total from a single store read, as served by /cart."""
+        cart = CartTool.get_lines(session_id)
+        return {"items": CartTool._format_cart(cart), "total": CartTool._format_total(cart),
+                "lines": cart["lines"], "total_paise": cart["total_paise"]}
+
+    @staticmethod
+    def clear_cart(session_id: str):
+        """Empties the cart, returning what was in it."""
+        items = CartTool.get_store().pop(session_id)
+        CartTool.changes.notify(session_id)
+        return items
+
+    @staticmethod
+    def clear_checked_out(session_id: str, lines: list) -> bool:
+        """Empties the cart if it still holds exactly the checked-out ``lines``.
+
+        A cart the customer changed or started afresh after checkout is kept.
+        """
+        products = CartTool.catalog().products
+
+        def clear(cart):
+            pricing.upgrade(cart, products)
+            if cart.get("lines") != lines:
+                return False
+            cart.clear()
+            return True
+
+        cleared = CartTool.get_store().update(session_id, clear)
+        if cleared:
+            CartTool.changes.notify(session_id)
+        return cleared
 
 class ProductTool:
-    MENU_FILE = "product_catalog.json"
-    _menu_cache = None
+    MENU_FILE = os.getenv("CATALOG_FILE", "product_catalog.json")
+
+    @staticmethod
+    def catalog():
+        """Returns the current catalog snapshot (shared with CartTool, reloaded on file change)."""
+        return get_catalog(ProductTool.MENU_FILE).current()
+
+    @classmethod
+    def catalog_version(cls):
+        """Identifies the loaded catalog version (changes whenever the file is reloaded)."""
+        return cls.catalog().version
 
     @classmethod
     def load_menu(cls):
-        """Loads the product menu from a JSON file if not already loaded."""
-        if cls._menu_cache is None:
-            try:
-                with open(cls.MENU_FILE, "r", encoding="utf-8") as file:
-                    menu = json.load(file)
-                    if not isinstance(menu, list):
-                        return None, "Error: Invalid menu format."
-                    cls._menu_cache = menu
-            except (FileNotFoundError, json.JSONDecodeError):
-                return None, "Error: Unable to load menu."
-        
-        return cls._menu_cache, None
+        """Returns the catalog items from the current snapshot."""
+        catalog = cls.catalog()
+        if catalog.error:
+            return None, catalog.error
+        return catalog.items, None
 
     @classmethod
     def search_product(cls, query: str) -> str:
         """Searches for a pizza based on a query."""
-        menu, error = cls.load_menu()
-        if error:
-            return error
-        
-        query = query.lower()
-        results = []
-        
-        for item in menu:
-            name, description = item["name"].lower(), item["description"].lower()
-            if query in name or query in description:
-                score = 2
-            else:
-                score = max(
-                    difflib.SequenceMatcher(None, query, name).ratio(),
-                    difflib.SequenceMatcher(None, query, description).ratio()
-                )
-            if score > 0.4:
-                results.append((score, f"🍕 **{item['name']}**\n- {item['description']}"))
-
-        return "\n\n".join(res[1] for res in sorted(results, reverse=True, key=lambda x: x[0])) or "No matching pizzas found."
+        catalog = cls.catalog()
+        if catalog.error:
+            return catalog.error
+
+        results = catalog.search_index.search(query)
+        return "\n\n".join(f"🍕 **{item['name']}**\n- {item['description']}" for _, item in results) or "No matching pizzas found."
     
     @classmethod
     def list_all_pizzas(cls) -> str:
         """Lists all pizzas on the menu."""
-        menu, error = cls.load_menu()
-        if error:
-            return error
+        catalog = cls.catalog()
+        if catalog.error:
+            return catalog.error
 
-        pizzas = [item["name"] for item in menu if item.get("category") == "pizza"]
+        pizzas = [product["name"] for product in catalog.pizzas.values()]
 
         if not pizzas:
             return "No pizzas available."
@@ -183,134 +219,470 @@ class ProductTool:
 
     @staticmethod
     def get_customizations():
-        """Extracts available customizations from the cached menu."""
-        menu, error = ProductTool.load_menu()
-        if error:
-            return None, error
-        
-        customizations = {"Cheese Options": [], "Toppings": []}
+        """Extracts available customizations and toppings from the cached menu."""
+        catalog = ProductTool.catalog()
+        if catalog.error:
+            return None, catalog.error
 
-        for item in menu:
-            if item.get("category") == "Cheese Options":
-                customizations["Cheese Options"].append({
-                    "name": item["name"],
-                    "price": item["price"]
-                })
-            elif item.get("category") == "Toppings":
-                customizations["Toppings"].append({
-                    "name": item["name"],
-                    "price": item["price"]
-                })
-
-        return customizations
+        return {
+            "Customizations": [{"name": p["name"], "price": p["price"]} for p in catalog.customizations.values()],
+            "Toppings": [{"name": p["name"], "price": p["price"]} for p in catalog.toppings.values()],
+        }
 
     @staticmethod
     def list_customizations():
         customizations = ProductTool.get_customizations()
+        if isinstance(customizations, tuple):
+            return customizations[1]
         result = []
         for category, items in customizations.items():
             result.append(f"{category}:")
             result.extend([f"- {item['name']} (₹{item['price']})" for item in items])
         return "\n".join(result)
 
+    @staticmethod
+    def structured_menu():
+        """The menu grouped by category, for clients that render it themselves."""
+        catalog = ProductTool.catalog()
+        if catalog.error:
+            return None, catalog.error
+
+        menu = catalog.items
+        structured = {"version": catalog.version, "pizzas": [], "customizations": [], "toppings": []}
+        groups = {"pizza": "pizzas", "customization": "customizations", "topping": "toppings"}
+        for item in menu:
+            group = groups.get(item.get("category"))
+            if group:
+                entry = {"name": item["name"], "price": item["price"]}
+                if item.get("description"):
+                    entry["description"] = item["description"]
+                structured[group].append(entry)
+        return structured, None
+
 # Work on this now
 class PaymentTool:
     RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID")
     RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET")
+    RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+    RAZORPAY_BASE_URL = os.getenv("RAZORPAY_BASE_URL", "https://api.razorpay.com")
+    RAZORPAY_TIMEOUT = float(os.getenv("RAZORPAY_TIMEOUT", "10"))
+    RAZORPAY_RETRIES = int(os.getenv("RAZORPAY_RETRIES", "3"))
+    CONFIRMED_CACHE_SIZE = 10000
+    _pending = {}  # razorpay order id -> checkout details awaiting capture
+    _confirmed = OrderedDict()  # razorpay order id -> our order id
+    _lock = threading.Lock()
+    _poller = None
+    _gateway = None
+    _gateway_pid = None
+
+    @classmethod
+    def gateway(cls):
+        """Returns the process-wide Razorpay gateway, creating it on first use in each process."""
+        if cls._gateway_pid != os.getpid():
+            with cls._lock:
+                if cls._gateway_pid != os.getpid():
+                    # A gateway inherited through fork shares its keep-alive sockets with the parent.
+                    cls._gateway = RazorpayGateway(
+                        cls.RAZORPAY_KEY_ID,
+                        cls.RAZORPAY_KEY_SECRET,
+                        base_url=cls.RAZORPAY_BASE_URL,
+                        read_timeout=cls.RAZORPAY_TIMEOUT,
+                        retries=cls.RAZORPAY_RETRIES,
+                    )
+                    cls._gateway_pid = os.getpid()
+        return cls._gateway
+
+    @classmethod
+    def get_poller(cls):
+        """Returns the background payment poller, creating it on first use."""
+        with cls._lock:
+            if cls._poller is None:
+                cls._poller = PaymentPoller(cls._check_order, cls._on_poll_status)
+            return cls._poller
+
+    @classmethod
+    def pending_count(cls) -> int:
+        """UPI checkouts waiting for their payment to be captured."""
+        with cls._lock:
+            return len(cls._pending)
 
     @staticmethod
     def _get_cart_amount(session_id: str) -> tuple:
-        """Helper to get cart amount and validate cart"""
-        amount_str = CartTool.calculate_total(session_id)
-        if "Error" in amount_str:
-            return None, amount_str
-            
-        try:
-            amount = float(amount_str.split("₹")[-1])
-            return amount, None
-        except (ValueError, IndexError):
-            return None, "Error: Invalid total amount format"
+        """Helper to get the cart amount in paise and validate the cart"""
+        amount_paise = CartTool.total_paise(session_id)
+        if amount_paise <= 0:
+            return None, "Error: Your cart is empty."
+        return amount_paise, None
 
     @staticmethod
     def process_payment(session_id: str,method: str,name: str,address: str,phone: str,upi_id: str = None) -> str:
         """Process payment with user details."""
 
-        amount, error = PaymentTool._get_cart_amount(session_id)
+        amount_paise, error = PaymentTool._get_cart_amount(session_id)
         if error:
             return error
             
         method = method.lower()
         if method == "upi":
-            return PaymentTool._process_upi(session_id, amount, upi_id, name, address, phone)
+            return PaymentTool._process_upi(session_id, amount_paise, upi_id, name, address, phone)
         elif method == "cod":
-            return PaymentTool._process_cod(session_id, amount, name, address, phone)
+            return PaymentTool._process_cod(session_id, amount_paise, name, address, phone)
         elif method == "Cash on Delivery":
-            return PaymentTool._process_cod(session_id, amount, name, address, phone)
+            return PaymentTool._process_cod(session_id, amount_paise, name, address, phone)
         else:
             return "Error: Invalid payment method."
 
     @staticmethod
-    def _process_upi(session_id: str, amount: float, upi_id: str, name: str, address: str, phone: str) -> str:
-        """Handle UPI payment through Razorpay"""
-        if not upi_id or '@' not in upi_id:
-            return "Error: Invalid UPI ID format (should be xxx@bank)"
+    async def aprocess_payment(session_id: str, method: str, name: str, address: str, phone: str, upi_id: str = None) -> str:
+        """``process_payment`` for the async agent: Razorpay is called over the async client,
+        and COD orders are logged on a worker thread."""
+        if method.lower() != "upi":
+            return await asyncio.to_thread(PaymentTool.process_payment, session_id, method, name, address, phone, upi_id)
 
-        client = razorpay.Client(auth=(PaymentTool.RAZORPAY_KEY_ID, 
-                                    PaymentTool.RAZORPAY_KEY_SECRET))
+        amount_paise, error = PaymentTool._get_cart_amount(session_id)
+        if error:
+            return error
+        request, error = PaymentTool._upi_order_request(session_id, amount_paise, upi_id, name, address, phone)
+        if error:
+            return error
+
+        from razorpay.errors import BadRequestError
 
         try:
-            order = client.order.create({
-                "amount": int(amount * 100),
-                "currency": "INR",
-                "payment_capture": 1,
-                "method": "upi"
-            })
-            print("ORDER RESPONSE:", order)
-
-            time.sleep(2)
-            payment = client.order.payments(order["id"])[0]
-
-            if payment["status"] == "captured":
-                items = CartTool.cart_data.get(session_id, {})
-                order_id = DeliveryTool.log_order(session_id,items,
-                    {"name": name, "address": address, "phone": phone},
-                    "paid"
-                )
-                CartTool.cart_data.pop(session_id, None)
-                return f"Payment successful! Order ID: {order_id}"
-            
-            return ("⚠️ Payment pending. Complete payment in your UPI app\n"
-                    f"Order ID: {order['id']} | Amount: ₹{amount:.2f}")
+            order = await PaymentTool.gateway().acreate_order(request)
+        except BadRequestError as e:
+            return f"❌ Payment failed: {str(e)}"
+        except Exception as e:
+            return f"Error processing payment: {str(e)}"
+        return await asyncio.to_thread(PaymentTool._upi_pending, session_id, order, amount_paise, name, address, phone)
 
+    @staticmethod
+    def _process_upi(session_id: str, amount_paise: int, upi_id: str, name: str, address: str, phone: str) -> str:
+        """Handle UPI payment through Razorpay"""
+        request, error = PaymentTool._upi_order_request(session_id, amount_paise, upi_id, name, address, phone)
+        if error:
+            return error
+
+        from razorpay.errors import BadRequestError
+
+        try:
+            order = PaymentTool.gateway().create_order(request)
         except BadRequestError as e:
             return f"❌ Payment failed: {str(e)}"
         except Exception as e:
             return f"Error processing payment: {str(e)}"
+        return PaymentTool._upi_pending(session_id, order, amount_paise, name, address, phone)
+
+    @staticmethod
+    def _upi_order_request(session_id: str, amount_paise: int, upi_id: str, name: str, address: str, phone: str) -> tuple:
+        """The Razorpay order to create for a UPI checkout, or an error message."""
+        if not upi_id or '@' not in upi_id:
+            return None, "Error: Invalid UPI ID format (should be xxx@bank)"
+        return {
+            "amount": amount_paise,
+            "currency": "INR",
+            "payment_capture": 1,
+            "method": "upi",
+            "notes": {"session_id": session_id, "name": name, "address": address, "phone": phone}
+        }, None
 
     @staticmethod
-    def _process_cod(session_id: str, amount: float, name: str, address: str, phone: str) -> str:
-        items = CartTool.cart_data.get(session_id, {})
+    def _upi_pending(session_id: str, order: dict, amount_paise: int, name: str, address: str, phone: str) -> str:
+        """Remembers a created UPI order until its payment is captured.
+
+        The checked-out cart is also saved in the database, so a webhook or
+        poll that lands in another worker logs exactly what was paid for.
+        """
+        pending = {
+            "session_id": session_id,
+            "items": CartTool.get_lines(session_id),
+            "user": {"name": name, "address": address, "phone": phone},
+        }
+        try:
+            DeliveryTool.save_checkout(order["id"], session_id, pending["items"], pending["user"])
+        except Exception as e:
+            print(f"Error saving checkout {order['id']}: {e}")
+        with PaymentTool._lock:
+            PaymentTool._pending[order["id"]] = pending
+        PaymentTool.get_poller().watch(order["id"])
+
+        return ("⚠️ Payment pending. Complete payment in your UPI app\n"
+                f"Order ID: {order['id']} | Amount: {pricing.format_rupees(amount_paise)}")
+
+    @staticmethod
+    def _check_order(razorpay_order_id: str):
+        """Polls Razorpay; returns "captured" once paid, otherwise None to keep waiting."""
+        payments = PaymentTool.gateway().order_payments(razorpay_order_id)
+        if any(p.get("status") == "captured" for p in payments.get("items", [])):
+            return "captured"
+        return None
+
+    @staticmethod
+    def _on_poll_status(razorpay_order_id: str, status: str):
+        if status == "captured":
+            # A failed log_order raises, so the poller keeps watching the payment.
+            PaymentTool.confirm_payment(razorpay_order_id)
+        else:
+            with PaymentTool._lock:
+                PaymentTool._pending.pop(razorpay_order_id, None)
+            DeliveryTool.delete_checkout(razorpay_order_id)
+
+    @staticmethod
+    def confirm_payment(razorpay_order_id: str):
+        """Logs the order for a captured UPI payment. Safe to call any number of times."""
+        with PaymentTool._lock:
+            if razorpay_order_id in PaymentTool._confirmed:
+                return PaymentTool._confirmed[razorpay_order_id]
+            pending = PaymentTool._pending.get(razorpay_order_id)
+
+        if pending is None:
+            # Checkout happened in another worker (or before a restart).
+            pending = DeliveryTool.get_checkout(razorpay_order_id)
+            if pending is None:
+                print(f"Error: no checkout details for payment {razorpay_order_id}")
+                return None
+
+        order_id = DeliveryTool.log_order(pending["session_id"], pending["items"], pending["user"],
+                                          "paid", payment_ref=razorpay_order_id)
+        CartTool.clear_checked_out(pending["session_id"], pending["items"]["lines"])
+        try:
+            DeliveryTool.delete_checkout(razorpay_order_id)
+        except Exception as e:
+            print(f"Error removing checkout {razorpay_order_id}: {e}")
+
+        with PaymentTool._lock:
+            PaymentTool._pending.pop(razorpay_order_id, None)
+            PaymentTool._confirmed[razorpay_order_id] = order_id
+            while len(PaymentTool._confirmed) > PaymentTool.CONFIRMED_CACHE_SIZE:
+                PaymentTool._confirmed.popitem(last=False)
+        if PaymentTool._poller is not None:
+            PaymentTool._poller.forget(razorpay_order_id)
+        return order_id
+
+    @staticmethod
+    def handle_webhook(body: bytes, signature: str) -> bool:
+        """Processes a Razorpay webhook delivery; returns False if the signature is invalid.
+
+        Signed events that are malformed or of no interest are acknowledged
+        (True) so Razorpay does not keep retrying them.
+        """
+        if not verify_webhook_signature(body, signature, PaymentTool.RAZORPAY_WEBHOOK_SECRET):
+            return False
+
+        try:
+            event = json.loads(body)
+        except ValueError:
+            print("Error: webhook body is not JSON")
+            return True
+        if not isinstance(event, dict):
+            return True
+
+        def entity(name):
+            value = event
+            for key in ("payload", name, "entity"):
+                value = value.get(key) if isinstance(value, dict) else None
+            return value if isinstance(value, dict) else {}
+
+        if event.get("event") == "order.paid":
+            order_id = entity("order").get("id")
+        elif event.get("event") == "payment.captured":
+            order_id = entity("payment").get("order_id")
+        else:
+            order_id = None
+        if order_id:
+            PaymentTool.confirm_payment(order_id)
+        return True
+
+    @staticmethod
+    def _process_cod(session_id: str, amount_paise: int, name: str, address: str, phone: str) -> str:
+        items = CartTool.get_lines(session_id)
         order_id = DeliveryTool.log_order(
             session_id,
             items,
             {"name": name, "address": address, "phone": phone},
             "pending"
         )
-        CartTool.cart_data.pop(session_id, None)
+        CartTool.clear_cart(session_id)
         return f"COD confirmed! Order ID: {order_id}"
 
 class DeliveryTool:
     DB_URL = os.getenv("RENDER_DB_URL")
+    POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+    POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+    POOL_WAIT_TIMEOUT = float(os.getenv("DB_POOL_WAIT_TIMEOUT", "10"))
+    WRITE_BEHIND = os.getenv("ORDER_WRITE_BEHIND", "0") == "1"
+    JOURNAL_DIR = os.getenv("ORDER_JOURNAL_DIR", "order_journal")
+    FEED_SOURCE = os.getenv("ORDER_FEED", "notify")
+    FEED_CHANNEL = "orders_feed"
+    FEED_POLL_OVERLAP = float(os.getenv("ORDER_FEED_POLL_OVERLAP", "10"))
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    _sink = None
+    _sink_lock = threading.Lock()  # not _pool_lock: building the sink replays its journal through the pool
+    _feed = None
 
     @staticmethod
     def _get_db_connection():
         """Establishes a database connection."""
+        import psycopg2
+
         return psycopg2.connect(DeliveryTool.DB_URL)
 
+    @classmethod
+    def get_pool(cls):
+        """Returns the process-wide connection pool, creating it on first use in each process."""
+        if cls._pool_pid != os.getpid():
+            with cls._pool_lock:
+                if cls._pool_pid != os.getpid():
+                    # Connections inherited through fork belong to the parent: leave them open
+                    # (closing them would end the parent's sessions) and start a new pool.
+                    cls._pool = ConnectionPool(
+                        cls._get_db_connection,
+                        minconn=cls.POOL_MIN,
+                        maxconn=cls.POOL_MAX,
+                        idle_timeout=cls.POOL_IDLE_TIMEOUT,
+                        wait_timeout=cls.POOL_WAIT_TIMEOUT,
+                    )
+                    cls._pool_pid = os.getpid()
+        return cls._pool
+
+    @classmethod
+    def _connection(cls):
+        """Checks a pooled connection out for one transaction."""
+        return cls.get_pool().connection()
+
+    @classmethod
+    def pool_stats(cls):
+        """Returns connection pool metrics (wait time, in-use, created, ...)."""
+        if cls._pool is None or cls._pool_pid != os.getpid():
+            return {}
+        return cls._pool.stats()
+
+    @classmethod
+    def get_sink(cls):
+        """Returns the write-behind order sink, or None when orders are written synchronously."""
+        if cls._sink is None and cls.WRITE_BEHIND:
+            with cls._sink_lock:
+                if cls._sink is None:
+                    cls._sink = WriteBehindOrderSink(
+                        cls.JOURNAL_DIR,
+                        insert_batch=cls._insert_orders,
+                        allocate_ids=cls._reserve_order_ids,
+                        batch_size=int(os.getenv("ORDER_BATCH_SIZE", "200")),
+                        max_latency=float(os.getenv("ORDER_BATCH_MAX_LATENCY", "0.5")),
+                    )
+        return cls._sink
+
+    @classmethod
+    def set_sink(cls, sink):
+        """Routes log_order through the given sink (None to write synchronously)."""
+        cls._sink = sink
+        cls.WRITE_BEHIND = sink is not None
+
+    @staticmethod
+    @metrics.timed("db")
+    def _reserve_order_ids(count):
+        """Reserves a block of order ids from the orders sequence."""
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT nextval(pg_get_serial_sequence('orders', 'order_id'))
+                    FROM generate_series(1, %s);
+                """, (count,))
+                return [row[0] for row in cur.fetchall()]
+
+    @staticmethod
+    @metrics.timed("db")
+    def _insert_orders(rows):
+        """Writes a batch of journaled orders in one multi-row INSERT; replays are no-ops.
+
+        Journaled ``created_at`` values are UTC; casting through timestamptz stores
+        them in the session time zone, like the column's CURRENT_TIMESTAMP default.
+        """
+        from psycopg2.extras import execute_values
+
+        values = [(row["order_id"], row["session_id"], json.dumps(row["products"]), json.dumps(row["user"]),
+                   row["payment_status"], row["delivery_status"], row["payment_ref"], row["created_at"])
+                  for row in rows]
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                execute_values(cur, """
+                    INSERT INTO orders (order_id, session_id, product_details, user_details, payment_status,
+                                        delivery_status, payment_ref, created_at)
+                    VALUES %s
+                    ON CONFLICT DO NOTHING;
+                """, values, template="(%s, %s, %s, %s, %s, %s, %s, %s::timestamptz)", page_size=len(values))
+
+    @classmethod
+    def get_feed(cls):
+        """Returns the process-wide feed of new and changed orders.
+
+        ORDER_FEED=notify (default) listens for the trigger's pg_notify
+        events; ORDER_FEED=poll polls ``updated_at`` instead, for setups
+        where LISTEN is unavailable (e.g. transaction-pooling proxies).
+        """
+        if cls._feed is None:
+            with cls._pool_lock:
+                if cls._feed is None:
+                    interval = float(os.getenv("ORDER_FEED_POLL_INTERVAL", "1.0"))
+                    if cls.FEED_SOURCE == "poll":
+                        source = PollingSource(cls._changes_since, interval)
+                    else:
+                        source = PostgresNotifySource(cls._get_db_connection, cls.FEED_CHANNEL)
+                    cls._feed = OrderFeed(source)
+        return cls._feed
+
+    @staticmethod
+    @metrics.timed("db")
+    def _changes_since(cursor):
+        """Polling source: orders whose ``updated_at`` moved past ``cursor``.
+
+        ``updated_at`` is taken when a transaction starts, so a slow
+        transaction can commit a row that sorts before rows already sent.
+        Each poll therefore re-reads the last ORDER_FEED_POLL_OVERLAP seconds
+        behind the cursor too; ``sent`` remembers the ``(order_id, updated_at)``
+        pairs already published in that window so they are not repeated.
+        """
+        overlap = timedelta(seconds=DeliveryTool.FEED_POLL_OVERLAP)
+        columns = "order_id, session_id, payment_status, delivery_status, updated_at, product_details"
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                if cursor is None:
+                    cur.execute("SELECT updated_at, order_id FROM orders ORDER BY updated_at DESC, order_id DESC LIMIT 1;")
+                    since, last_id = cur.fetchone() or (datetime.min, 0)
+                else:
+                    since, last_id, sent = cursor
+                cur.execute(f"""
+                    SELECT {columns} FROM orders
+                    WHERE updated_at >= %s::timestamp - make_interval(secs => %s)
+                      AND (updated_at, order_id) <= (%s, %s)
+                    ORDER BY updated_at, order_id;
+                """, (since, overlap.total_seconds(), since, last_id))
+                window = cur.fetchall()
+                if cursor is None:
+                    # Starting point: whatever is already committed counts as sent.
+                    sent = frozenset((r[0], r[4]) for r in window)
+                    return [], (since, last_id, sent)
+                late = [r for r in window if (r[0], r[4]) not in sent]
+                cur.execute(f"""
+                    SELECT {columns} FROM orders WHERE (updated_at, order_id) > (%s, %s)
+                    ORDER BY updated_at, order_id LIMIT 1000;
+                """, (since, last_id))
+                rows = cur.fetchall()
+        if rows:
+            since, last_id = rows[-1][4], rows[-1][0]
+        sent = frozenset(key for key in sent.union((r[0], r[4]) for r in late + rows)
+                         if key[1] + overlap >= since)
+        events = [{"order_id": r[0], "session_id": r[1], "payment_status": r[2], "delivery_status": r[3],
+                   "updated_at": r[4].isoformat(), "products": r[5]} for r in late + rows]
+        return events, (since, last_id, sent)
+
     @staticmethod
     def setup_database():
         """Creates orders table if it doesn't exist."""
-        with DeliveryTool._get_db_connection() as conn:
+        with DeliveryTool._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS orders (
@@ -320,48 +692,227 @@ class DeliveryTool:
                         user_details JSONB NOT NULL,
                         payment_status TEXT CHECK (payment_status IN ('paid', 'pending', 'failed')),
                         delivery_status TEXT DEFAULT 'pending',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        payment_ref TEXT UNIQUE
+                    );
+                """)
+                cur.execute("ALTER TABLE orders ADD COLUMN IF NOT EXISTS payment_ref TEXT UNIQUE;")
+                # Order history per caller, newest first (matches get_orders' keyset ordering).
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_orders_session_created
+                    ON orders (session_id, created_at, order_id);
+                """)
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders (created_at);")
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_orders_delivery_status
+                    ON orders (delivery_status, created_at);
+                """)
+                # UPI checkouts awaiting capture, so any worker can log the order that was paid for.
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS checkouts (
+                        payment_ref TEXT PRIMARY KEY,
+                        session_id TEXT NOT NULL,
+                        product_details JSONB NOT NULL,
+                        user_details JSONB NOT NULL,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     );
                 """)
-                conn.commit()
+                cur.execute("ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_updated_at ON orders (updated_at, order_id);")
+                # Kitchen/dispatch feed: every insert and status change is announced on
+                # the orders_feed channel. Products are left out if the payload would
+                # exceed NOTIFY's 8000 byte limit.
+                cur.execute("""
+                    CREATE OR REPLACE FUNCTION orders_touch() RETURNS trigger AS $$
+                    BEGIN
+                        NEW.updated_at := now();
+                        RETURN NEW;
+                    END;
+                    $$ LANGUAGE plpgsql;
+
+                    CREATE OR REPLACE FUNCTION orders_notify() RETURNS trigger AS $$
+                    DECLARE
+                        payload TEXT;
+                    BEGIN
+                        payload := json_build_object(
+                            'op', TG_OP, 'order_id', NEW.order_id, 'session_id', NEW.session_id,
+                            'payment_status', NEW.payment_status, 'delivery_status', NEW.delivery_status,
+                            'updated_at', NEW.updated_at, 'products', NEW.product_details)::text;
+                        IF octet_length(payload) > 7900 THEN
+                            payload := json_build_object(
+                                'op', TG_OP, 'order_id', NEW.order_id, 'session_id', NEW.session_id,
+                                'payment_status', NEW.payment_status, 'delivery_status', NEW.delivery_status,
+                                'updated_at', NEW.updated_at)::text;
+                        END IF;
+                        PERFORM pg_notify('orders_feed', payload);
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql;
+
+                    DROP TRIGGER IF EXISTS orders_touch ON orders;
+                    CREATE TRIGGER orders_touch BEFORE UPDATE ON orders
+                        FOR EACH ROW
+                        WHEN (OLD.delivery_status IS DISTINCT FROM NEW.delivery_status
+                              OR OLD.payment_status IS DISTINCT FROM NEW.payment_status)
+                        EXECUTE FUNCTION orders_touch();
+
+                    DROP TRIGGER IF EXISTS orders_notify_insert ON orders;
+                    CREATE TRIGGER orders_notify_insert AFTER INSERT ON orders
+                        FOR EACH ROW EXECUTE FUNCTION orders_notify();
+
+                    DROP TRIGGER IF EXISTS orders_notify_update ON orders;
+                    CREATE TRIGGER orders_notify_update AFTER UPDATE ON orders
+                        FOR EACH ROW
+                        WHEN (OLD.delivery_status IS DISTINCT FROM NEW.delivery_status
+                              OR OLD.payment_status IS DISTINCT FROM NEW.payment_status)
+                        EXECUTE FUNCTION orders_notify();
+                """)
 
     @staticmethod
-    def log_order(session_id, products, user_details, payment_status):
-        """Logs an order into the database."""
-        with DeliveryTool._get_db_connection() as conn:
+    @metrics.timed("db")
+    def log_order(session_id, products, user_details, payment_status, payment_ref=None):
+        """Logs an order into the database.
+
+        ``payment_ref`` (the gateway's order id) makes logging idempotent: a
+        second call with the same reference returns the existing order id.
+        With ORDER_WRITE_BEHIND=1 other orders are journaled and written in a
+        later batch; the returned id is already reserved for it. Orders with a
+        ``payment_ref`` are always written synchronously, since only the
+        database can tell that another worker logged the same payment.
+        """
+        sink = DeliveryTool.get_sink() if payment_ref is None else None
+        if sink is not None:
+            return sink.submit(session_id, products, user_details, payment_status, payment_ref)
+
+        with DeliveryTool._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    INSERT INTO orders (session_id, product_details, user_details, payment_status, delivery_status)
-                    VALUES (%s, %s, %s, %s, %s)
+                    INSERT INTO orders (session_id, product_details, user_details, payment_status, delivery_status, payment_ref)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (payment_ref) DO NOTHING
                     RETURNING order_id;
-                """, (session_id, json.dumps(products), json.dumps(user_details), payment_status, "pending"))
-                
-                order_id = cur.fetchone()[0]
-                conn.commit()
-                return order_id
+                """, (session_id, json.dumps(products), json.dumps(user_details), payment_status, "pending", payment_ref))
+
+                row = cur.fetchone()
+                if row is None:
+                    cur.execute("SELECT order_id FROM orders WHERE payment_ref = %s;", (payment_ref,))
+                    row = cur.fetchone()
+                return row[0]
+
+    @staticmethod
+    @metrics.timed("db")
+    def save_checkout(payment_ref, session_id, products, user_details):
+        """Records the cart a UPI payment was requested for, keyed by the gateway's order id."""
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO checkouts (payment_ref, session_id, product_details, user_details)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (payment_ref) DO NOTHING;
+                """, (payment_ref, session_id, json.dumps(products), json.dumps(user_details)))
+
+    @staticmethod
+    @metrics.timed("db")
+    def get_checkout(payment_ref):
+        """The checkout saved by ``save_checkout``, or None."""
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT session_id, product_details, user_details FROM checkouts WHERE payment_ref = %s;
+                """, (payment_ref,))
+                row = cur.fetchone()
+        if row is None:
+            return None
+        return {"session_id": row[0], "items": row[1], "user": row[2]}
 
     @staticmethod
+    @metrics.timed("db")
+    def delete_checkout(payment_ref):
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM checkouts WHERE payment_ref = %s;", (payment_ref,))
+
+    @staticmethod
+    @metrics.timed("db")
     def update_delivery_status(order_id, status):
         """Updates the delivery status of an order."""
-        with DeliveryTool._get_db_connection() as conn:
+        with DeliveryTool._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
                     UPDATE orders SET delivery_status = %s WHERE order_id = %s;
                 """, (status, order_id))
-                conn.commit()
                 return f"Order {order_id} delivery status updated to {status}."
 
     @staticmethod
-    def get_orders(session_id):
-        """Fetches all orders for a given session."""
-        with DeliveryTool._get_db_connection() as conn:
+    @metrics.timed("db")
+    def update_delivery_status_bulk(order_ids, status):
+        """Sets the delivery status of many orders in one statement; returns the ids that exist."""
+        with DeliveryTool._connection() as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT order_id, product_details, user_details, payment_status, delivery_status, created_at
-                    FROM orders WHERE session_id = %s;
+                    UPDATE orders SET delivery_status = %s
+                    WHERE order_id = ANY(%s)
+                    RETURNING order_id;
+                """, (status, [int(order_id) for order_id in order_ids]))
+                return sorted(row[0] for row in cur.fetchall())
+
+    @staticmethod
+    @metrics.timed("db")
+    def get_orders_by_status(statuses, limit=200):
+        """Oldest-first orders in the given delivery statuses, e.g. the kitchen's open tickets."""
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {DeliveryTool.ORDER_COLUMNS}, session_id FROM orders
+                    WHERE delivery_status = ANY(%s)
+                    ORDER BY created_at, order_id
+                    LIMIT %s;
+                """, (list(statuses), limit))
+                return [dict(DeliveryTool._order_from_row(row), session_id=row[6]) for row in cur.fetchall()]
+
+    ORDER_COLUMNS = "order_id, product_details, user_details, payment_status, delivery_status, created_at"
+
+    @staticmethod
+    def _order_from_row(row):
+        return {"order_id": row[0], "products": row[1], "user": row[2],
+                "payment_status": row[3], "delivery_status": row[4], "created_at": row[5].isoformat()}
+
+    @staticmethod
+    @metrics.timed("db")
+    def get_orders(session_id, limit=None, before=None):
+        """Fetches a session's orders, newest first: all of them, or a page of ``limit``.
+
+        ``before`` is the ``(created_at, order_id)`` of the last order of the
+        previous page.
+        """
+        query = f"SELECT {DeliveryTool.ORDER_COLUMNS} FROM orders WHERE session_id = %s"
+        params = [session_id]
+        if before is not None:
+            query += " AND (created_at, order_id) < (%s::timestamp, %s)"
+            params.extend(before)
+        query += " ORDER BY created_at DESC, order_id DESC"
+        if limit is not None:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        with DeliveryTool._connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                return [DeliveryTool._order_from_row(row) for row in cur.fetchall()]
+
+    @staticmethod
+    def iter_orders(session_id, batch_size=500):
+        """Streams every order for a session, newest first, through a server-side cursor.
+
+        Rows are fetched ``batch_size`` at a time; the pooled connection is
+        held until the iterator is exhausted or closed.
+        """
+        with DeliveryTool._connection() as conn:
+            with conn.cursor(name=f"orders_{uuid.uuid4().hex}") as cur:
+                cur.itersize = batch_size
+                cur.execute(f"""
+                    SELECT {DeliveryTool.ORDER_COLUMNS} FROM orders WHERE session_id = %s
+                    ORDER BY created_at DESC, order_id DESC;
                 """, (session_id,))
-                
-                orders = cur.fetchall()
-                return [{"order_id": row[0], "products": row[1], "user": row[2], 
-                         "payment_status": row[3], "delivery_status": row[4], "created_at": row[5].isoformat()} 
-                        for row in orders]
\ No newline at end of file
+                for row in cur:
+                    yield DeliveryTool._order_from_row(row)
@@ -0,0 +1,171 @@
+"""Agent turns for voice calls that run behind the Twilio webhook instead of inside it.
+
+/handle_input submits the turn and waits at most VOICE_INLINE_WAIT seconds.
+A quick answer is spoken straight away. Otherwise the caller hears a
+short filler and Twilio is redirected to /voice_result, which waits at most
+VOICE_RESULT_WAIT seconds per request and then pauses and redirects again.
+Every webhook returns well inside Twilio's timeout, and no request
+thread is held for a whole LLM round trip. A turn that takes longer than
+VOICE_TURN_TIMEOUT is given up and the caller is asked to repeat.
+
+Turns of one session run one after another, even after one was given up
+(it keeps running, and the next turn still waits for it, up to
+VOICE_TURN_TIMEOUT). The latest turn is looked up by session and turn id.
+Like memory and carts, turns are per process.
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError as FutureCancelled, Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import metrics
+
+
+class _Turn:
+    __slots__ = ("id", "session_id", "started", "future")
+
+    def __init__(self, session_id, future):
+        self.id = uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.started = time.monotonic()
+        self.future = future
+
+
+class VoiceTurns:
+    ENABLED = os.getenv("VOICE_ASYNC_TURNS", "1") == "1"
+    INLINE_WAIT = float(os.getenv("VOICE_INLINE_WAIT", "1.5"))
+    RESULT_WAIT = float(os.getenv("VOICE_RESULT_WAIT", "3"))
+    PAUSE = int(os.getenv("VOICE_PAUSE", "1"))
+    TURN_TIMEOUT = float(os.getenv("VOICE_TURN_TIMEOUT", "25"))
+    THREADS = int(os.getenv("VOICE_TURN_THREADS", "32"))
+    _turns = {}  # session id -> latest _Turn awaiting delivery, oldest first
+    _tails = {}  # session id -> last _Turn submitted, delivered or not, oldest first
+    _tasks = set()  # running asyncio turns, referenced until they finish
+    _lock = threading.Lock()
+    _executor = None
+
+    @classmethod
+    def _register(cls, session_id, future):
+        """Creates the session's next turn; returns it with the turn it must wait for."""
+        now = time.monotonic()
+        with cls._lock:
+            while cls._turns:  # turns nobody came back for, e.g. the caller hung up
+                oldest = next(iter(cls._turns.values()))
+                if now - oldest.started < 2 * cls.TURN_TIMEOUT:
+                    break
+                del cls._turns[oldest.session_id]
+            while cls._tails:
+                oldest = next(iter(cls._tails.values()))
+                if not oldest.future.done() and now - oldest.started < 2 * cls.TURN_TIMEOUT:
+                    break
+                del cls._tails[oldest.session_id]
+            previous = cls._tails.pop(session_id, None)
+            cls._turns.pop(session_id, None)
+            turn = cls._turns[session_id] = cls._tails[session_id] = _Turn(session_id, future)
+        return turn, previous
+
+    @classmethod
+    def submit(cls, session_id: str, fn, *args) -> _Turn:
+        """Runs ``fn(*args)`` on the turn pool, after the session's previous turn."""
+        future = Future()
+        turn, previous = cls._register(session_id, future)
+
+        def run():
+            if previous is not None:
+                try:
+                    previous.future.result(cls.TURN_TIMEOUT)
+                except Exception:
+                    pass
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=cls.THREADS, thread_name_prefix="voice-turn")
+        cls._executor.submit(run)
+        return turn
+
+    @classmethod
+    def asubmit(cls, session_id: str, coro_fn, *args) -> _Turn:
+        """``submit`` for async apps: runs ``await coro_fn(*args)`` as a task on the running loop."""
+        future = asyncio.get_running_loop().create_future()
+        # A turn nobody collects (given up, caller gone) must not log "exception never retrieved".
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        turn, previous = cls._register(session_id, future)
+
+        async def run():
+            if previous is not None:
+                await asyncio.wait({previous.future}, timeout=cls.TURN_TIMEOUT)
+            try:
+                result = await coro_fn(*args)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        task = asyncio.ensure_future(run())
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+        return turn
+
+    @classmethod
+    def get(cls, session_id: str, turn_id: str):
+        turn = cls._turns.get(session_id)
+        return turn if turn is not None and turn.id == turn_id else None
+
+    @classmethod
+    def result(cls, turn: _Turn, timeout: float):
+        """The turn's response if it finishes within ``timeout``, else None (the turn keeps running)."""
+        try:
+            response = turn.future.result(timeout)
+        except FutureTimeout:
+            return None
+        except (FutureCancelled, asyncio.CancelledError):
+            print("Voice turn was cancelled")
+            response = {}
+        except Exception as e:
+            print(f"Error in voice turn: {e}")
+            response = {}
+        return cls._delivered(turn, response)
+
+    @classmethod
+    async def aresult(cls, turn: _Turn, timeout: float):
+        await asyncio.wait({turn.future}, timeout=timeout)
+        if not turn.future.done():
+            return None
+        try:
+            response = turn.future.result()
+        except (FutureCancelled, asyncio.CancelledError):  # the turn's future, not this task
+            print("Voice turn was cancelled")
+            response = {}
+        except Exception as e:
+            print(f"Error in voice turn: {e}")
+            response = {}
+        return cls._delivered(turn, response)
+
+    @classmethod
+    def _delivered(cls, turn, response):
+        with cls._lock:
+            if cls._turns.get(turn.session_id) is turn:
+                del cls._turns[turn.session_id]
+        metrics.observe("voice", "turn", time.monotonic() - turn.started)
+        return response or {}
+
+    @classmethod
+    def expired(cls, turn: _Turn) -> bool:
+        return time.monotonic() - turn.started > cls.TURN_TIMEOUT
+
+    @classmethod
+    def give_up(cls, turn: _Turn):
+        """Forgets a turn that ran out of time; it finishes in the background."""
+        with cls._lock:
+            if cls._turns.get(turn.session_id) is turn:
+                del cls._turns[turn.session_id]
+        metrics.observe("voice", "turn", time.monotonic() - turn.started, error=True)